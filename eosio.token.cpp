@@ -35,7 +35,7 @@ void token::createlocked(account_name issuer, eosio::asset maximum_supply) {
 	_create(issuer, maximum_supply, true);
 }
 
-void token::issue(account_name to, eosio::asset quantity, std::string memo) {
+account_name token::_add_supply(eosio::asset quantity, const std::string& memo) {
 	auto sym = quantity.symbol;
 	eosio_assert(sym.is_valid(), "invalid symbol name");
 	eosio_assert(memo.size() <= 256, "memo has more than 256 bytes");
@@ -57,13 +57,30 @@ void token::issue(account_name to, eosio::asset quantity, std::string memo) {
 		s.supply += quantity;
 	});
 
-	add_balance(st.issuer, quantity, st.issuer);
+	return st.issuer;
+}
+
+void token::issue(account_name to, eosio::asset quantity, std::string memo) {
+	auto issuer = _add_supply(quantity, memo);
 
-	if (to != st.issuer) {
-		SEND_INLINE_ACTION(*this, transfer, {st.issuer,N(active)}, {st.issuer, to, quantity, memo});
+	add_balance(issuer, quantity, issuer);
+
+	if (to != issuer) {
+		SEND_INLINE_ACTION(*this, transfer, {issuer,N(active)}, {issuer, to, quantity, memo});
 	}
 }
 
+void token::issueto(account_name to, eosio::asset quantity, std::string memo) {
+	eosio_assert(is_account(to), "to account does not exist");
+	auto issuer = _add_supply(quantity, memo);
+
+	if (to != issuer) {
+		require_recipient(to);
+	}
+
+	add_balance(to, quantity, issuer);
+}
+
 void token::transfer(account_name from, account_name to, eosio::asset quantity, std::string memo) {
 	eosio_assert(from != to, "cannot transfer to self");
 	require_auth(from);
@@ -86,6 +103,35 @@ void token::transfer(account_name from, account_name to, eosio::asset quantity,
 	add_balance(to, quantity, from);
 }
 
+void token::transfermany(account_name from, std::vector<transfer_to> transfers, std::string memo) {
+	eosio_assert(!transfers.empty(), "no transfers");
+	require_auth(from);
+	auto sym = transfers.front().quantity.symbol.name();
+	stats statstable(_self, sym);
+	const auto& st = statstable.get(sym);
+
+	eosio_assert(!st.lock || from == st.issuer, "token is locked");
+	eosio_assert(memo.size() <= 256, "memo has more than 256 bytes");
+
+	require_recipient(from);
+
+	eosio::asset total(0, st.supply.symbol);
+	for (const auto& t : transfers) {
+		eosio_assert(from != t.to, "cannot transfer to self");
+		eosio_assert(is_account(t.to), "to account does not exist");
+		eosio_assert(t.quantity.is_valid(), "invalid quantity");
+		eosio_assert(t.quantity.amount > 0, "must transfer positive quantity");
+		eosio_assert(t.quantity.symbol == st.supply.symbol, "symbol precision mismatch");
+		require_recipient(t.to);
+		total += t.quantity;
+	}
+
+	sub_balance(from, total);
+	for (const auto& t : transfers) {
+		add_balance(t.to, t.quantity, from);
+	}
+}
+
 void token::unlock(eosio::symbol_type symbol) {
 	stats statstable(_self, symbol.name());
 	auto it = statstable.find(symbol.name());
@@ -155,4 +201,4 @@ void token::add_balance(account_name owner, eosio::asset value, account_name ram
 	}
 }
 
-EOSIO_ABI(token, (create)(createlocked)(issue)(transfer)(unlock)(withdraw)(burn))
+EOSIO_ABI(token, (create)(createlocked)(issue)(issueto)(transfer)(transfermany)(unlock)(withdraw)(burn))
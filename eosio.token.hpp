@@ -4,14 +4,24 @@
 #include <eosiolib/eosio.hpp>
 
 #include <string>
+#include <vector>
 
 class token : public eosio::contract {
 	public:
+		struct transfer_to {
+			account_name to;
+			eosio::asset quantity;
+
+			EOSLIB_SERIALIZE(transfer_to, (to)(quantity))
+		};
+
 		token(account_name self);
 		void create(account_name issuer, eosio::asset maximum_supply);
 		void createlocked(account_name issuer, eosio::asset maximum_supply);
 		void issue(account_name to, eosio::asset quantity, std::string memo);
+		void issueto(account_name to, eosio::asset quantity, std::string memo);
 		void transfer(account_name from, account_name to, eosio::asset quantity, std::string memo);
+		void transfermany(account_name from, std::vector<transfer_to> transfers, std::string memo);
 		void unlock(eosio::symbol_type symbol);
 		void burn(account_name owner, eosio::asset value);
 		void withdraw(account_name contract, eosio::asset quantity);
@@ -40,6 +50,7 @@ class token : public eosio::contract {
 		account_name admin;
 
 		void _create(account_name issuer, eosio::asset maximum_supply, bool lock);
+		account_name _add_supply(eosio::asset quantity, const std::string& memo);
 		void sub_balance(account_name owner, eosio::asset value);
 		void add_balance(account_name owner, eosio::asset value, account_name ram_payer);
 
@@ -0,0 +1,344 @@
+import calendar
+import datetime
+import functools
+import json
+import os
+import re
+import struct
+
+import chain_errors as errors
+from asset import Asset, Symbol
+
+CONTRACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "eosio.token")
+ABI_FILE = os.path.join(CONTRACT_DIR, "eosio.token.abi")
+
+NAME_CHARS = ".12345abcdefghijklmnopqrstuvwxyz"
+NAME_RE = re.compile(r"^[.1-5a-z]{0,12}[.1-5a-j]?$")
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def account_name(value):
+    """ Account objects (eosfactory or simulated) are referred to by name """
+    return getattr(value, "name", value)
+
+
+def check_name(value):
+    name = account_name(value)
+    if not isinstance(name, str) or not NAME_RE.match(name) or name.endswith("."):
+        raise errors.Error("Name not properly normalized (name: {})".format(name))
+    return name
+
+
+def char_to_symbol(char):
+    if "a" <= char <= "z":
+        return ord(char) - ord("a") + 6
+    if "1" <= char <= "5":
+        return ord(char) - ord("1") + 1
+    return 0
+
+
+def string_to_name(text):
+    """ uint64 value of an account/action name, as eosio::string_to_name """
+    value = 0
+    for i in range(13):
+        char = char_to_symbol(text[i]) if i < len(text) else 0
+        if i < 12:
+            value |= (char & 0x1f) << (64 - 5 * (i + 1))
+        else:
+            value |= char & 0x0f
+    return value
+
+
+def name_to_string(value):
+    chars = []
+    for i in range(13):
+        if i == 0:
+            chars.append(NAME_CHARS[value & 0x0f])
+            value >>= 4
+        else:
+            chars.append(NAME_CHARS[value & 0x1f])
+            value >>= 5
+    return "".join(reversed(chars)).rstrip(".")
+
+
+def time_point_sec(text):
+    """ "2018-08-01T12:00:00[.500]" as seconds since epoch """
+    return calendar.timegm(datetime.datetime.strptime(text.split(".")[0], TIME_FORMAT).timetuple())
+
+
+def time_point_sec_string(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime(TIME_FORMAT)
+
+
+class Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def uint8(self, value):
+        self.buffer.append(value)
+
+    def uint16(self, value):
+        self.buffer += struct.pack("<H", value)
+
+    def uint32(self, value):
+        self.buffer += struct.pack("<I", value)
+
+    def uint64(self, value):
+        self.buffer += struct.pack("<Q", value)
+
+    def int64(self, value):
+        self.buffer += struct.pack("<q", value)
+
+    def varuint32(self, value):
+        while True:
+            byte = value & 0x7f
+            value >>= 7
+            if value:
+                self.buffer.append(byte | 0x80)
+            else:
+                self.buffer.append(byte)
+                return
+
+    def bytes(self, value):
+        self.varuint32(len(value))
+        self.buffer += value
+
+    def string(self, value):
+        self.bytes(value.encode())
+
+    def name(self, value):
+        self.uint64(string_to_name(value))
+
+    def getvalue(self):
+        return bytes(self.buffer)
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def read(self, size):
+        if self.pos + size > len(self.data):
+            raise ValueError("stream ended unexpectedly")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def uint8(self):
+        return self.read(1)[0]
+
+    def uint16(self):
+        return struct.unpack("<H", self.read(2))[0]
+
+    def uint32(self):
+        return struct.unpack("<I", self.read(4))[0]
+
+    def uint64(self):
+        return struct.unpack("<Q", self.read(8))[0]
+
+    def int64(self):
+        return struct.unpack("<q", self.read(8))[0]
+
+    def varuint32(self):
+        value = shift = 0
+        while True:
+            byte = self.uint8()
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def bytes(self):
+        return bytes(self.read(self.varuint32()))
+
+    def string(self):
+        return self.bytes().decode()
+
+    def name(self):
+        return name_to_string(self.uint64())
+
+
+def pack_action(writer, action):
+    writer.name(action["account"])
+    writer.name(action["name"])
+    writer.varuint32(len(action["authorization"]))
+    for level in action["authorization"]:
+        writer.name(level["actor"])
+        writer.name(level["permission"])
+    writer.bytes(bytes.fromhex(action["data"]))
+
+
+def unpack_action(reader):
+    action = {"account": reader.name(), "name": reader.name(), "authorization": []}
+    for _ in range(reader.varuint32()):
+        action["authorization"].append({"actor": reader.name(), "permission": reader.name()})
+    action["data"] = reader.bytes().hex()
+    return action
+
+
+def pack_transaction(trx):
+    """ Binary transaction (packed_trx) from its json form with hex action data """
+    writer = Writer()
+    writer.uint32(time_point_sec(trx["expiration"]))
+    writer.uint16(trx["ref_block_num"])
+    writer.uint32(trx["ref_block_prefix"])
+    writer.varuint32(trx.get("max_net_usage_words", 0))
+    writer.uint8(trx.get("max_cpu_usage_ms", 0))
+    writer.varuint32(trx.get("delay_sec", 0))
+    for key in ("context_free_actions", "actions"):
+        actions = trx.get(key, [])
+        writer.varuint32(len(actions))
+        for action in actions:
+            pack_action(writer, action)
+    writer.varuint32(0)  # transaction_extensions
+    return writer.getvalue()
+
+
+def unpack_transaction(data):
+    reader = Reader(data)
+    trx = {
+        "expiration": time_point_sec_string(reader.uint32()),
+        "ref_block_num": reader.uint16(),
+        "ref_block_prefix": reader.uint32(),
+        "max_net_usage_words": reader.varuint32(),
+        "max_cpu_usage_ms": reader.uint8(),
+        "delay_sec": reader.varuint32()
+    }
+    for key in ("context_free_actions", "actions"):
+        trx[key] = [unpack_action(reader) for _ in range(reader.varuint32())]
+    trx["transaction_extensions"] = [
+        (reader.uint16(), reader.bytes().hex()) for _ in range(reader.varuint32())
+    ]
+    return trx
+
+
+def pack_name(writer, value):
+    # account objects (eosfactory, simulator) as well as plain names; nodeos
+    # rejects names that do not round trip, string_to_name would mangle them
+    writer.name(check_name(value))
+
+
+def pack_asset(writer, value):
+    asset = Asset.parse(value)
+    writer.int64(asset.amount)
+    writer.uint64(asset.symbol.value())
+
+
+def unpack_asset(reader):
+    amount = reader.int64()
+    return str(Asset(amount, Symbol.from_value(reader.uint64())))
+
+
+def pack_symbol(writer, value):
+    symbol = value if isinstance(value, Symbol) else Symbol.from_string(value)
+    writer.uint64(symbol.value())
+
+
+BUILTIN_TYPES = {
+    "bool": (lambda writer, value: writer.uint8(1 if value else 0), lambda reader: bool(reader.uint8())),
+    "uint8": (Writer.uint8, Reader.uint8),
+    "uint16": (Writer.uint16, Reader.uint16),
+    "uint32": (Writer.uint32, Reader.uint32),
+    "uint64": (Writer.uint64, Reader.uint64),
+    "int64": (Writer.int64, Reader.int64),
+    "varuint32": (Writer.varuint32, Reader.varuint32),
+    "string": (Writer.string, Reader.string),
+    "name": (pack_name, Reader.name),
+    "asset": (pack_asset, unpack_asset),
+    "symbol": (pack_symbol, lambda reader: str(Symbol.from_value(reader.uint64())))
+}
+
+
+class AbiSerializer:
+    """ Binary action data and table rows as described by a contract abi
+
+    A (pack, unpack) pair is compiled once per type the first time it is
+    used, so packing an action is a walk over prebuilt field functions
+    instead of an abi_json_to_bin call. Values are taken in the json
+    form the node uses ("1.0000 WISH", "4,WISH", names as strings); Asset,
+    Symbol and account objects work too. Unpacking gives the json form.
+    """
+
+    def __init__(self, abi):
+        self.types = {t["new_type_name"]: t["type"] for t in abi.get("types", [])}
+        self.structs = {s["name"]: s for s in abi.get("structs", [])}
+        self.actions = {action["name"]: action["type"] for action in abi.get("actions", [])}
+        self.tables = {table["name"]: table["type"] for table in abi.get("tables", [])}
+        self.compiled = {}
+
+    def fields(self, struct):
+        base = self.structs[struct].get("base")
+        fields = self.fields(base) if base else []
+        return fields + [(field["name"], field["type"]) for field in self.structs[struct]["fields"]]
+
+    def compile(self, type_name):
+        type_name = self.types.get(type_name, type_name)
+        compiled = self.compiled.get(type_name)
+        if compiled is not None:
+            return compiled
+        if type_name.endswith("[]"):
+            pack_item, unpack_item = self.compile(type_name[:-2])
+
+            def pack(writer, value):
+                writer.varuint32(len(value))
+                for item in value:
+                    pack_item(writer, item)
+
+            def unpack(reader):
+                return [unpack_item(reader) for _ in range(reader.varuint32())]
+        elif type_name in BUILTIN_TYPES:
+            pack, unpack = BUILTIN_TYPES[type_name]
+        elif type_name in self.structs:
+            fields = [(name, self.compile(field_type)) for name, field_type in self.fields(type_name)]
+
+            def pack(writer, value):
+                for name, (pack_field, _) in fields:
+                    if name not in value:
+                        raise ValueError("Missing field '{}' in input object while processing struct '{}'".format(
+                            name, type_name))
+                    pack_field(writer, value[name])
+
+            def unpack(reader):
+                return {name: unpack_field(reader) for name, (_, unpack_field) in fields}
+        else:
+            raise ValueError("unknown abi type {}".format(type_name))
+        self.compiled[type_name] = (pack, unpack)
+        return pack, unpack
+
+    def pack(self, type_name, value):
+        writer = Writer()
+        self.compile(type_name)[0](writer, value)
+        return writer.getvalue()
+
+    def unpack(self, type_name, data):
+        reader = Reader(data)
+        value = self.compile(type_name)[1](reader)
+        if reader.pos != len(reader.data):
+            raise ValueError("{} bytes left after unpacking {}".format(len(reader.data) - reader.pos, type_name))
+        return value
+
+    def action_type(self, action):
+        if action not in self.actions:
+            raise ValueError("Unknown action {}".format(action))
+        return self.actions[action]
+
+    def pack_action_data(self, action, data):
+        return self.pack(self.action_type(action), data)
+
+    def unpack_action_data(self, action, data):
+        return self.unpack(self.action_type(action), data)
+
+    def pack_row(self, table, row):
+        return self.pack(self.tables[table], row)
+
+    def unpack_row(self, table, data):
+        """ json row from the hex (or bytes) a get_table_rows with json=false returns """
+        return self.unpack(self.tables[table], bytes.fromhex(data) if isinstance(data, str) else data)
+
+
+@functools.lru_cache(maxsize=None)
+def load_serializer(abi_file):
+    """ AbiSerializer of an abi file, loaded once per process """
+    with open(abi_file) as abi:
+        return AbiSerializer(json.load(abi))
@@ -0,0 +1,131 @@
+import collections
+import threading
+
+from abi_serializer import account_name
+
+NAME_CHARS = "12345abcdefghijklmnopqrstuvwxyz"
+# public key of the well-known eosio development key, for chains that do not check signatures
+DEV_PUBLIC_KEY = "EOS6MRyAjQq8ud7hVNYcfnVPJqcVpscN5So8BhtHuGYqET5GDW5CV"
+
+
+def pool_name(prefix, index):
+    """ Account name number index of a pool ("pool11111111", "pool11111112", ...) """
+    chars = []
+    for _ in range(12 - len(prefix)):
+        index, digit = divmod(index, len(NAME_CHARS))
+        chars.append(NAME_CHARS[digit])
+    if index:
+        raise ValueError("pool index out of range for prefix {}".format(prefix))
+    return prefix + "".join(reversed(chars))
+
+
+def authority(public_key):
+    return {"threshold": 1, "keys": [{"key": public_key, "weight": 1}], "accounts": [], "waits": []}
+
+
+class AccountPool:
+    """ Accounts created in bulk and leased out to tests and load runs
+
+    ``chain`` is anything with ``push_actions`` (ChainApi or TokenSimulator).
+    Accounts are created accounts_per_trx newaccount actions per
+    transaction, followed by buyrambytes/delegatebw when ram_bytes/stake
+    are given (chains running eosio.system). Keys are shared round-robin
+    between accounts. The pool is described by its manifest, so a chain
+    snapshot that contains the accounts can hand them out again without
+    creating anything.
+    """
+    accounts_per_trx = 50
+
+    def __init__(self, chain, creator, prefix="pool", ram_bytes=None, stake=None):
+        self.chain = chain
+        self.creator = account_name(creator)
+        self.prefix = prefix
+        self.ram_bytes = ram_bytes
+        self.stake = stake
+        self.keys = {}
+        self.free = collections.deque()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_manifest(cls, chain, creator, manifest):
+        pool = cls(chain, creator, manifest["prefix"])
+        pool.keys = dict(manifest["keys"])
+        pool.free.extend(sorted(pool.keys))
+        return pool
+
+    def manifest(self):
+        return {"prefix": self.prefix, "keys": self.keys}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def generate_keys(self, count, wallet="default"):
+        """ count new public keys, their private keys imported into the wallet """
+        public_keys = []
+        for _ in range(count):
+            private_key, public_key = self.chain.create_key()
+            self.chain.import_key(private_key, wallet)
+            public_keys.append(public_key)
+        return public_keys
+
+    def account_actions(self, name, public_key):
+        creator_auth = [{"actor": self.creator, "permission": "active"}]
+        actions = [{
+            "account": "eosio",
+            "name": "newaccount",
+            "authorization": creator_auth,
+            "data": {
+                "creator": self.creator,
+                "name": name,
+                "owner": authority(public_key),
+                "active": authority(public_key)
+            }
+        }]
+        if self.ram_bytes:
+            actions.append({
+                "account": "eosio",
+                "name": "buyrambytes",
+                "authorization": creator_auth,
+                "data": {"payer": self.creator, "receiver": name, "bytes": self.ram_bytes}
+            })
+        if self.stake:
+            actions.append({
+                "account": "eosio",
+                "name": "delegatebw",
+                "authorization": creator_auth,
+                "data": {
+                    "from": self.creator,
+                    "receiver": name,
+                    "stake_net_quantity": str(self.stake),
+                    "stake_cpu_quantity": str(self.stake),
+                    "transfer": 1
+                }
+            })
+        return actions
+
+    def provision(self, count, public_keys):
+        """ Creates count more accounts, accounts_per_trx per transaction """
+        start = len(self.keys)
+        names = [pool_name(self.prefix, index) for index in range(start, start + count)]
+        for first in range(0, count, self.accounts_per_trx):
+            batch = names[first:first + self.accounts_per_trx]
+            keys = [public_keys[(start + first + i) % len(public_keys)] for i in range(len(batch))]
+            actions = []
+            for name, public_key in zip(batch, keys):
+                actions += self.account_actions(name, public_key)
+            self.chain.push_actions(actions)
+            with self.lock:
+                self.keys.update(zip(batch, keys))
+                self.free.extend(batch)
+        return names
+
+    def lease(self, count=1):
+        """ count account names nobody else holds until they are released """
+        with self.lock:
+            if count > len(self.free):
+                raise IndexError("account pool has {} free accounts, {} requested".format(len(self.free), count))
+            return [self.free.popleft() for _ in range(count)]
+
+    def release(self, names):
+        with self.lock:
+            self.free.extend(names)
@@ -0,0 +1,242 @@
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import time
+
+from abi_serializer import NAME_RE
+from asset import Asset
+from metrics import latency_summary
+
+
+def parse_amount(text, symbol):
+    """ Exact asset from "12.5" (token units) or "12.5000 WISH" """
+    text = text.strip()
+    if " " in text:
+        amount = Asset.parse(text)
+    else:
+        integer, _, fraction = text.partition(".")
+        if len(fraction) > symbol.precision:
+            raise ValueError("more than {} decimals".format(symbol.precision))
+        if symbol.precision:
+            text = "{}.{}".format(integer, fraction.ljust(symbol.precision, "0"))
+        amount = Asset.parse("{} {}".format(text, symbol.code))
+    if amount.symbol != symbol:
+        raise ValueError("symbol precision mismatch")
+    if not amount.is_valid() or amount.amount <= 0:
+        raise ValueError("amount must be positive")
+    return amount
+
+
+class AirdropReport:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.uncertain = 0
+        self.paid = 0
+        self.failed = 0
+        self.transactions = 0
+        self.latencies = []
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "rows": self.rows,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "uncertain": self.uncertain,
+            "paid": self.paid,
+            "failed": self.failed,
+            "transactions": self.transactions,
+            "elapsed": elapsed,
+            "actions_per_sec": (self.paid + self.failed) / elapsed if elapsed else 0,
+            "batch_latency": latency_summary(self.latencies)
+        }
+
+
+class Airdrop:
+    """ Pays out a recipients file with Token.issue_many or Token.transfer_many
+
+    Rows are "account,amount[,memo]"; amounts are token units ("1.5") or
+    full assets ("1.5000 WISH"). Invalid rows and repeated accounts are
+    dropped, the rest is grouped into batches of token.batch_size actions
+    with at most ``window`` batches in flight.
+
+    Every batch is logged to the checkpoint file as "sent" before it is
+    pushed and "done" once its results are in. A restarted run skips done
+    batches and does not resend batches that were in flight when it
+    stopped: their rows go to <checkpoint>.uncertain for reconciliation
+    instead of risking a double payment. "sent" records name the lines
+    and a digest of the rows of their batch; a restart whose batches no
+    longer match them (another batch size, rows edited or removed) is
+    refused rather than mapping logged batches onto other rows.
+
+    Rows of a batch that failed with an error which does not say the
+    chain refused it (see chain_errors.is_rejected) may have been paid:
+    they go to <checkpoint>.uncertain as well and are not retried.
+    """
+
+    def __init__(self, token, perm, checkpoint, owner=None, memo="airdrop",
+                 window=4, progress=None, progress_interval=10):
+        self.token = token
+        self.perm = perm
+        self.checkpoint = checkpoint
+        # issue to recipients unless paying out of the owner's balance
+        self.owner = owner
+        self.memo = memo
+        self.window = window
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.symbol = token.to_quantity(0, token.decimals, token.symbol).symbol
+
+    def load_checkpoint(self):
+        """ (batches in flight, batches done, sent record by batch) of the checkpoint file """
+        sent, done = {}, set()
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as log:
+                for line in log:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of a crashed run
+                    if record["state"] == "done":
+                        done.add(record["batch"])
+                    else:
+                        sent[record["batch"]] = record
+        return set(sent) - done, done, sent
+
+    @staticmethod
+    def sent_record(number, batch):
+        rows = [[line_no, account, str(amount), memo] for line_no, account, amount, memo in batch]
+        return {
+            "batch": number,
+            "state": "sent",
+            "first": batch[0][0],
+            "last": batch[-1][0],
+            "digest": hashlib.sha256(json.dumps(rows).encode()).hexdigest()
+        }
+
+    def check_resumed(self, number, batch, sent):
+        expected = self.sent_record(number, batch)
+        record = sent.get(number, {})
+        if any(record.get(field) != expected[field] for field in ("first", "last", "digest")):
+            raise ValueError(
+                "batch {} of {} was lines {}-{} and is now {}-{} or has other rows: "
+                "resume with the recipients file and batch size the run started with".format(
+                    number, self.checkpoint, record.get("first"), record.get("last"),
+                    expected["first"], expected["last"]))
+
+    def recipients(self, recipients_file, report, rejected):
+        seen = set()
+        with open(recipients_file, newline="") as source:
+            for line_no, row in enumerate(csv.reader(source), 1):
+                if not row or row[0].startswith("#"):
+                    continue
+                report.rows += 1
+                account = row[0].strip()
+                try:
+                    if len(row) < 2 or not NAME_RE.match(account) or account.endswith("."):
+                        raise ValueError("invalid account name")
+                    amount = parse_amount(row[1], self.symbol)
+                except ValueError as error:
+                    report.rejected += 1
+                    rejected.writerow([line_no] + row + [error])
+                    continue
+                if account in seen:
+                    report.duplicates += 1
+                    rejected.writerow([line_no] + row + ["duplicate account"])
+                    continue
+                seen.add(account)
+                memo = row[2] if len(row) > 2 else self.memo
+                yield line_no, account, amount, memo
+
+    def batches(self, recipients):
+        batch = []
+        for recipient in recipients:
+            batch.append(recipient)
+            if len(batch) == self.token.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def send(self, number, batch):
+        started = time.monotonic()
+        payments = [(account, amount, memo) for _, account, amount, memo in batch]
+        if self.owner is None:
+            results = self.token.issue_many(payments, self.perm)
+        else:
+            results = self.token.transfer_many(self.owner, payments, self.perm)
+        return number, batch, results, time.monotonic() - started
+
+    def log(self, log, record):
+        log.write(json.dumps(record) + "\n")
+        log.flush()
+        os.fsync(log.fileno())
+
+    def record(self, future, log, failed, uncertain_rows, report):
+        number, batch, results, elapsed = future.result()
+        report.latencies.append(elapsed)
+        report.transactions += len({result.transaction_id for result in results if result.ok})
+        for (line_no, account, amount, memo), result in zip(batch, results):
+            if result.ok:
+                report.paid += 1
+            elif result.uncertain:
+                report.uncertain += 1
+                uncertain_rows.writerow([line_no, account, amount, memo, result.error])
+            else:
+                report.failed += 1
+                failed.writerow([line_no, account, amount, memo, result.error])
+        self.log(log, {"batch": number, "state": "done"})
+
+    def run(self, recipients_file):
+        uncertain, done, sent = self.load_checkpoint()
+        report = AirdropReport()
+        last_progress = time.monotonic()
+        with open(self.checkpoint, "a") as log, \
+                open(self.checkpoint + ".rejected", "w", newline="") as rejected_file, \
+                open(self.checkpoint + ".failed", "a", newline="") as failed_file, \
+                open(self.checkpoint + ".uncertain", "a", newline="") as uncertain_file, \
+                concurrent.futures.ThreadPoolExecutor(self.window) as pool:
+            rejected = csv.writer(rejected_file)
+            failed = csv.writer(failed_file)
+            uncertain_rows = csv.writer(uncertain_file)
+            in_flight = set()
+            recipients = self.recipients(recipients_file, report, rejected)
+            for number, batch in enumerate(self.batches(recipients)):
+                if number in done or number in uncertain:
+                    self.check_resumed(number, batch, sent)
+                if number in done:
+                    report.skipped += len(batch)
+                    continue
+                if number in uncertain:
+                    report.uncertain += len(batch)
+                    uncertain_rows.writerows(batch)
+                    self.log(log, {"batch": number, "state": "done", "uncertain": True})
+                    continue
+
+                while len(in_flight) >= self.window:
+                    finished, in_flight = concurrent.futures.wait(
+                        in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        self.record(future, log, failed, uncertain_rows, report)
+
+                self.log(log, self.sent_record(number, batch))
+                in_flight.add(pool.submit(self.send, number, batch))
+
+                if self.progress and time.monotonic() - last_progress >= self.progress_interval:
+                    self.progress(report.as_dict())
+                    last_progress = time.monotonic()
+
+            for future in concurrent.futures.as_completed(in_flight):
+                self.record(future, log, failed, uncertain_rows, report)
+
+        result = report.as_dict()
+        if self.progress:
+            self.progress(result)
+        return result
@@ -0,0 +1,260 @@
+import functools
+import re
+
+MAX_AMOUNT = (1 << 62) - 1
+MIN_INT64 = -(1 << 63)
+MAX_INT64 = (1 << 63) - 1
+MAX_PRECISION = 18
+
+SYMBOL_RE = re.compile(r"^[A-Z]{1,7}$")
+ASSET_RE = re.compile(r"^\s*(-?)([0-9]+)(?:\.([0-9]+))?\s+([A-Z]{1,7})\s*$")
+INT_RE = re.compile(r"^-?[0-9]+$")
+
+
+def int64(value):
+    """ value wrapped to int64, as the contract's (wasm) integer arithmetic does """
+    return (value - MIN_INT64) % (1 << 64) + MIN_INT64
+
+
+def symbol_code_value(code):
+    """ uint64 the chain uses for a symbol name (table primary key and stat scope) """
+    return sum(ord(char) << (8 * i) for i, char in enumerate(code))
+
+
+def symbol_code_string(value):
+    return value.to_bytes(8, "little").rstrip(b"\0").decode()
+
+
+class Symbol:
+    """ eosio symbol_type: precision and symbol name (e.g. 4,WISH) """
+    __slots__ = ("precision", "code")
+
+    def __init__(self, precision, code):
+        self.precision = precision
+        self.code = code
+
+    @classmethod
+    def from_string(cls, text):
+        text = str(text).strip()
+        if "," not in text:
+            raise ValueError("Symbol's precision and name should be separated with comma")
+        precision, code = text.split(",", 1)
+        if not INT_RE.match(precision.strip()):
+            raise ValueError("Invalid symbol precision: {}".format(precision))
+        precision = int(precision)
+        if precision > MAX_PRECISION:
+            raise ValueError("precision {} should be <= 18".format(precision))
+        symbol = cls(precision, code.strip())
+        if not symbol.is_valid():
+            raise ValueError("invalid symbol: {}".format(symbol.code))
+        return symbol
+
+    def is_valid(self):
+        return bool(SYMBOL_RE.match(self.code))
+
+    def name(self):
+        return self.code
+
+    def value(self):
+        """ uint64 of eosio symbol_type: precision in the low byte, symbol name above """
+        return self.precision | symbol_code_value(self.code) << 8
+
+    @classmethod
+    def from_value(cls, value):
+        return cls(value & 0xff, symbol_code_string(value >> 8))
+
+    def __eq__(self, other):
+        return (isinstance(other, Symbol)
+                and self.precision == other.precision
+                and self.code == other.code)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.precision, self.code))
+
+    def __repr__(self):
+        return "Symbol({}, {!r})".format(self.precision, self.code)
+
+    def __str__(self):
+        return "{},{}".format(self.precision, self.code)
+
+
+class Asset:
+    """ Exact counterpart of eosio::asset
+
+    ``amount`` is the raw int64 value (1.0000 WISH has amount 10000), so
+    arithmetic never goes through floats. Arithmetic between assets checks
+    symbols and range like eosiolib: ValueError on symbol mismatch,
+    OverflowError past the 2^62 - 1 limit. As in eosiolib, the range is
+    checked after the int64 sum wraps around, which amounts far outside
+    the range (e.g. burn values, which the contract does not validate)
+    can make it do.
+    """
+    __slots__ = ("amount", "symbol", "_text")
+
+    def __init__(self, amount, symbol):
+        self.amount = amount
+        self.symbol = symbol
+        self._text = None
+
+    @classmethod
+    def from_tokens(cls, tokens, symbol):
+        """ Asset of a whole number of tokens
+
+        Raises ValueError, with eosiolib's message, if the amount is out of
+        the asset range, rather than making an asset that would wrap.
+        """
+        amount = tokens * 10 ** symbol.precision
+        if not -MAX_AMOUNT <= amount <= MAX_AMOUNT:
+            raise ValueError("magnitude of asset amount must be less than 2^62")
+        return cls(amount, symbol)
+
+    @staticmethod
+    def parse(text):
+        if isinstance(text, Asset):
+            return text
+        return _parse(str(text))
+
+    def is_amount_within_range(self):
+        return -MAX_AMOUNT <= self.amount <= MAX_AMOUNT
+
+    def is_valid(self):
+        return self.is_amount_within_range() and self.symbol.is_valid()
+
+    def _check_symbol(self, other, operation):
+        if not isinstance(other, Asset):
+            return False
+        if self.symbol != other.symbol:
+            raise ValueError("attempt to {} asset with different symbol".format(operation))
+        return True
+
+    def __add__(self, other):
+        if not self._check_symbol(other, "add"):
+            return NotImplemented
+        amount = int64(self.amount + other.amount)
+        if amount < -MAX_AMOUNT:
+            raise OverflowError("addition underflow")
+        if amount > MAX_AMOUNT:
+            raise OverflowError("addition overflow")
+        return Asset(amount, self.symbol)
+
+    def __sub__(self, other):
+        if not self._check_symbol(other, "subtract"):
+            return NotImplemented
+        amount = int64(self.amount - other.amount)
+        if amount < -MAX_AMOUNT:
+            raise OverflowError("subtraction underflow")
+        if amount > MAX_AMOUNT:
+            raise OverflowError("subtraction overflow")
+        return Asset(amount, self.symbol)
+
+    def __neg__(self):
+        return Asset(-self.amount, self.symbol)
+
+    def __mul__(self, factor):
+        if not isinstance(factor, int):
+            return NotImplemented
+        amount = self.amount * factor
+        if amount < -MAX_AMOUNT:
+            raise OverflowError("multiplication underflow")
+        if amount > MAX_AMOUNT:
+            raise OverflowError("multiplication overflow")
+        return Asset(amount, self.symbol)
+
+    __rmul__ = __mul__
+
+    def __floordiv__(self, divisor):
+        if not isinstance(divisor, int):
+            return NotImplemented
+        if divisor == 0:
+            raise ZeroDivisionError("divide by zero")
+        # truncates toward zero like int64 division in the contract
+        amount = abs(self.amount) // abs(divisor)
+        if (self.amount < 0) != (divisor < 0):
+            amount = -amount
+        return Asset(amount, self.symbol)
+
+    def __bool__(self):
+        return self.amount != 0
+
+    def __eq__(self, other):
+        return (isinstance(other, Asset)
+                and self.amount == other.amount
+                and self.symbol == other.symbol)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        if not self._check_symbol(other, "compare"):
+            return NotImplemented
+        return self.amount < other.amount
+
+    def __le__(self, other):
+        if not self._check_symbol(other, "compare"):
+            return NotImplemented
+        return self.amount <= other.amount
+
+    def __gt__(self, other):
+        if not self._check_symbol(other, "compare"):
+            return NotImplemented
+        return self.amount > other.amount
+
+    def __ge__(self, other):
+        if not self._check_symbol(other, "compare"):
+            return NotImplemented
+        return self.amount >= other.amount
+
+    def __hash__(self):
+        return hash((self.amount, self.symbol.precision, self.symbol.code))
+
+    def __repr__(self):
+        return "Asset({!r})".format(str(self))
+
+    def __str__(self):
+        if self._text is None:
+            amount = self.amount
+            sign = "-" if amount < 0 else ""
+            amount = abs(amount)
+            precision = self.symbol.precision
+            if precision == 0:
+                self._text = "{}{} {}".format(sign, amount, self.symbol.code)
+            else:
+                integer, fraction = divmod(amount, 10 ** precision)
+                self._text = "{}{}.{:0{}d} {}".format(sign, integer, fraction, precision, self.symbol.code)
+        return self._text
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _parse(text):
+    match = ASSET_RE.match(text)
+    if match is None:
+        _raise_parse_error(text)
+    sign, integer, fraction, code = match.groups()
+    fraction = fraction or ""
+    precision = len(fraction)
+    if precision > MAX_PRECISION:
+        raise ValueError("precision {} should be <= 18".format(precision))
+    amount = int(integer + fraction)
+    if sign:
+        amount = -amount
+    if not MIN_INT64 <= amount <= MAX_INT64:
+        raise ValueError("Couldn't parse int64_t: {}".format(text))
+    return Asset(amount, Symbol(precision, code))
+
+
+def _raise_parse_error(text):
+    """ Reports a malformed asset with the message nodeos gives for it """
+    text = text.strip()
+    space = text.find(" ")
+    if space == -1:
+        raise ValueError("Asset's amount and symbol should be separated with space")
+    amount = text[:space]
+    dot = amount.find(".")
+    if dot == len(amount) - 1:
+        raise ValueError("Missing decimal fraction after decimal point")
+    precision = 0 if dot == -1 else len(amount) - dot - 1
+    Symbol.from_string("{},{}".format(precision, text[space + 1:].strip()))
+    raise ValueError("Couldn't parse int64_t: {}".format(amount))
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import struct
+import time
+import urllib.parse
+
+import chain_errors as errors
+from abi_serializer import (ABI_FILE, account_name, load_serializer, pack_transaction, time_point_sec,
+                            time_point_sec_string)
+from asset import Asset, Symbol
+from chain_api import default_node_url, default_wallet_url
+from unique_trx import UniqueExpirations, is_duplicate, transaction_key
+
+
+def error_message(result):
+    """ Message of a nodeos/keosd error response, assertion text first """
+    if not isinstance(result, dict):
+        return str(result)
+    error = result.get("error", {})
+    details = [detail.get("message") for detail in error.get("details", [])]
+    return "; ".join(filter(None, details)) or error.get("what") or json.dumps(result)
+
+
+class HttpPool:
+    """ Keep-alive HTTP/1.1 connections to one host, at most ``size`` at a time """
+
+    def __init__(self, url, size=16):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.size = size
+        self.idle = []
+        self.semaphore = None
+        self.opened = 0
+
+    async def connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def post(self, path, body):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.size)
+        payload = json.dumps(body).encode()
+        async with self.semaphore:
+            reused = bool(self.idle)
+            connection = self.idle.pop() if reused else await self.connect()
+            keep_alive = False
+            try:
+                try:
+                    status, keep_alive, data = await self.roundtrip(connection, path, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # the server dropped an idle connection, retry on a fresh one
+                    connection[1].close()
+                    connection = await self.connect()
+                    status, keep_alive, data = await self.roundtrip(connection, path, payload)
+            finally:
+                # only a connection that got a whole response goes back to the pool, whatever else happened
+                if keep_alive:
+                    self.idle.append(connection)
+                else:
+                    connection[1].close()
+        return status, json.loads(data.decode()) if data else None
+
+    async def roundtrip(self, connection, path, payload):
+        reader, writer = connection
+        writer.write((
+            "POST {} HTTP/1.1\r\n"
+            "Host: {}:{}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).format(path, self.host, self.port, len(payload)).encode() + payload)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+        keep_alive = (status_line.startswith(b"HTTP/1.1")
+                      and headers.get("connection", "").lower() != "close")
+        return status, keep_alive, bytes(data)
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class AsyncToken:
+    """ asyncio counterpart of Token over the nodeos chain API and keosd
+
+    Methods match Token's but are coroutines. Requests share keep-alive
+    connection pools of ``concurrency`` connections to the node and to the
+    wallet, so thousands of calls can be in flight from one event loop.
+    Transactions are signed by the (unlocked) keosd wallet; action data is
+    packed locally from the contract abi.
+    """
+    expiration_sec = 30
+    # retries of a transaction the node rejected as a duplicate (see Token.duplicate_retries)
+    duplicate_retries = 3
+    # head block used for TaPoS is refreshed at most this often
+    info_ttl = 0.5
+
+    def __init__(self, token_admin, token_account, token_supply, token_decimals, token_symbol,
+                 url=None, wallet_url=None, concurrency=16, abi_file=ABI_FILE):
+        self.admin = account_name(token_admin)
+        self.account = account_name(token_account)
+        self.max_supply = token_supply
+        self.decimals = token_decimals
+        self.symbol = token_symbol
+        self.deploy_params = Asset.from_tokens(token_supply, Symbol(token_decimals, token_symbol))
+        self.issuer = None
+        self.chain = HttpPool(url if url is not None else default_node_url(), concurrency)
+        self.wallet = HttpPool(wallet_url if wallet_url is not None else default_wallet_url(), concurrency)
+        self.info_request = None
+        self.info_time = 0
+        self.public_keys = None
+        self.serializer = load_serializer(abi_file)
+        self.unique = UniqueExpirations(self.expiration_sec)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.chain.close()
+        self.wallet.close()
+
+    async def call(self, pool, path, body):
+        status, result = await pool.post(path, body)
+        if not 200 <= status < 300:
+            raise errors.Error(error_message(result))
+        return result
+
+    async def get_info(self):
+        if self.info_request is None or (
+                self.info_request.done() and time.monotonic() - self.info_time > self.info_ttl):
+            self.info_time = time.monotonic()
+            self.info_request = asyncio.ensure_future(self.call(self.chain, "/v1/chain/get_info", {}))
+        return await self.info_request
+
+    async def get_public_keys(self):
+        if self.public_keys is None:
+            self.public_keys = await self.call(self.wallet, "/v1/wallet/get_public_keys", [])
+        return self.public_keys
+
+    async def transaction(self, actions, expiration_sec=None):
+        info = await self.get_info()
+        head_block_id = bytes.fromhex(info["head_block_id"])
+        expiration_sec = expiration_sec or self.expiration_sec
+        return {
+            "expiration": time_point_sec_string(time_point_sec(info["head_block_time"]) + expiration_sec),
+            "ref_block_num": info["head_block_num"] & 0xffff,
+            "ref_block_prefix": struct.unpack("<I", head_block_id[8:12])[0],
+            "max_net_usage_words": 0,
+            "max_cpu_usage_ms": 0,
+            "delay_sec": 0,
+            "context_free_actions": [],
+            "actions": actions,
+            "transaction_extensions": []
+        }
+
+    async def push_transaction(self, trx):
+        info = await self.get_info()
+        keys = await self.get_public_keys()
+        required = await self.call(self.chain, "/v1/chain/get_required_keys", {
+            "transaction": trx,
+            "available_keys": keys
+        })
+        signed = await self.call(self.wallet, "/v1/wallet/sign_transaction", [
+            trx, required["required_keys"], info["chain_id"]
+        ])
+        return await self.call(self.chain, "/v1/chain/push_transaction", {
+            "signatures": signed["signatures"],
+            "compression": "none",
+            "packed_context_free_data": "",
+            "packed_trx": pack_transaction(trx).hex()
+        })
+
+    async def push_action(self, action, data, perm):
+        actions = [{
+            "account": self.account,
+            "name": action,
+            "authorization": [{"actor": account_name(perm), "permission": "active"}],
+            "data": self.serializer.pack_action_data(action, data).hex()
+        }]
+        key = transaction_key(actions)
+        for attempt in range(self.duplicate_retries + 1):
+            trx = await self.transaction(actions, self.unique.allocate(key))
+            try:
+                return await self.push_transaction(trx)
+            except errors.Error as error:
+                if not is_duplicate(error) or attempt == self.duplicate_retries:
+                    raise
+
+    async def create(self, token_owner, perm):
+        self.issuer = account_name(token_owner)
+        return await self.push_action("create", {
+            "issuer": self.issuer,
+            "maximum_supply": str(self.deploy_params)
+        }, perm)
+
+    async def createlocked(self, token_owner, perm):
+        self.issuer = account_name(token_owner)
+        return await self.push_action("createlocked", {
+            "issuer": self.issuer,
+            "maximum_supply": str(self.deploy_params)
+        }, perm)
+
+    async def issue(self, to, amount, memo, perm):
+        return await self.push_action("issue", {
+            "to": account_name(to),
+            "quantity": str(amount),
+            "memo": memo
+        }, perm)
+
+    async def transfer(self, owner, to, amount, memo, perm):
+        return await self.push_action("transfer", {
+            "from": account_name(owner),
+            "to": account_name(to),
+            "quantity": str(amount),
+            "memo": memo
+        }, perm)
+
+    async def unlock(self, symbol, perm):
+        return await self.push_action("unlock", {"symbol": str(symbol)}, perm)
+
+    async def withdraw(self, contract, amount, perm):
+        return await self.push_action("withdraw", {
+            "contract": account_name(contract),
+            "quantity": str(amount)
+        }, perm)
+
+    async def burn(self, owner, amount, perm):
+        return await self.push_action("burn", {
+            "owner": account_name(owner),
+            "value": str(amount)
+        }, perm)
+
+    async def get_table_rows(self, table, scope):
+        result = await self.call(self.chain, "/v1/chain/get_table_rows", {
+            "code": self.account,
+            "table": table,
+            "scope": scope,
+            "json": True
+        })
+        return result["rows"]
+
+    async def get_balance(self, user_account):
+        for row in await self.get_table_rows("accounts", account_name(user_account)):
+            balance = Asset.parse(row["balance"])
+            if balance.symbol.code == self.symbol:
+                return balance
+        raise IndexError("no {} balance in rows".format(self.symbol))
+
+    async def get_stats(self):
+        stats = dict((await self.get_table_rows("stat", self.symbol))[0])
+        stats["supply"] = Asset.parse(stats["supply"])
+        stats["max_supply"] = Asset.parse(stats["max_supply"])
+        return stats
+
+    def to_quantity(self, amount, decimals, symbol):
+        return Asset.from_tokens(amount, Symbol(decimals, symbol))
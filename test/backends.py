@@ -0,0 +1,34 @@
+import importlib
+
+# backend name -> (module, class); a module is imported the first time its backend is used
+BACKENDS = {
+    "eosfactory": ("eosfactory_backend", "EosfactoryChain"),
+    "http": ("chain_api", "ChainApi"),
+    "memory": ("token_sim", "TokenSimulator")
+}
+
+
+def load(name):
+    """ Class of a backend, imported on first use
+
+    A backend is anything with the calls Token makes of its chain:
+    push_action, push_actions, set_contract, get_table_rows,
+    get_table_by_scope, get_info and get_code_hash/get_abi (see
+    ChainApi), raising chain_errors.Error for rejected transactions.
+    """
+    module, attr = BACKENDS[name]
+    return getattr(importlib.import_module(module), attr)
+
+
+def default_chain(account):
+    """ Backend for the contract account of a Token
+
+    Simulated accounts belong to their simulator, account names are
+    reached over HTTP, and other account objects are eosfactory's.
+    """
+    chain = getattr(account, "chain", None)
+    if chain is not None:
+        return chain
+    if isinstance(account, str):
+        return load("http")()
+    return load("eosfactory")()
@@ -0,0 +1,188 @@
+import argparse
+import concurrent.futures
+import itertools
+import json
+import random
+import re
+import time
+
+import chain_errors as errors
+from asset import Asset
+from chain_fixture import NodeFixture, SimulatorFixture
+from metrics import latency_summary, trace_samples
+from token_class import Token
+
+WORKLOADS = ["hot-pair", "uniform", "zipf"]
+
+
+def read_config():
+    with open("config.h") as cfg_file:
+        admin = re.search(r"#define ADMIN (\w+)", cfg_file.read()).group(1)
+    with open("deploy_data.json") as deploy_config:
+        deploy = json.load(deploy_config)
+    return admin, deploy
+
+
+def pairs(workload, names, count, rng, zipf_s=1.1):
+    """ (from, to) of every transfer of a workload """
+    if len(names) < 2:
+        raise ValueError("at least 2 accounts are needed")
+    if workload == "hot-pair":
+        # back and forth, so the pair never runs out of tokens
+        for i in range(count):
+            yield (names[0], names[1]) if i % 2 == 0 else (names[1], names[0])
+        return
+    if workload == "uniform":
+        cum_weights = None
+    elif workload == "zipf":
+        cum_weights = list(itertools.accumulate(1 / rank ** zipf_s for rank in range(1, len(names) + 1)))
+    else:
+        raise ValueError("unknown workload {}".format(workload))
+    for _ in range(count):
+        sender, receiver = rng.choices(names, cum_weights=cum_weights, k=2)
+        while receiver == sender:
+            receiver = rng.choices(names, cum_weights=cum_weights)[0]
+        yield sender, receiver
+
+
+def summary(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    result = latency_summary(values)
+    result["mean"] = sum(values) / len(values)
+    return result
+
+
+class Benchmark:
+    """ Transfer load test against a local node or the simulator
+
+    Leases ``accounts`` accounts from the fixture's account pool, issues
+    every one of them enough to send all ``actions`` transfers, then
+    pushes one transfer per transaction, ``concurrency`` at a time, and
+    reports throughput, latency percentiles and the resources billed per
+    action.
+    """
+
+    def __init__(self, accounts=100, actions=1000, workload="uniform", concurrency=1,
+                 simulate=False, seed=0, zipf_s=1.1):
+        self.accounts = accounts
+        self.actions = actions
+        self.workload = workload
+        self.concurrency = concurrency
+        self.simulate = simulate
+        self.seed = seed
+        self.zipf_s = zipf_s
+        self.admin, self.deploy = read_config()
+        self.token = None
+
+    def deploy_token(self, accounts):
+        Token(
+            accounts["admin_acc"],
+            accounts["token_deployer_acc"],
+            self.deploy["maximum_supply"],
+            self.deploy["decimals"],
+            self.deploy["symbol"]
+        ).deploy()
+
+    def setup(self):
+        if self.simulate:
+            fixture = SimulatorFixture(self.admin, self.deploy_token, pool_size=self.accounts)
+        else:
+            fixture = NodeFixture(self.admin, self.deploy_token, pool_size=self.accounts)
+        accounts = fixture.restore()
+        admin_acc = accounts["admin_acc"]
+        self.token = Token(
+            admin_acc,
+            accounts["token_deployer_acc"],
+            self.deploy["maximum_supply"],
+            self.deploy["decimals"],
+            self.deploy["symbol"]
+        )
+        self.token.create(admin_acc, admin_acc)
+
+        names = fixture.pool.lease(self.accounts)
+        unit = Asset(1, self.token.deploy_params.symbol)
+        results = self.token.issue_many([(name, unit * self.actions, "bench") for name in names], admin_acc)
+        failed = [result.error for result in results if not result.ok]
+        if failed:
+            raise failed[0]
+        return names, unit
+
+    def transfer(self, sender, receiver, unit):
+        action = self.token.to_action(
+            "transfer",
+            {"from": sender, "to": receiver, "quantity": unit, "memo": "bench"},
+            sender
+        )
+        started = time.monotonic()
+        trx = self.token.push_actions([action])
+        return time.monotonic() - started, trace_samples(trx)[0]
+
+    def run(self):
+        names, unit = self.setup()
+        rng = random.Random(self.seed)
+        latencies, billed, errors_seen = [], [], []
+        started = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as pool:
+            futures = [
+                pool.submit(self.transfer, sender, receiver, unit)
+                for sender, receiver in pairs(self.workload, names, self.actions, rng, self.zipf_s)
+            ]
+            for future in futures:
+                try:
+                    latency, usage = future.result()
+                except errors.Error as error:
+                    errors_seen.append(str(error))
+                    continue
+                latencies.append(latency)
+                billed.append(usage)
+        elapsed = time.monotonic() - started
+
+        return {
+            "backend": "simulator" if self.simulate else "nodeos",
+            "workload": self.workload,
+            "accounts": self.accounts,
+            "actions": self.actions,
+            "concurrency": self.concurrency,
+            "seed": self.seed,
+            "elapsed": elapsed,
+            "executed": len(latencies),
+            "failed": len(errors_seen),
+            "first_error": errors_seen[0] if errors_seen else None,
+            "actions_per_sec": len(latencies) / elapsed if elapsed else 0,
+            "latency": latency_summary(latencies),
+            "cpu_usage_us": summary([usage["cpu_usage_us"] for usage in billed]),
+            "net_usage_bytes": summary([usage["net_usage_bytes"] for usage in billed]),
+            "ram_bytes": summary([usage["ram_bytes"] for usage in billed])
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="transfer throughput/latency benchmark")
+    parser.add_argument("--accounts", type=int, default=100, help="number of accounts to provision")
+    parser.add_argument("--actions", type=int, default=1000, help="number of transfers to push")
+    parser.add_argument("--workload", choices=WORKLOADS, default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="skew of the zipf workload")
+    parser.add_argument("--concurrency", type=int, default=1, help="transactions in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--simulate", help="run against the in-process contract simulator",
+                        action="store_true")
+    parser.add_argument("--output", default="bench.json", help="where to write the JSON results")
+    args = parser.parse_args()
+    if not args.simulate:
+        import eosfactory_backend
+        eosfactory_backend.quiet()
+
+    result = Benchmark(
+        accounts=args.accounts,
+        actions=args.actions,
+        workload=args.workload,
+        concurrency=args.concurrency,
+        simulate=args.simulate,
+        seed=args.seed,
+        zipf_s=args.zipf_s
+    ).run()
+    with open(args.output, "w") as output:
+        json.dump(result, output, indent=2)
+    print(json.dumps(result, indent=2))
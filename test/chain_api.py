@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import urllib.error
+import urllib.request
+
+import chain_errors as errors
+from abi_serializer import CONTRACT_DIR, account_name
+from unique_trx import canonical
+
+
+# read from the same settings eosfactory uses when a client is made, not on
+# import, so a test worker that sets them up picks its own node and wallet
+def default_node_url():
+    return "http://" + os.environ.get("LOCAL_NODE_ADDRESS", "127.0.0.1:8888")
+
+
+def default_wallet_url():
+    return "http://" + os.environ.get("WALLET_MANAGER_ADDRESS", "127.0.0.1:8900")
+
+
+class ChainApi:
+    """ HTTP backend: a running node, read through its HTTP API and pushed to with cleos
+
+    Transactions are signed with the keys of the keosd wallet at
+    wallet_url (eosfactory's wallet in tests).
+    """
+
+    def __init__(self, url=None, cleos="cleos", wallet_url=None):
+        self.url = url if url is not None else default_node_url()
+        self.cleos = cleos
+        self.wallet_url = wallet_url if wallet_url is not None else default_wallet_url()
+
+    def run_cleos(self, *args):
+        process = subprocess.run(
+            [self.cleos, "--url", self.url, "--wallet-url", self.wallet_url] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        if process.returncode != 0:
+            raise errors.Error(process.stderr.strip())
+        return process.stdout
+
+    def post(self, endpoint, body):
+        request = urllib.request.Request(
+            self.url + endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read().decode())
+        except urllib.error.HTTPError as error:
+            raise errors.Error(error.read().decode())
+
+    def create_key(self):
+        """ New (private, public) key pair """
+        output = self.run_cleos("create", "key", "--to-console")
+        keys = dict(line.split(": ", 1) for line in output.strip().splitlines())
+        return keys["Private key"], keys["Public key"]
+
+    def import_key(self, private_key, wallet="default"):
+        self.run_cleos("wallet", "import", "-n", wallet, "--private-key", private_key)
+
+    def get_info(self):
+        return self.post("/v1/chain/get_info", {})
+
+    def get_table_rows(self, code, table, scope, lower_bound=None, limit=None, binary=False):
+        """ rows as json, or as hex with binary=True (see AbiSerializer.unpack_row) """
+        body = {"code": code, "table": table, "scope": scope, "json": not binary}
+        if lower_bound is not None:
+            body["lower_bound"] = lower_bound
+        if limit is not None:
+            body["limit"] = limit
+        return self.post("/v1/chain/get_table_rows", body)
+
+    def get_table_by_scope(self, code, table, lower_bound="", limit=10):
+        return self.post("/v1/chain/get_table_by_scope", {
+            "code": code,
+            "table": table,
+            "lower_bound": lower_bound,
+            "limit": limit
+        })
+
+    def get_code_hash(self, account):
+        return self.post("/v1/chain/get_code_hash", {"account_name": account})
+
+    def get_abi(self, account):
+        return self.post("/v1/chain/get_abi", {"account_name": account})
+
+    def get_actions(self, account, pos=-1, offset=-20):
+        """ Actions account received, from the history plugin """
+        return self.post("/v1/history/get_actions", {"account_name": account, "pos": pos, "offset": offset})
+
+    def push_action(self, account, action, data, permission=None, expiration_sec=None, force_unique=False):
+        """ Pushes one action of contract account, authorized by (actor, permission) """
+        actor, level = permission if permission is not None else (account, "active")
+        return self.push_actions([{
+            "account": account_name(account),
+            "name": action,
+            "authorization": [{"actor": account_name(actor), "permission": getattr(level, "value", level)}],
+            "data": data
+        }], expiration_sec=expiration_sec, force_unique=force_unique)
+
+    def push_actions(self, actions, max_cpu_usage_ms=None, expiration_sec=None, force_unique=False):
+        """ Signs (with the wallet) and pushes one transaction """
+        args = ["push", "transaction", json.dumps({"actions": actions}, default=canonical), "--json"]
+        if max_cpu_usage_ms:
+            args += ["--max-cpu-usage-ms", str(max_cpu_usage_ms)]
+        if expiration_sec:
+            args += ["--expiration", str(expiration_sec)]
+        if force_unique:
+            args.append("--force-unique")
+        return json.loads(self.run_cleos(*args))
+
+    def set_contract(self, account):
+        """ Sets the code and abi of the local eosio.token build on account """
+        self.run_cleos("set", "contract", account_name(account), CONTRACT_DIR,
+                       "eosio.token.wasm", "eosio.token.abi", "--json")
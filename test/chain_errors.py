@@ -0,0 +1,32 @@
+import re
+
+# what nodeos (or the simulator) says of a transaction it refused: nothing of
+# it was applied, so its actions may be sent again
+REJECTED_RE = re.compile(
+    r"assertion failure|eosio_assert|missing authority|irrelevant authority|unsatisfied_authorization"
+    r"|unknown action|missing field|couldn't parse|invalid|does not exist|magnitude of asset|cpu usage",
+    re.IGNORECASE
+)
+
+
+class Error(Exception):
+    """ An action or transaction the chain rejected
+
+    Every backend (eosfactory, HTTP, simulator) raises this, so callers
+    catch one type whichever chain they run against, and importing it
+    does not import eosfactory.
+    """
+
+
+def eosio_assert(condition, message):
+    if not condition:
+        raise Error("assertion failure with message: {}".format(message))
+
+
+def is_rejected(error):
+    """ True if the chain refused the transaction
+
+    Other errors (a timeout, a dropped connection, a duplicate of one
+    already applied) leave it unknown whether the transaction went in.
+    """
+    return bool(REJECTED_RE.search(str(error)))
@@ -0,0 +1,203 @@
+import copy
+import hashlib
+import json
+import os
+import shutil
+
+from account_pool import DEV_PUBLIC_KEY, AccountPool
+from chain_api import ChainApi
+from token_sim import TokenSimulator
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CACHE_DIR = os.path.join(ROOT_DIR, ".fixtures")
+
+
+# read when a fixture is made, so a parallel test worker keeps its own snapshots
+def default_cache_dir():
+    return os.environ.get("FIXTURE_CACHE_DIR", CACHE_DIR)
+
+# everything the bootstrapped chain depends on
+FIXTURE_FILES = [
+    "eosio.token/eosio.token.wasm",
+    "eosio.token/eosio.token.abi",
+    "deploy_data.json",
+    "config.h"
+]
+
+ACCOUNTS = [
+    "admin_acc",
+    "token_deployer_acc",
+    "token_buyer",
+    "token_buyer2",
+    "token_buyer3"
+]
+
+_snapshots = {}
+
+WORKER_BASE_PORT = 18888
+
+
+def worker_environment(worker, base_dir, base_port=WORKER_BASE_PORT):
+    """ Settings giving parallel test worker number ``worker`` a node of its own
+
+    Each worker gets its own nodeos http/p2p and keosd ports and its own
+    data, config, wallet and fixture snapshot directories under base_dir.
+    eosfactory, ChainApi and NodeFixture read these settings from the
+    environment.
+    """
+    worker_dir = os.path.join(base_dir, "worker{}".format(worker))
+    http_port = base_port + 3 * worker
+    config_dir = os.path.join(worker_dir, "config")
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "config.ini"), "w") as node_config:
+        node_config.write("p2p-listen-endpoint = 127.0.0.1:{}\n".format(http_port + 1))
+    return {
+        "LOCAL_NODE_ADDRESS": "127.0.0.1:{}".format(http_port),
+        "WALLET_MANAGER_ADDRESS": "127.0.0.1:{}".format(http_port + 2),
+        "LOCAL_NODE_DATA_DIR": os.path.join(worker_dir, "data"),
+        "LOCAL_NODE_CONFIG_DIR": config_dir,
+        "KEOSD_WALLET_DIR": os.path.join(worker_dir, "wallet"),
+        "FIXTURE_CACHE_DIR": os.path.join(worker_dir, "fixtures")
+    }
+
+
+def fixture_key(files, *extra):
+    digest = hashlib.sha256()
+    for value in extra:
+        digest.update(str(value).encode())
+    for path in files:
+        digest.update(path.encode())
+        full_path = os.path.join(ROOT_DIR, path)
+        if os.path.exists(full_path):
+            with open(full_path, "rb") as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+class SimulatorFixture:
+    """ Bootstraps the simulator once per process and hands out copies of it
+
+    With pool_size, the snapshot also holds an AccountPool of that many
+    accounts; every restore() sets ``pool`` to a fresh lease of it.
+    """
+
+    def __init__(self, admin, deploy, pool_size=0):
+        self.admin = admin
+        self.deploy = deploy
+        self.pool_size = pool_size
+        self.pool = None
+        self.names = {
+            "admin_acc": admin,
+            "token_deployer_acc": "tokendeploy",
+            "token_buyer": "tokenbuyer",
+            "token_buyer2": "tokenbuyer2",
+            "token_buyer3": "tokenbuyer3"
+        }
+        self.key = fixture_key(FIXTURE_FILES + ["test/token_sim.py"], pool_size)
+
+    def build(self):
+        chain = TokenSimulator(self.admin)
+        accounts = {"master": chain.system_account}
+        for alias in ACCOUNTS:
+            accounts[alias] = chain.create_account(self.names[alias])
+        self.deploy(accounts)
+        pool = AccountPool(chain, chain.system_account)
+        if self.pool_size:
+            pool.provision(self.pool_size, [DEV_PUBLIC_KEY])
+        return chain, pool.manifest()
+
+    def restore(self):
+        if self.key not in _snapshots:
+            _snapshots[self.key] = self.build()
+        chain, manifest = _snapshots[self.key]
+        chain = copy.deepcopy(chain)
+        self.pool = AccountPool.from_manifest(chain, chain.system_account, manifest)
+        accounts = {"master": chain.system_account}
+        for alias in ACCOUNTS:
+            accounts[alias] = chain.accounts[self.names[alias]]
+        return accounts
+
+
+class NodeFixture:
+    """ Snapshot of the bootstrapped local node (data dir and wallet)
+
+    The first run bootstraps the node with reset() and stores its data
+    directory under .fixtures/<key>; later runs copy it back and resume()
+    instead. The key hashes the contract and deploy configuration, so the
+    snapshot is rebuilt only when those change. A fixture with a cache_dir
+    of its own (a parallel worker's) starts from a copy of the shared
+    .fixtures/<key> if there is one.
+
+    With pool_size, the snapshot also holds an AccountPool of that many
+    accounts sharing pool_keys keys; every restore() sets ``pool`` to a
+    fresh lease of it. eosfactory is imported when the fixture is first
+    restored.
+    """
+
+    def __init__(self, admin, deploy, cache_dir=None, pool_size=0, pool_keys=10):
+        self.admin = admin
+        self.deploy = deploy
+        self.pool_size = pool_size
+        self.pool_keys = pool_keys
+        self.pool = None
+        self.key = fixture_key(FIXTURE_FILES, pool_size, pool_keys)
+        self.snapshot_dir = os.path.join(cache_dir if cache_dir is not None else default_cache_dir(), self.key)
+        self.shared_dir = os.path.join(CACHE_DIR, self.key)
+
+    def build(self):
+        from eosfactory_backend import create_account, create_master_account, eosf
+        eosf.reset()
+        eosf.create_wallet()
+        accounts = {"master": create_master_account("master")}
+        for alias in ACCOUNTS:
+            accounts[alias] = create_account(alias, accounts["master"], self.admin if alias == "admin_acc" else "")
+        self.deploy(accounts)
+        self.pool = AccountPool(ChainApi(), accounts["master"])
+        if self.pool_size:
+            self.pool.provision(self.pool_size, self.pool.generate_keys(min(self.pool_keys, self.pool_size)))
+        return accounts
+
+    def save(self, accounts):
+        from eosfactory_backend import config, eosf
+        eosf.stop()
+        # parallel workers may build the same snapshot at once, the first one wins
+        tmp_dir = "{}.{}.tmp".format(self.snapshot_dir, os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.copytree(config.data_dir(), os.path.join(tmp_dir, "data"))
+        shutil.copytree(config.keosd_wallet_dir(), os.path.join(tmp_dir, "wallet"))
+        with open(os.path.join(tmp_dir, "accounts.json"), "w") as names:
+            json.dump({alias: accounts[alias].name for alias in ACCOUNTS}, names)
+        with open(os.path.join(tmp_dir, "pool.json"), "w") as pool:
+            json.dump(self.pool.manifest(), pool)
+        try:
+            os.replace(tmp_dir, self.snapshot_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        eosf.resume()
+
+    def load(self):
+        from eosfactory_backend import config, create_account, create_master_account, eosf
+        eosf.stop()
+        for name, target in (("data", config.data_dir()), ("wallet", config.keosd_wallet_dir())):
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(os.path.join(self.snapshot_dir, name), target)
+        eosf.resume()
+
+        with open(os.path.join(self.snapshot_dir, "accounts.json")) as names:
+            names = json.load(names)
+        # account objects are restored from the existing chain records
+        accounts = {"master": create_master_account("master")}
+        for alias in ACCOUNTS:
+            accounts[alias] = create_account(alias, accounts["master"], names[alias])
+        with open(os.path.join(self.snapshot_dir, "pool.json")) as pool:
+            self.pool = AccountPool.from_manifest(ChainApi(), accounts["master"], json.load(pool))
+        return accounts
+
+    def restore(self):
+        if not os.path.isdir(self.snapshot_dir) and os.path.isdir(self.shared_dir):
+            shutil.copytree(self.shared_dir, self.snapshot_dir)
+        if not os.path.isdir(self.snapshot_dir):
+            accounts = self.build()
+            self.save(accounts)
+            return accounts
+        return self.load()
@@ -0,0 +1,65 @@
+import eosfactory.core.config as config
+import eosfactory.eosf as eosf
+
+import chain_errors as errors
+from chain_api import ChainApi
+
+CONTRACT_PATH = "eosiotokenstandalone/eosio.token/"
+
+
+def create_master_account(alias):
+    """ eosfactory's master account object, created (or restored) under alias """
+    return _account(alias, eosf.create_master_account(alias))
+
+
+def create_account(alias, creator, name=""):
+    """ eosfactory account object, created (or restored from the chain records) under alias """
+    return _account(alias, eosf.create_account(alias, creator, name))
+
+
+def _account(alias, account):
+    # eosfactory also puts the object into the globals of its caller, which is always this module
+    return account if account is not None else globals()[alias]
+
+
+def node_address():
+    """ host:port of the node eosfactory is configured to run and talk to """
+    return config.http_server_address().split("://")[-1].rstrip("/")
+
+
+def quiet():
+    eosf.verbosity([])  # disable logs
+
+
+def verbose():
+    eosf.verbosity([eosf.Verbosity.INFO, eosf.Verbosity.OUT, eosf.Verbosity.TRACE, eosf.Verbosity.DEBUG])
+
+
+class EosfactoryChain(ChainApi):
+    """ eosfactory backend: pushes through eosfactory account objects, reads over HTTP
+
+    eosfactory's errors are raised as chain_errors.Error, chained to the
+    original one.
+    """
+
+    def push_action(self, account, action, data, permission=None, expiration_sec=None, force_unique=False):
+        if permission is not None:
+            actor, level = permission
+            permission = (actor, eosf.Permission(getattr(level, "value", level)))
+        try:
+            return account.push_action(action, data, permission=permission, expiration_sec=expiration_sec,
+                                       forceUnique=int(force_unique)).json
+        except eosf.errors.Error as error:
+            raise errors.Error(str(error)) from error
+
+    def set_contract(self, account):
+        try:
+            contract = eosf.Contract(
+                account.name,
+                CONTRACT_PATH,
+                abi_file="eosio.token.abi",
+                wasm_file="eosio.token.wasm"
+            )
+            contract.deploy()
+        except eosf.errors.Error as error:
+            raise errors.Error(str(error)) from error
@@ -0,0 +1,158 @@
+import bisect
+import collections
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+from abi_serializer import name_to_string, string_to_name
+from asset import Asset, Symbol, symbol_code_string, symbol_code_value
+from metrics import bucket
+
+MAGIC = b"HOLDSNAP"
+VERSION = 1
+# magic, version, precision, symbol code, block_num, count; padded to 64 bytes
+HEADER = struct.Struct("<8sHB5xQQQ24x")
+NAME = struct.Struct("<Q")
+AMOUNT = struct.Struct("<q")
+
+
+def write_snapshot(path, holders, symbol, block_num):
+    """ Writes (owner, balance) pairs, sorted by owner, as a columnar snapshot
+
+    Owners go to the file as they come and amounts to a temporary file
+    appended after them, so memory does not grow with the number of
+    holders. The file is replaced atomically.
+    """
+    tmp_path = path + ".tmp"
+    count = 0
+    last = -1
+    try:
+        with open(tmp_path, "wb") as output, tempfile.TemporaryFile() as amounts:
+            output.write(HEADER.pack(MAGIC, VERSION, symbol.precision, symbol_code_value(symbol.code), block_num, 0))
+            for owner, balance in holders:
+                name = string_to_name(owner)
+                if name <= last:
+                    raise ValueError("holders must be sorted by account name ({} after {})".format(
+                        owner, name_to_string(last)))
+                last = name
+                output.write(NAME.pack(name))
+                amounts.write(AMOUNT.pack(balance.amount))
+                count += 1
+            amounts.seek(0)
+            while True:
+                chunk = amounts.read(1 << 20)
+                if not chunk:
+                    break
+                output.write(chunk)
+            output.seek(0)
+            output.write(HEADER.pack(MAGIC, VERSION, symbol.precision, symbol_code_value(symbol.code), block_num, count))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return count
+
+
+def export_token(path, token, page_size=100):
+    """ Snapshot of every holder of a Token, read scope by scope through Token.holders
+
+    The block number is the node's head block when the export started.
+    """
+    block_num = token.chain.get_info()["head_block_num"]
+    symbol = Symbol(token.decimals, token.symbol)
+    return write_snapshot(path, token.holders(page_size=page_size), symbol, block_num)
+
+
+class HolderSnapshot:
+    """ Memory-mapped columnar holder snapshot
+
+    ``names`` (uint64 account names, ascending) and ``amounts`` (int64
+    raw balances) are memoryviews straight over the mapped file: nothing
+    is copied or parsed, and either one can be handed to
+    numpy.frombuffer as is.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, precision, code, self.block_num, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a holder snapshot".format(path))
+        self.symbol = Symbol(precision, symbol_code_string(code))
+        view = memoryview(self.map)
+        names_end = HEADER.size + count * NAME.size
+        self.names = view[HEADER.size:names_end].cast("Q")
+        self.amounts = view[names_end:names_end + count * AMOUNT.size].cast("q")
+        view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # the map cannot be closed while views of it are alive
+        for view in (getattr(self, "names", None), getattr(self, "amounts", None)):
+            if view is not None:
+                view.release()
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """ (owner, raw amount) in account name order """
+        for name, amount in zip(self.names, self.amounts):
+            yield name_to_string(name), amount
+
+    def asset(self, amount):
+        return Asset(amount, self.symbol)
+
+    def balance(self, owner):
+        name = string_to_name(owner)
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            return self.asset(self.amounts[index])
+        return self.asset(0)
+
+    def sum(self):
+        return self.asset(sum(self.amounts))
+
+    def top(self, count):
+        """ (owner, balance) of the count largest holders, largest first """
+        indexes = heapq.nlargest(count, range(len(self.amounts)), key=self.amounts.__getitem__)
+        return [(name_to_string(self.names[index]), self.asset(self.amounts[index])) for index in indexes]
+
+    def histogram(self):
+        """ Number of holders per power-of-two bucket of raw amount (see metrics.bucket) """
+        counts = collections.Counter(map(bucket, self.amounts))
+        return {bound: counts[bound] for bound in sorted(counts)}
+
+
+def diff(old, new):
+    """ Yields (owner, old balance, new balance) of every holder whose balance changed
+
+    Walks both snapshots in account name order, without loading either.
+    """
+    if old.symbol != new.symbol:
+        raise ValueError("cannot diff {} against {}".format(old.symbol, new.symbol))
+    i = j = 0
+    while i < len(old) or j < len(new):
+        old_name = old.names[i] if i < len(old) else None
+        new_name = new.names[j] if j < len(new) else None
+        if new_name is None or (old_name is not None and old_name < new_name):
+            yield name_to_string(old_name), old.asset(old.amounts[i]), new.asset(0)
+            i += 1
+        elif old_name is None or new_name < old_name:
+            yield name_to_string(new_name), old.asset(0), new.asset(new.amounts[j])
+            j += 1
+        else:
+            if old.amounts[i] != new.amounts[j]:
+                yield name_to_string(old_name), old.asset(old.amounts[i]), new.asset(new.amounts[j])
+            i += 1
+            j += 1
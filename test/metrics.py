@@ -0,0 +1,182 @@
+import collections
+import csv
+import json
+import math
+import threading
+
+
+def percentile(sorted_values, q):
+    """ Nearest-rank percentile (q in 0..100) of an already sorted list """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None
+    }
+
+
+def bucket(value):
+    """ Upper bound of the power-of-two histogram bucket of value (3 -> 4, -3 -> -4, 0 -> 0) """
+    magnitude = math.ceil(abs(value))
+    bound = 1 << (magnitude - 1).bit_length() if magnitude else 0
+    return bound if value >= 0 else -bound
+
+
+class Histogram:
+    """ Counts per power-of-two bucket; memory does not grow with the number of values """
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """ Bucket bound the nearest-rank percentile falls in """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bound in sorted(self.buckets):
+            seen += self.buckets[bound]
+            if seen >= rank:
+                return bound
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {str(bound): self.buckets[bound] for bound in sorted(self.buckets)}
+        }
+
+
+def ram_deltas(trace, deltas=None):
+    """ RAM delta per payer of an action trace and everything it triggered """
+    deltas = {} if deltas is None else deltas
+    for entry in trace.get("account_ram_deltas", []):
+        deltas[entry["account"]] = deltas.get(entry["account"], 0) + entry["delta"]
+    for inline in trace.get("inline_traces", []):
+        ram_deltas(inline, deltas)
+    return deltas
+
+
+def elapsed_us(trace):
+    return trace.get("elapsed", 0) + sum(elapsed_us(inline) for inline in trace.get("inline_traces", []))
+
+
+def inline_actions(trace):
+    """ "contract::action" of the inline actions a trace sent (notifications left out) """
+    actions = []
+    for inline in trace.get("inline_traces", []):
+        act = inline["act"]
+        if inline["receipt"]["receiver"] == act["account"]:
+            actions.append("{}::{}".format(act["account"], act["name"]))
+        actions += inline_actions(inline)
+    return actions
+
+
+def trace_samples(trx):
+    """ One resource sample per action of a pushed transaction
+
+    cpu and net are billed per transaction; a transaction of several
+    actions has them split evenly between its actions.
+    """
+    processed = trx.get("processed", {})
+    receipt = processed.get("receipt", {})
+    traces = processed.get("action_traces", [])
+    cpu_usage_us = receipt.get("cpu_usage_us")
+    net_usage_words = receipt.get("net_usage_words")
+    samples = []
+    for trace in traces:
+        act = trace["act"]
+        data = act.get("data") if isinstance(act.get("data"), dict) else {}
+        memo = data.get("memo")
+        deltas = ram_deltas(trace)
+        samples.append({
+            "transaction_id": trx.get("transaction_id", processed.get("id")),
+            "action": act["name"],
+            "cpu_usage_us": cpu_usage_us / len(traces) if cpu_usage_us is not None else None,
+            "net_usage_bytes": net_usage_words * 8 / len(traces) if net_usage_words is not None else None,
+            "elapsed_us": elapsed_us(trace),
+            "ram_bytes": sum(deltas.values()) if "account_ram_deltas" in trace else None,
+            "ram_deltas": deltas,
+            "new_row": any(delta > 0 for delta in deltas.values()),
+            "memo_bytes": len(memo.encode()) if isinstance(memo, str) else None,
+            "inline_actions": inline_actions(trace)
+        })
+    return samples
+
+
+def action_shape(sample):
+    """ Default ResourceMetrics group: the action and whether it created table rows """
+    return "{}{}".format(sample["action"], "/new_row" if sample["new_row"] else "")
+
+
+class ResourceMetrics:
+    """ Metrics hook for Token: histograms of the resources of every action
+
+    Samples (see trace_samples) are grouped by ``group`` (action name and
+    new/existing row by default) into one Histogram per numeric field.
+    The last ``max_samples`` raw samples are kept for CSV export.
+    """
+    FIELDS = ["cpu_usage_us", "net_usage_bytes", "elapsed_us", "ram_bytes", "memo_bytes"]
+
+    def __init__(self, group=action_shape, max_samples=100000):
+        self.group = group
+        self.samples = collections.deque(maxlen=max_samples)
+        self.histograms = collections.defaultdict(lambda: {field: Histogram() for field in self.FIELDS})
+        self.lock = threading.Lock()
+
+    def record(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            histograms = self.histograms[self.group(sample)]
+            for field in self.FIELDS:
+                if sample.get(field) is not None:
+                    histograms[field].add(sample[field])
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                group: {field: histogram.as_dict() for field, histogram in histograms.items() if histogram.count}
+                for group, histograms in sorted(self.histograms.items())
+            }
+
+    def write_json(self, path):
+        with open(path, "w") as output:
+            json.dump(self.as_dict(), output, indent=2)
+
+    def write_csv(self, path):
+        columns = ["transaction_id", "action"] + self.FIELDS + ["new_row", "ram_deltas", "inline_actions"]
+        with self.lock:
+            samples = list(self.samples)
+        with open(path, "w", newline="") as output:
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            for sample in samples:
+                row = [sample.get(column) for column in columns]
+                row[-2] = json.dumps(sample["ram_deltas"], sort_keys=True)
+                row[-1] = " ".join(sample["inline_actions"])
+                writer.writerow(row)
@@ -0,0 +1,175 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+
+from chain_fixture import worker_environment
+
+TEST_MODULE = "unittest_tokenstandalone"
+TEST_CASE = "TokenStandaloneTests"
+
+
+class WorkerResult(unittest.TestResult):
+    """ TestResult that keeps a picklable outcome per test
+
+    Stops early when ``stop`` (a shared event) is set by any worker.
+    """
+
+    def __init__(self, worker, stop, failfast=False):
+        super().__init__()
+        self.worker = worker
+        self.stop = stop
+        self.failfast = failfast
+        self.outcomes = []
+        self.started = 0
+
+    @property
+    def shouldStop(self):
+        return self._should_stop or (self.stop is not None and self.stop.is_set())
+
+    @shouldStop.setter
+    def shouldStop(self, value):
+        self._should_stop = value
+
+    def startTest(self, test):
+        super().startTest(test)
+        self.started = time.monotonic()
+
+    def add_outcome(self, test, outcome, err=None):
+        self.outcomes.append({
+            "test": test.id(),
+            "worker": self.worker,
+            "outcome": outcome,
+            "duration": time.monotonic() - self.started,
+            "traceback": "".join(traceback.format_exception(*err)) if err else None
+        })
+        if outcome in ("failure", "error") and self.failfast and self.stop is not None:
+            self.stop.set()
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.add_outcome(test, "success")
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.add_outcome(test, "failure", err)
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.add_outcome(test, "error", err)
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.add_outcome(test, "skipped")
+
+
+def test_names():
+    module = __import__(TEST_MODULE)
+    return unittest.TestLoader().getTestCaseNames(getattr(module, TEST_CASE))
+
+
+def shard(names, workers):
+    """ Round-robin split of the test names over the workers """
+    return [names[worker::workers] for worker in range(workers) if names[worker::workers]]
+
+
+def check_node(worker, env):
+    """ Fails unless eosfactory and ChainApi both talk to the worker's own node """
+    import eosfactory_backend
+    from chain_api import ChainApi
+    expected = env["LOCAL_NODE_ADDRESS"]
+    for client, address in (("eosfactory", eosfactory_backend.node_address()),
+                            ("ChainApi", ChainApi().url.split("://")[-1])):
+        if address != expected:
+            raise RuntimeError("worker {}: {} talks to the node at {}, not to the worker's own node at {}".format(
+                worker, client, address, expected))
+
+
+def run_shard(worker, names, simulate, failfast, stop, env):
+    """ Runs one shard in a worker process against the worker's own node """
+    os.environ.update(env)
+    module = __import__(TEST_MODULE)
+    module.SIMULATE = simulate
+    if not simulate:
+        import eosfactory_backend
+        eosfactory_backend.quiet()
+        check_node(worker, env)
+    test_case = getattr(module, TEST_CASE)
+    # tests are independent, one failing must not skip the rest of its shard
+    test_case.stop_on_failure = False
+    suite = unittest.TestSuite(test_case(name) for name in names)
+    result = WorkerResult(worker, stop, failfast)
+    suite.run(result)
+    return result.outcomes
+
+
+def merge(outcomes, names, elapsed):
+    """ One report of all workers' outcomes, in test order """
+    order = {name: index for index, name in enumerate(names)}
+    outcomes = sorted(outcomes, key=lambda outcome: order.get(outcome["test"].rsplit(".", 1)[-1], len(order)))
+    ran = {outcome["test"].rsplit(".", 1)[-1] for outcome in outcomes}
+    totals = {"success": 0, "failure": 0, "error": 0, "skipped": 0}
+    for outcome in outcomes:
+        totals[outcome["outcome"]] += 1
+    totals["not_run"] = len([name for name in names if name not in ran])
+    return {"elapsed": elapsed, "totals": totals, "tests": outcomes}
+
+
+def print_report(report):
+    for outcome in report["tests"]:
+        if outcome["traceback"]:
+            print("=" * 70)
+            print("{}: {} (worker {})".format(outcome["outcome"].upper(), outcome["test"], outcome["worker"]))
+            print("-" * 70)
+            print(outcome["traceback"])
+    totals = report["totals"]
+    print("Ran {} tests in {:.3f}s".format(
+        sum(totals[key] for key in ("success", "failure", "error", "skipped")), report["elapsed"]))
+    print(", ".join("{} {}".format(value, key) for key, value in totals.items() if value))
+
+
+def run(workers, simulate=False, failfast=False, base_dir=None):
+    names = test_names()
+    shards = shard(names, workers)
+    base_dir = base_dir or tempfile.mkdtemp(prefix="token_workers_")
+    context = multiprocessing.get_context("spawn")
+    started = time.monotonic()
+    outcomes = []
+    with context.Manager() as manager:
+        stop = manager.Event()
+        with concurrent.futures.ProcessPoolExecutor(len(shards), mp_context=context) as pool:
+            futures = [
+                pool.submit(run_shard, worker, names_shard, simulate, failfast, stop,
+                            worker_environment(worker, base_dir))
+                for worker, names_shard in enumerate(shards)
+            ]
+            for future in futures:
+                outcomes += future.result()
+    return merge(outcomes, names, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="runs the token tests sharded over worker processes, "
+                                                 "each worker with its own node")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--simulate", help="run against the in-process contract simulator",
+                        action="store_true")
+    parser.add_argument("--failfast", help="stop all workers after the first failure",
+                        action="store_true")
+    parser.add_argument("--base-dir", help="where the workers' node data and wallets go (default: temp dir)")
+    parser.add_argument("--report", help="also write the merged report as JSON to this file")
+    args = parser.parse_args()
+
+    report = run(args.workers, args.simulate, args.failfast, args.base_dir)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as output:
+            json.dump(report, output, indent=2)
+    totals = report["totals"]
+    sys.exit(1 if totals["failure"] or totals["error"] else 0)
@@ -0,0 +1,199 @@
+import contextlib
+import functools
+import json
+import threading
+import time
+
+# backend calls by what they cost: a round trip to the node (or the simulated chain) or a table read
+NODE_CALLS = ["push_action", "push_actions", "push_transaction", "set_contract", "create_key", "import_key"]
+READ_CALLS = ["get_table_rows", "get_table_by_scope", "get_info", "get_code_hash", "get_abi", "get_actions"]
+FIELDS = ["wall", "node", "reads", "node_calls", "reads_calls"]
+PHASES = ["setUp", "test", "tearDown"]
+
+
+def new_totals():
+    return dict.fromkeys(FIELDS, 0)
+
+
+def add(totals, other):
+    for field in FIELDS:
+        totals[field] += other[field]
+
+
+def summary(totals):
+    """ Totals with local work (wall time not spent in node round trips or table reads), seconds rounded to us """
+    row = {field: round(totals[field], 6) for field in FIELDS}
+    row["local"] = round(max(0, totals["wall"] - totals["node"] - totals["reads"]), 6)
+    return row
+
+
+class StepProfiler:
+    """ Wall time of every labelled step of a test run, split by where it went
+
+    Each label (a cprint of the suite, see ``label``) ends the running
+    step and starts one of that name. The time before the first label of
+    setUp, the test method and tearDown is a step named after the phase.
+    The backend classes passed to ``instrument`` have their push and read
+    calls timed, so a step's wall time splits into node round trips,
+    table reads and local work. A call made from within another timed
+    call is part of the outer one.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # test -> step name -> totals and phase
+        self.tests = {}
+        self.steps = None
+        self.phase = None
+        self.step = None
+        self.started = None
+        self.patched = []
+        self.calls = threading.local()
+        self.lock = threading.Lock()
+
+    def instrument(self, cls):
+        """ Times the push and read calls of a backend class and its bases until ``restore`` """
+        for klass in cls.__mro__[:-1]:
+            for kind, names in (("node", NODE_CALLS), ("reads", READ_CALLS)):
+                for name in names:
+                    if name in klass.__dict__:
+                        original = klass.__dict__[name]
+                        setattr(klass, name, self.timed(original, kind))
+                        self.patched.append((klass, name, original))
+
+    def restore(self):
+        for klass, name, original in reversed(self.patched):
+            setattr(klass, name, original)
+        self.patched = []
+
+    def timed(self, function, kind):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if getattr(self.calls, "depth", 0):
+                return function(*args, **kwargs)
+            self.calls.depth = 1
+            started = self.clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.calls.depth = 0
+                self.charge(kind, self.clock() - started)
+        return timed
+
+    def charge(self, kind, elapsed):
+        with self.lock:
+            if self.step is not None:
+                self.step[kind] += elapsed
+                self.step[kind + "_calls"] += 1
+
+    def begin(self, test, phase):
+        self.end()
+        self.steps = self.tests.setdefault(test, {})
+        self.phase = phase
+        self.open(phase)
+
+    def end(self):
+        self.close()
+        self.steps = None
+        self.phase = None
+
+    def open(self, name):
+        self.close()
+        with self.lock:
+            self.step = self.steps.setdefault(name, dict(new_totals(), phase=self.phase))
+            self.started = self.clock()
+
+    def close(self):
+        with self.lock:
+            if self.step is not None:
+                self.step["wall"] += self.clock() - self.started
+                self.step = None
+
+    def label(self, text):
+        """ Starts the step a printed label names; labels outside of a test are ignored """
+        if self.steps is not None:
+            self.open(text.strip())
+
+    def phased(self, test, phase, function):
+        @functools.wraps(function)
+        def phased(*args, **kwargs):
+            self.begin(test, phase)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.end()
+        return phased
+
+    @contextlib.contextmanager
+    def profile(self, test_case):
+        """ Profiles setUp, the test method and tearDown of one run of a unittest.TestCase """
+        test = "{}.{}".format(type(test_case).__name__, test_case._testMethodName)
+        attrs = ["setUp", test_case._testMethodName, "tearDown"]
+        for phase, attr in zip(PHASES, attrs):
+            setattr(test_case, attr, self.phased(test, phase, getattr(test_case, attr)))
+        try:
+            yield
+        finally:
+            for attr in attrs:
+                delattr(test_case, attr)
+            self.end()
+
+    def report(self):
+        """ Steps, setUp/test/tearDown and overall totals of every test """
+        tests = {}
+        for test, steps in self.tests.items():
+            phases = {phase: new_totals() for phase in PHASES}
+            total = new_totals()
+            for totals in steps.values():
+                add(phases[totals["phase"]], totals)
+                add(total, totals)
+            tests[test] = {
+                "steps": {name: dict(summary(totals), phase=totals["phase"]) for name, totals in steps.items()},
+                "phases": {phase: summary(totals) for phase, totals in phases.items()},
+                "total": summary(total)
+            }
+        return {"tests": tests}
+
+    def write(self, path):
+        with open(path, "w") as output:
+            json.dump(self.report(), output, indent=2)
+
+
+def slower(before, after, threshold, min_delta):
+    """ True if after took threshold (a fraction) and min_delta seconds longer than before """
+    return after["wall"] - before["wall"] >= min_delta and after["wall"] > before["wall"] * (1 + threshold)
+
+
+def compare(baseline, current, threshold=0.25, min_delta=0.01):
+    """ Steps, labelled setUp/tearDown phases and tests of current that got slower than in baseline
+
+    Each regression names the part of the wall time (node, reads or
+    local) that grew the most. Steps missing from the baseline are
+    skipped.
+    """
+    regressions = []
+    for test, results in current["tests"].items():
+        before = baseline["tests"].get(test)
+        if before is None:
+            continue
+        rows = [(name, row, before["steps"].get(name)) for name, row in results["steps"].items()]
+        for phase in ("setUp", "tearDown"):
+            # a phase without labels is a single step of its name already
+            if [row["phase"] for row in results["steps"].values()].count(phase) > 1:
+                rows.append((phase + " (all steps)", results["phases"][phase], before["phases"].get(phase)))
+        rows.append(("total", results["total"], before["total"]))
+        for name, row, old in rows:
+            if old is None or not slower(old, row, threshold, min_delta):
+                continue
+            regressions.append({
+                "test": test,
+                "step": name,
+                "baseline": old["wall"],
+                "current": row["wall"],
+                "grew": max(["node", "reads", "local"], key=lambda part: row[part] - old[part])
+            })
+    return regressions
+
+
+def format_regression(regression):
+    return "{test} {step}: {baseline:.3f}s -> {current:.3f}s (mostly {grew})".format(**regression)
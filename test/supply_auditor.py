@@ -0,0 +1,139 @@
+import collections
+import threading
+import time
+
+from abi_serializer import account_name
+from asset import Asset
+from transfer_log import contract_actions
+
+# change of the sum of all balances per contract action
+SUPPLY_SIGNS = {"issue": 1, "issueto": 1, "burn": -1}
+# contract actions moving balances between scopes without changing their sum
+MOVES = {"transfer", "transfermany", "unlock", "withdraw"}
+
+
+class SupplyAuditor:
+    """ Checks sum of all balances == stat.supply <= stat.max_supply
+
+    The sum of the balances is a running total updated from the
+    transactions the auditor is fed (Token.auditor, or ``ingest``):
+    issue/issueto add to it, burn takes from it, transfers leave it
+    unchanged. ``check`` then reads the one stat row instead of every
+    accounts scope. ``full_scan`` sums the balances table scope by scope
+    through Token.holders, page by page, and rebases the running total on
+    what it found, unless a balance changed meanwhile (a transfer between
+    a scanned and an unscanned scope is counted twice or not at all);
+    ``start`` runs it every scan_interval seconds in a background thread.
+    The total is unknown until the auditor sees the token's create or
+    completes a full scan.
+    """
+    max_violations = 1000
+
+    def __init__(self, token, scan_interval=60.0, page_size=100):
+        self.token = token
+        self.contract = account_name(token.account)
+        self.scan_interval = scan_interval
+        self.page_size = page_size
+        self.balance_sum = None
+        # number of balance changes seen, a full scan is only conclusive if none happened during it
+        self.generation = 0
+        self.scans = 0
+        self.violations = collections.deque(maxlen=self.max_violations)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def ingest(self, trx):
+        """ Applies the supply changes of a pushed transaction """
+        processed = trx.get("processed", trx)
+        with self.lock:
+            for trace in processed.get("action_traces", []):
+                for act in contract_actions(trace, self.contract):
+                    self.apply(act)
+
+    def apply(self, act):
+        data = act["data"]
+        if act["name"] in ("create", "createlocked"):
+            if Asset.parse(data["maximum_supply"]).symbol.code == self.token.symbol:
+                self.balance_sum = 0
+                self.generation += 1
+            return
+        if act["name"] in MOVES:
+            self.generation += 1
+            return
+        sign = SUPPLY_SIGNS.get(act["name"])
+        if sign is None:
+            return
+        quantity = Asset.parse(data["quantity"] if "quantity" in data else data["value"])
+        if quantity.symbol.code != self.token.symbol:
+            return
+        self.generation += 1
+        if self.balance_sum is not None:
+            self.balance_sum += sign * quantity.amount
+
+    def violation(self, check, message, stats, balance_sum):
+        violation = {
+            "check": check,
+            "message": message,
+            "time": time.time(),
+            "supply": str(stats["supply"]),
+            "max_supply": str(stats["max_supply"]),
+            "balance_sum": balance_sum
+        }
+        self.violations.append(violation)
+        return violation
+
+    def compare(self, check, stats, balance_sum):
+        violations = []
+        if stats["supply"].amount > stats["max_supply"].amount:
+            violations.append(self.violation(check, "supply exceeds max_supply", stats, balance_sum))
+        if balance_sum is not None and balance_sum != stats["supply"].amount:
+            violations.append(self.violation(
+                check, "balances add up to {} instead of supply".format(balance_sum), stats, balance_sum))
+        return violations
+
+    def check(self):
+        """ Violations found comparing the running total with the stat row """
+        with self.lock:
+            balance_sum = self.balance_sum
+            stats = self.token.get_stats(strict=True)
+        return self.compare("incremental", stats, balance_sum)
+
+    def full_scan(self):
+        """ Violations found summing every balance; None if a balance changed meanwhile """
+        with self.lock:
+            generation = self.generation
+        scanned = sum(balance.amount for _, balance in self.token.holders(page_size=self.page_size))
+        with self.lock:
+            stats = self.token.get_stats(strict=True)
+            if self.generation != generation:
+                return None
+            self.balance_sum = scanned
+            self.scans += 1
+        return self.compare("full_scan", stats, scanned)
+
+    def run(self):
+        while not self.stopped.wait(self.scan_interval):
+            try:
+                self.full_scan()
+            except Exception as error:
+                self.violations.append({"check": "full_scan", "message": "scan failed: {}".format(error),
+                                        "time": time.time()})
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="supply-auditor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
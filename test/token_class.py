@@ -1,6 +1,51 @@
-from eosfactory.eosf import *
+import collections
+import hashlib
+import json
+import math
+import os
+import struct
+
+import chain_errors as errors
+from abi_serializer import ABI_FILE, CONTRACT_DIR, account_name, load_serializer
+from asset import Asset, Symbol, symbol_code_value
+from backends import default_chain
+from chain_errors import eosio_assert
+from metrics import trace_samples
+from table_cache import TableCache
+from unique_trx import UniqueExpirations, is_duplicate, transaction_key
+
+# outcome of one action pushed through Token.push_many; an uncertain one
+# failed with an error that does not tell whether its transaction went in
+ActionResult = collections.namedtuple(
+    "ActionResult",
+    ["index", "action", "data", "ok", "transaction_id", "error", "uncertain"],
+    defaults=(False,)
+)
+
+
+def abi_matches(local, remote):
+    """ True if the on-chain abi has every type, struct, action and table of the local one """
+    if not remote:
+        return False
+    for key in ("types", "structs", "actions", "tables"):
+        entries = remote.get(key, [])
+        if len(entries) != len(local.get(key, [])):
+            return False
+        for entry in local.get(key, []):
+            if not any(all(other.get(field) == value for field, value in entry.items()) for other in entries):
+                return False
+    return True
+
 
 class Token:
+    """ eosio.token client, independent of the chain it talks to
+
+    ``chain`` is the backend actions are pushed to and tables read from
+    (see backends): by default the simulator of a simulated account, HTTP
+    for an account name and eosfactory for eosfactory's account objects.
+    Backends are imported on first use, so importing Token does not
+    import eosfactory.
+    """
     admin = None
     issuer = None
     account = None
@@ -8,9 +53,42 @@ class Token:
     decimals = None
     decimals_str = None
     symbol = None
-    contract = None
+    chain = None
+    # transactions built by push_many hold at most batch_size actions and
+    # at most batch_cpu_budget_us of estimated cpu (action_cpu_us per action)
+    batch_size = 50
+    batch_cpu_budget_us = 150000
+    action_cpu_us = 300
+    # balances and stats read with strict=False (and by preflight checks) are
+    # served from cache for cache_ttl seconds; Token's own actions invalidate them
+    cache = None
+    cache_ttl = 1.0
+    cache_size = 10000
+    # reject requests the contract is certain to reject before sending them;
+    # off by default, so the node stays the one that enforces the contract
+    preflight = False
+    # "issueto" credits the recipient directly instead of crediting the
+    # issuer and sending an inline transfer
+    issue_action = "issue"
+    # "transfermany" makes transfer_many send one transfermany action per
+    # batch instead of one transfer action per recipient
+    transfer_action = "transfer"
+    # metrics hook (e.g. metrics.ResourceMetrics), gets a sample of the
+    # resources used by every action Token pushes successfully
+    metrics = None
+    # transfer_log.TransferLog fed with every transaction Token pushes successfully
+    transfer_log = None
+    # supply_auditor.SupplyAuditor fed with every transaction Token pushes successfully
+    auditor = None
+    # batched actions carry data packed from the local abi, so the node
+    # does not convert json for every action
+    pack_actions = True
+    # identical transactions get different expirations (see UniqueExpirations);
+    # one the node still rejects as a duplicate is retried this many times
+    duplicate_retries = 3
 
-    def __init__(self, token_admin, token_account, token_supply, token_decimals, token_symbol):
+    def __init__(self, token_admin, token_account, token_supply, token_decimals, token_symbol, chain=None,
+                 cache=None):
         self.admin = token_admin
         self.account = token_account
         self.max_supply = token_supply
@@ -18,106 +96,470 @@ class Token:
         self.decimals_str = str(10 ** token_decimals)[1:]
         self.symbol = token_symbol
         self.deploy_params = self.to_quantity(self.max_supply, self.decimals, self.symbol)
+        self.chain = chain if chain is not None else default_chain(token_account)
+        # tokens of one contract may share a cache, keys include the symbol
+        self.cache = cache if cache is not None else TableCache(self.cache_ttl, self.cache_size)
+        self.serializer = load_serializer(ABI_FILE)
+        self.unique = UniqueExpirations()
 
-    def deploy(self):
-        self.contract = Contract(
-            self.account.name,
-            "eosiotokenstandalone/eosio.token/",
-            abi_file="eosio.token.abi",
-            wasm_file="eosio.token.wasm"
-        )
-        self.contract.deploy()
+    def deploy(self, force=False):
+        if not force and self.is_deployed():
+            return
+        self.chain.set_contract(self.account)
+
+    def is_deployed(self):
+        """ True if the account already runs the local wasm and abi, so set code/abi can be skipped """
+        wasm_file = os.path.join(CONTRACT_DIR, "eosio.token.wasm")
+        if not os.path.exists(wasm_file):
+            return False
+        with open(wasm_file, "rb") as wasm:
+            code_hash = hashlib.sha256(wasm.read()).hexdigest()
+        if self.chain.get_code_hash(account_name(self.account))["code_hash"] != code_hash:
+            return False
+        with open(ABI_FILE) as abi:
+            return abi_matches(json.load(abi), self.chain.get_abi(account_name(self.account)).get("abi"))
 
     def create(self, token_owner, perm):
+        self.check("create", {"issuer": token_owner, "maximum_supply": self.deploy_params})
         self.issuer = token_owner
-        self.account.push_action(
+        result = self.push_action(
             "create",
                 {
                     "issuer": self.issuer,
-                    "maximum_supply": self.deploy_params
+                    "maximum_supply": str(self.deploy_params)
                 },
-                permission=(perm, Permission.ACTIVE)
+                permission=(perm, "active")
         )
+        self.record(result)
+        self.invalidate("create", {})
 
     def createlocked(self, token_owner, perm):
+        self.check("createlocked", {"issuer": token_owner, "maximum_supply": self.deploy_params})
         self.issuer = token_owner
-        self.account.push_action(
+        result = self.push_action(
             "createlocked",
                 {
                     "issuer": token_owner,
-                    "maximum_supply": self.deploy_params
+                    "maximum_supply": str(self.deploy_params)
                 },
-                permission=(perm, Permission.ACTIVE)
+                permission=(perm, "active")
         )
+        self.record(result)
+        self.invalidate("createlocked", {})
 
     def issue(self, to, amount, memo, perm):
-        self.account.push_action(
-            "issue",
+        self.check(self.issue_action, {"to": to, "quantity": amount, "memo": memo})
+        result = self.push_action(
+            self.issue_action,
                 {
                     "to":       to,
-                    "quantity": amount,
+                    "quantity": str(amount),
                     "memo":     memo
                 },
-                permission=(perm, Permission.ACTIVE)
+                permission=(perm, "active")
         )
+        self.record(result)
+        self.invalidate(self.issue_action, {"to": to})
 
     def transfer(self, owner, to, amount, memo, perm):
-        self.account.push_action(
+        self.check("transfer", {"from": owner, "to": to, "quantity": amount, "memo": memo})
+        result = self.push_action(
             "transfer",
                 {
                     "from":     owner,
                     "to":       to,
-                    "quantity": amount,
+                    "quantity": str(amount),
                     "memo":     memo
                 },
-                permission=(perm, Permission.ACTIVE)
+                permission=(perm, "active")
         )
+        self.record(result)
+        self.invalidate("transfer", {"from": owner, "to": to})
+
+    def transfermany(self, owner, transfers, memo, perm):
+        """ transfers: (to, amount) pairs, paid in one action """
+        data = {
+            "from": owner,
+            "transfers": [{"to": account_name(to), "quantity": str(amount)} for to, amount in transfers],
+            "memo": memo
+        }
+        self.check("transfermany", data)
+        result = self.push_action(
+            "transfermany",
+                data,
+                permission=(perm, "active")
+        )
+        self.record(result)
+        self.invalidate("transfermany", data)
 
     def unlock(self, symbol, perm):
-        self.account.push_action(
+        result = self.push_action(
             "unlock",
                 {
-                    "symbol": symbol
+                    "symbol": str(symbol)
                 },
-            permission=(perm, Permission.ACTIVE)
+            permission=(perm, "active")
         )
+        self.record(result)
+        self.invalidate("unlock", {})
 
     def withdraw(self, contract, amount, perm):
-        self.account.push_action(
+        result = self.push_action(
             "withdraw",
                 {
                     "contract": contract,
-                    "quantity":  amount,
+                    "quantity":  str(amount),
+                },
+            permission=(perm, "active")
+        )
+        self.record(result)
+        self.invalidate("withdraw", {})
+
+    def burn(self, owner, amount, perm):
+        result = self.push_action(
+            "burn",
+                {
+                    "owner": owner,
+                    "value": str(amount)
                 },
-            permission=(perm, Permission.ACTIVE)
+            permission=(perm, "active")
+        )
+        self.record(result)
+        self.invalidate("burn", {"owner": owner})
+
+    def push_unique(self, key, push):
+        """ push(expiration_sec) with an expiration no pending identical transaction has """
+        for attempt in range(self.duplicate_retries + 1):
+            try:
+                return push(self.unique.allocate(key))
+            except errors.Error as error:
+                if not is_duplicate(error) or attempt == self.duplicate_retries:
+                    raise
+
+    def push_action(self, action, data, permission):
+        return self.push_unique(
+            transaction_key([account_name(self.account), action, data, permission]),
+            lambda expiration_sec: self.chain.push_action(
+                self.account, action, data, permission=permission, expiration_sec=expiration_sec)
         )
 
+    def push_actions(self, actions, max_cpu_usage_ms=None):
+        return self.push_unique(
+            transaction_key(actions),
+            lambda expiration_sec: self.chain.push_actions(
+                actions, max_cpu_usage_ms=max_cpu_usage_ms, expiration_sec=expiration_sec)
+        )
+
+    def issue_many(self, issues, perm):
+        """ issues: (to, amount, memo) tuples, returns an ActionResult per issue """
+        return self.push_many(
+            [(self.issue_action, {"to": to, "quantity": amount, "memo": memo}) for to, amount, memo in issues],
+            perm
+        )
+
+    def transfer_many(self, owner, transfers, perm):
+        """ transfers: (to, amount, memo) tuples, returns an ActionResult per transfer """
+        if self.transfer_action == "transfermany":
+            return self.push_transfers(owner, transfers, perm)
+        return self.push_many(
+            [("transfer", {"from": owner, "to": to, "quantity": amount, "memo": memo})
+             for to, amount, memo in transfers],
+            perm
+        )
+
+    def push_transfers(self, owner, transfers, perm):
+        results = [None] * len(transfers)
+        batch = []
+        for index, (to, amount, memo) in enumerate(transfers):
+            data = {"from": owner, "to": to, "quantity": amount, "memo": memo}
+            try:
+                self.check("transfer", data)
+            except errors.Error as error:
+                results[index] = ActionResult(index, "transfermany", data, False, None, error)
+                continue
+            # one action carries one memo
+            if batch and (len(batch) == self.batch_size or batch[-1][1]["memo"] != memo):
+                self.push_transfermany(owner, batch, perm, results)
+                batch = []
+            batch.append((index, data))
+        if batch:
+            self.push_transfermany(owner, batch, perm, results)
+        return results
+
+    def push_transfermany(self, owner, batch, perm, results):
+        data = {
+            "from": owner,
+            "transfers": [{"to": account_name(item["to"]), "quantity": str(item["quantity"])} for _, item in batch],
+            "memo": batch[0][1]["memo"]
+        }
+        try:
+            trx = self.push_actions(
+                [self.to_action("transfermany", data, perm)],
+                max_cpu_usage_ms=math.ceil(self.batch_cpu_budget_us / 1000)
+            )
+        except errors.Error as error:
+            if not errors.is_rejected(error):
+                for index, item in batch:
+                    results[index] = ActionResult(index, "transfermany", item, False, None, error, True)
+                return
+            if len(batch) == 1:
+                index, item = batch[0]
+                results[index] = ActionResult(index, "transfermany", item, False, None, error)
+                return
+            # the action failed as a whole, split it to find the failing transfers
+            middle = len(batch) // 2
+            self.push_transfermany(owner, batch[:middle], perm, results)
+            self.push_transfermany(owner, batch[middle:], perm, results)
+            return
+        self.record(trx)
+        self.invalidate("transfermany", data)
+        for index, item in batch:
+            results[index] = ActionResult(index, "transfermany", item, True, trx["transaction_id"], None)
+
+    def push_many(self, actions, perm):
+        results = [None] * len(actions)
+        accepted = []
+        for index, (name, data) in enumerate(actions):
+            try:
+                self.check(name, data)
+            except errors.Error as error:
+                results[index] = ActionResult(index, name, data, False, None, error)
+                continue
+            accepted.append((index, (name, data)))
+        actions = accepted
+        size = max(1, min(self.batch_size, self.batch_cpu_budget_us // self.action_cpu_us))
+        for start in range(0, len(actions), size):
+            self.push_batch(actions[start:start + size], perm, results)
+        return results
+
+    def push_batch(self, batch, perm, results):
+        try:
+            trx = self.push_actions(
+                [self.to_action(name, data, perm) for _, (name, data) in batch],
+                max_cpu_usage_ms=math.ceil(self.batch_cpu_budget_us / 1000)
+            )
+        except errors.Error as error:
+            if not errors.is_rejected(error):
+                # it may have been applied, sending it again could apply it twice
+                for index, (name, data) in batch:
+                    results[index] = ActionResult(index, name, data, False, None, error, True)
+                return
+            if len(batch) == 1:
+                index, (name, data) = batch[0]
+                results[index] = ActionResult(index, name, data, False, None, error)
+                return
+            # the transaction was rolled back as a whole, split it to find the failing actions
+            middle = len(batch) // 2
+            self.push_batch(batch[:middle], perm, results)
+            self.push_batch(batch[middle:], perm, results)
+            return
+        self.record(trx)
+        for index, (name, data) in batch:
+            self.invalidate(name, data)
+            results[index] = ActionResult(index, name, data, True, trx["transaction_id"], None)
+
+    def check(self, action, data):
+        """ Raises the contract's assertion for a request it is certain to reject
+
+        Checks run in the contract's order but skip what cannot be decided
+        locally (authority, balances, account existence), so a request that
+        fails several of them may be rejected with a different message than
+        the node would give. Stat rows come from the cache; a rejection
+        based on them is confirmed with a strict read first.
+        """
+        if not self.preflight:
+            return
+        if self.preflight_error(action, data, strict=False) is None:
+            return
+        message = self.preflight_error(action, data, strict=True)
+        eosio_assert(message is None, message)
+
+    def preflight_error(self, action, data, strict):
+        quantity = data.get("maximum_supply", data.get("quantity"))
+        memo = data.get("memo", "")
+        if action == "transfermany":
+            if not data["transfers"]:
+                return "no transfers"
+            for item in data["transfers"]:
+                transfer = {"from": data["from"], "to": item["to"], "quantity": item["quantity"], "memo": memo}
+                error = self.preflight_error("transfer", transfer, strict)
+                if error is not None:
+                    return error
+            return None
+        try:
+            quantity = Asset.parse(quantity)
+        except (TypeError, ValueError):
+            return None  # left to the node's abi parser
+        if not isinstance(memo, str):
+            return None
+        sym = quantity.symbol
+        memo_too_long = len(memo.encode()) > 256
+
+        if action in ("create", "createlocked"):
+            if not sym.is_valid():
+                return "invalid symbol name"
+            if not quantity.is_valid():
+                return "invalid supply"
+            if quantity.amount <= 0:
+                return "max-supply must be positive"
+            if self.find_stats(sym.name(), strict) is not None:
+                return "token with symbol already exists"
+
+        elif action in ("issue", "issueto"):
+            if not sym.is_valid():
+                return "invalid symbol name"
+            if memo_too_long:
+                return "memo has more than 256 bytes"
+            st = self.find_stats(sym.name(), strict)
+            if st is None:
+                return "token with symbol does not exist, create token before issue"
+            if not quantity.is_valid():
+                return "invalid quantity"
+            if quantity.amount <= 0:
+                return "must issue positive quantity"
+            if sym != st["supply"].symbol:
+                return "symbol precision mismatch"
+            if quantity.amount > st["max_supply"].amount - st["supply"].amount:
+                return "quantity exceeds available supply"
+
+        elif action == "transfer":
+            owner = account_name(data["from"])
+            if owner == account_name(data["to"]):
+                return "cannot transfer to self"
+            if not sym.is_valid():
+                return None  # the node's abi parser rejects it first
+            st = self.find_stats(sym.name(), strict)
+            if st is None:
+                return "unable to find key"
+            if st["lock"] and owner != st["issuer"]:
+                return "token is locked"
+            if not quantity.is_valid():
+                return "invalid quantity"
+            if quantity.amount <= 0:
+                return "must transfer positive quantity"
+            if sym != st["supply"].symbol:
+                return "symbol precision mismatch"
+            if memo_too_long:
+                return "memo has more than 256 bytes"
+        return None
+
+    def to_action(self, name, data, perm):
+        if self.pack_actions:
+            try:
+                data = self.serializer.pack_action_data(name, data).hex()
+            except (ValueError, TypeError, AttributeError, OverflowError, struct.error) as error:
+                # what the node would refuse to convert
+                raise errors.Error("Invalid data for action {}: {}".format(name, error))
+        else:
+            data = {
+                key: str(value) if isinstance(value, Asset) else account_name(value)
+                for key, value in data.items()
+            }
+        return {
+            "account": account_name(self.account),
+            "name": name,
+            "authorization": [{"actor": account_name(perm), "permission": "active"}],
+            "data": data
+        }
+
+    def record(self, trx):
+        if self.metrics is not None:
+            for sample in trace_samples(trx):
+                self.metrics.record(sample)
+        if self.transfer_log is not None:
+            self.transfer_log.ingest(trx)
+        if self.auditor is not None:
+            self.auditor.ingest(trx)
+
+    def invalidate(self, action, data):
+        """ Drops the cached rows a successful action of this token may have changed """
+        stats_key = ("stat", self.symbol, self.symbol)
+        owners = [data.get("from"), data.get("to"), data.get("owner")]
+        owners += [item["to"] for item in data.get("transfers", [])]
+        if action == "issue":
+            stats = self.cache.get(stats_key)
+            issuer = self.issuer or (stats and stats["issuer"])
+            if issuer is None:
+                self.cache.clear()
+                return
+            owners.append(issuer)
+        elif action == "withdraw":
+            owners += [account_name(self.account), self.admin]
+        if action in ("create", "createlocked", "unlock", "issue", "issueto", "burn"):
+            self.cache.invalidate(stats_key)
+        for owner in owners:
+            if owner is not None:
+                self.cache.invalidate(("accounts", account_name(owner), self.symbol))
+
     # account should passed as namestring, e.g. account.name if not checking raw address
-    def get_balance(self, user_account):
-        return self.account.table("accounts", user_account).json["rows"][0]["balance"]
+    def get_balance(self, user_account, strict=True):
+        key = ("accounts", account_name(user_account), self.symbol)
+        balance = None if strict else self.cache.get(key)
+        if balance is None:
+            balance = self.find_balance(
+                self.chain.get_table_rows(account_name(self.account), "accounts", account_name(user_account))["rows"])
+            self.cache.put(key, balance)
+        return balance
+
+    def find_balance(self, rows):
+        for row in rows:
+            balance = Asset.parse(row["balance"])
+            if balance.symbol.code == self.symbol:
+                return balance
+        raise IndexError("no {} balance in rows".format(self.symbol))
 
-    def get_stats(self):
-        return self.account.table("stat", self.symbol).json["rows"][0]
+    def get_stats(self, strict=True):
+        stats = self.find_stats(self.symbol, strict)
+        if stats is None:
+            raise IndexError("no {} stat row".format(self.symbol))
+        return stats
+
+    def find_stats(self, symbol, strict=True):
+        """ stat row of any symbol name, None if the token was not created """
+        key = ("stat", symbol, symbol)
+        stats = None if strict else self.cache.get(key)
+        if stats is None:
+            rows = self.chain.get_table_rows(account_name(self.account), "stat", symbol)["rows"]
+            if not rows:
+                return None
+            stats = dict(rows[0])
+            stats["supply"] = Asset.parse(stats["supply"])
+            stats["max_supply"] = Asset.parse(stats["max_supply"])
+            self.cache.put(key, stats)
+        return dict(stats)
+
+    def holders(self, after=None, page_size=100):
+        """ Yields (owner, balance) for every holder of the token, by account name
+
+        Scopes of the accounts table are paged through page_size at a time,
+        so memory use does not grow with the number of holders. Pass the
+        last owner seen as ``after`` to resume an interrupted walk.
+        """
+        code = account_name(self.account)
+        lower_bound = after or ""
+        symbol_key = str(symbol_code_value(self.symbol))
+        while True:
+            page = self.chain.get_table_by_scope(code, "accounts", lower_bound, page_size)
+            for scope in page["rows"]:
+                owner = scope["scope"]
+                if owner == after:
+                    continue
+                rows = self.chain.get_table_rows(code, "accounts", owner, lower_bound=symbol_key, limit=1)["rows"]
+                if rows:
+                    balance = Asset.parse(rows[0]["balance"])
+                    if balance.symbol.code == self.symbol:
+                        yield owner, balance
+            if not page["more"] or not page["rows"]:
+                return
+            after = page["rows"][-1]["scope"]
+            # older nodes only report that there are more scopes
+            lower_bound = page["more"] if isinstance(page["more"], str) else after
 
     def to_quantity(self, amount, decimals, symbol):
-        parsed_dec = str(10 ** decimals)[1:]
-        if self.decimals == 0:
-            return "{} {}".format(amount, symbol)
-        else:
-            return "{}.{} {}".format(amount, parsed_dec, symbol)
+        return Asset.from_tokens(amount, Symbol(decimals, symbol))
 
     def fromAsset(self, asset):
-        dictionary = {}
-        split = asset.split(" ")
-        dictionary["amount"] = float(split[0])
-        dictionary["symbol"] = split[1]
-        check_decimals = isinstance(split[0], float)
-        decimals_count = 0
-        if check_decimals:
-            decimals_count = len(split[0].split(".")[1])
-        dictionary["decimals"] = decimals_count
-
-        return dictionary
+        return Asset.parse(asset)
 
     def total_supply(self):
         return self.to_quantity(
@@ -125,4 +567,3 @@ class Token:
             self.decimals,
             self.symbol
         )
-
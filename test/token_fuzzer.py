@@ -0,0 +1,511 @@
+import argparse
+import collections
+import json
+import random
+import time
+
+import chain_errors as errors
+from abi_serializer import ABI_FILE, account_name, load_serializer
+from asset import MAX_AMOUNT, MAX_INT64, MIN_INT64, Asset, Symbol, int64, symbol_code_value
+
+ACTIONS = ["create", "createlocked", "issue", "transfer", "unlock", "burn"]
+# positional arguments of every action, by their abi field names
+FIELDS = {
+    "create": ["issuer", "maximum_supply"],
+    "createlocked": ["issuer", "maximum_supply"],
+    "issue": ["to", "quantity", "memo"],
+    "transfer": ["from", "to", "quantity", "memo"],
+    "unlock": ["symbol"],
+    "burn": ["owner", "value"]
+}
+ASSERT = "assertion failure with message: {}"
+MISSING_AUTH = "missing authority of {}"
+# a name no account has
+GHOST = "fuzzghost"
+CODES = ["A", "FUZZ", "ABCDEFG"]
+# decimals the setUpClass precheck accepts
+MAX_DECIMALS = 16
+MEMOS = ["", "memo", "m" * 256, "m" * 257, "é" * 128, "é" * 129]
+SUPPLIES = [MAX_AMOUNT, MAX_AMOUNT + 1, MAX_INT64, 1, 0, -1, MIN_INT64]
+EDGE_AMOUNTS = [0, 1, -1, MAX_AMOUNT, MAX_AMOUNT + 1, MAX_INT64, MIN_INT64, -MAX_AMOUNT]
+
+Mismatch = collections.namedtuple("Mismatch", ["actions", "index", "expected", "actual"])
+
+
+def assert_message(message):
+    return ASSERT.format(message)
+
+
+class ReferenceModel:
+    """ eosio.token.cpp over plain ints, fast enough for the fuzzer's hot loop
+
+    ``stats`` maps a symbol code to [supply, max_supply, precision,
+    issuer, lock] and ``balances`` (owner, code) to the raw amount of the
+    owner's row. Quantities are (amount, precision, code) tuples with
+    valid symbol codes. Every action is a transaction of its own: the
+    checks run in the contract's order before anything changes, so an
+    action that fails leaves the state as it was. ``apply`` returns the
+    error the chain reports, None on success. The contract's int64
+    arithmetic wraps around before eosiolib checks the asset range, and
+    so does the model's.
+    """
+
+    def __init__(self, contract, admin, accounts):
+        self.contract = contract
+        self.admin = admin
+        self.accounts = frozenset(accounts)
+        self.stats = {}
+        self.balances = {}
+
+    def apply(self, action):
+        name, actor, args = action
+        return getattr(self, name)(actor, *args)
+
+    def create(self, actor, issuer, maximum_supply, lock=False):
+        if actor != self.contract and actor != self.admin:
+            return assert_message("Not authorized")
+        amount, precision, code = maximum_supply
+        if not -MAX_AMOUNT <= amount <= MAX_AMOUNT:
+            return assert_message("invalid supply")
+        if amount <= 0:
+            return assert_message("max-supply must be positive")
+        if code in self.stats:
+            return assert_message("token with symbol already exists")
+        self.stats[code] = [0, amount, precision, issuer, lock]
+        return None
+
+    def createlocked(self, actor, issuer, maximum_supply):
+        return self.create(actor, issuer, maximum_supply, True)
+
+    def issue(self, actor, to, quantity, memo):
+        amount, precision, code = quantity
+        if len(memo.encode()) > 256:
+            return assert_message("memo has more than 256 bytes")
+        st = self.stats.get(code)
+        if st is None:
+            return assert_message("token with symbol does not exist, create token before issue")
+        issuer = st[3]
+        if actor != issuer:
+            return MISSING_AUTH.format(issuer)
+        if not -MAX_AMOUNT <= amount <= MAX_AMOUNT:
+            return assert_message("invalid quantity")
+        if amount <= 0:
+            return assert_message("must issue positive quantity")
+        if precision != st[2]:
+            return assert_message("symbol precision mismatch")
+        if amount > st[1] - st[0]:
+            return assert_message("quantity exceeds available supply")
+        # the issuer is credited, then the inline transfer to ``to`` runs
+        if to != issuer and to not in self.accounts:
+            return assert_message("to account does not exist")
+        st[0] += amount
+        key = (to, code)
+        self.balances[key] = self.balances.get(key, 0) + amount
+        return None
+
+    def transfer(self, actor, from_, to, quantity, memo):
+        amount, precision, code = quantity
+        if from_ == to:
+            return assert_message("cannot transfer to self")
+        if actor != from_:
+            return MISSING_AUTH.format(from_)
+        if to not in self.accounts:
+            return assert_message("to account does not exist")
+        st = self.stats.get(code)
+        if st is None:
+            return assert_message("unable to find key")
+        if st[4] and from_ != st[3]:
+            return assert_message("token is locked")
+        if not -MAX_AMOUNT <= amount <= MAX_AMOUNT:
+            return assert_message("invalid quantity")
+        if amount <= 0:
+            return assert_message("must transfer positive quantity")
+        if precision != st[2]:
+            return assert_message("symbol precision mismatch")
+        if len(memo.encode()) > 256:
+            return assert_message("memo has more than 256 bytes")
+        balance = self.balances.get((from_, code))
+        if balance is None:
+            return assert_message("no balance object found")
+        if balance < amount:
+            return assert_message("overdrawn balance")
+        if balance == amount:
+            del self.balances[(from_, code)]
+        else:
+            self.balances[(from_, code)] = balance - amount
+        key = (to, code)
+        self.balances[key] = self.balances.get(key, 0) + amount
+        return None
+
+    def unlock(self, actor, symbol):
+        precision, code = symbol
+        st = self.stats.get(code)
+        if st is None:
+            return assert_message("token does not exists")
+        if not st[4]:
+            return assert_message("token not locked")
+        if actor != st[3]:
+            return MISSING_AUTH.format(st[3])
+        st[4] = False
+        return None
+
+    def burn(self, actor, owner, value):
+        amount, precision, code = value
+        if actor != owner:
+            return MISSING_AUTH.format(owner)
+        st = self.stats.get(code)
+        if st is None:
+            return assert_message("no symbol found")
+        if precision != st[2]:
+            return assert_message("attempt to subtract asset with different symbol")
+        supply = int64(st[0] - amount)
+        max_supply = int64(st[1] - amount)
+        for result in (supply, max_supply):
+            if result < -MAX_AMOUNT:
+                return assert_message("subtraction underflow")
+            if result > MAX_AMOUNT:
+                return assert_message("subtraction overflow")
+        balance = self.balances.get((owner, code))
+        if balance is None:
+            return assert_message("no balance object found")
+        if balance < amount:
+            return assert_message("overdrawn balance")
+        if balance == amount:
+            del self.balances[(owner, code)]
+        else:
+            remaining = int64(balance - amount)
+            if remaining < -MAX_AMOUNT:
+                return assert_message("subtraction underflow")
+            if remaining > MAX_AMOUNT:
+                return assert_message("subtraction overflow")
+            self.balances[(owner, code)] = remaining
+        st[0] = supply
+        st[1] = max_supply
+        return None
+
+    def state(self):
+        """ stat and accounts rows as the chain returns them, by symbol code and (owner, code) """
+        stats = {
+            code: {
+                "supply": str(Asset(supply, Symbol(precision, code))),
+                "max_supply": str(Asset(max_supply, Symbol(precision, code))),
+                "issuer": issuer,
+                "lock": lock
+            }
+            for code, (supply, max_supply, precision, issuer, lock) in self.stats.items()
+        }
+        balances = {
+            key: str(Asset(amount, Symbol(self.stats[key[1]][2], key[1])))
+            for key, amount in self.balances.items()
+        }
+        return stats, balances
+
+
+def outcome_key(action, outcome):
+    """ What a fuzz run counts and samples by: the action and how it ended """
+    return action[0], "ok" if outcome is None else outcome
+
+
+def action_data(action):
+    """ Action data in the json the chain takes """
+    name, _, args = action
+    data = {}
+    for field, value in zip(FIELDS[name], args):
+        if field == "symbol":
+            value = str(Symbol(*value))
+        elif isinstance(value, tuple):
+            value = str(Asset(value[0], Symbol(value[1], value[2])))
+        data[field] = value
+    return data
+
+
+def rename_codes(actions, codes):
+    """ actions with every symbol code replaced as mapped by codes """
+    renamed = []
+    for name, actor, args in actions:
+        args = tuple(
+            (value[0], value[1], codes[value[2]]) if isinstance(value, tuple) and len(value) == 3
+            else (value[0], codes[value[1]]) if isinstance(value, tuple)
+            else value
+            for value in args
+        )
+        renamed.append((name, actor, args))
+    return renamed
+
+
+class Fuzzer:
+    """ Random create/createlocked/issue/transfer/unlock/burn sequences run against ReferenceModel
+
+    Sequences pick edge values (maximum and out of range int64 supplies
+    and amounts, decimals 0..16, 256 byte memos, locked tokens) and
+    amounts derived from the model's state as it evolves (a holder's
+    whole balance and one more, the supply left and one more), so most
+    actions reach the contract's deeper checks. ``run`` samples a
+    sequence the first time one of its actions ends in a way not seen
+    before, and the others at sample_rate; samples are minimized to the
+    fewest actions that still end the same way, ready to ``replay``.
+    """
+
+    def __init__(self, contract, admin, users, seed=0, max_length=12, sample_rate=0.0001, ghost=GHOST):
+        self.contract = contract
+        self.admin = admin
+        self.users = list(users)
+        self.ghost = ghost
+        self.rng = random.Random(seed)
+        self.max_length = max_length
+        self.sample_rate = sample_rate
+        self.counts = collections.Counter()
+        self.sequences = 0
+        self.actions = 0
+        # (minimized actions, outcome key of the last one)
+        self.samples = []
+
+    def model(self):
+        return ReferenceModel(self.contract, self.admin, self.users)
+
+    def name(self):
+        rng = self.rng
+        return self.ghost if rng.random() < 0.05 else rng.choice(self.users)
+
+    def actor(self, proper):
+        # the ghost signs nothing
+        if proper != self.ghost and self.rng.random() < 0.85:
+            return proper
+        return self.rng.choice(self.users)
+
+    def code(self, model):
+        rng = self.rng
+        if model.stats and rng.random() < 0.8:
+            return rng.choice(list(model.stats))
+        return rng.choice(CODES)
+
+    def precision(self, st):
+        rng = self.rng
+        if st is not None and rng.random() < 0.85:
+            return st[2]
+        return rng.randint(0, MAX_DECIMALS)
+
+    def amount(self, model, code, owner=None):
+        rng = self.rng
+        st = model.stats.get(code)
+        choice = rng.random()
+        if choice < 0.2:
+            return rng.choice(EDGE_AMOUNTS)
+        if st is not None and choice < 0.6:
+            balance = model.balances.get((owner, code), 0)
+            return rng.choice([balance, balance + 1, st[1] - st[0], st[1] - st[0] + 1, st[0]])
+        return rng.randint(1, 10 ** rng.randint(0, 18))
+
+    def action(self, model):
+        rng = self.rng
+        name = rng.choice(ACTIONS)
+        if name in ("create", "createlocked"):
+            code = rng.choice(CODES) if rng.random() < 0.7 else self.code(model)
+            supply = rng.choice(SUPPLIES) if rng.random() < 0.5 else rng.randint(1, MAX_AMOUNT)
+            quantity = (supply, rng.randint(0, MAX_DECIMALS), code)
+            return name, self.actor(rng.choice([self.admin, self.contract])), (self.name(), quantity)
+        code = self.code(model)
+        st = model.stats.get(code)
+        issuer = st[3] if st is not None else self.admin
+        memo = rng.choice(MEMOS) if rng.random() < 0.3 else "memo"
+        if name == "issue":
+            quantity = (self.amount(model, code), self.precision(st), code)
+            return name, self.actor(issuer), (self.name(), quantity, memo)
+        if name == "transfer":
+            holders = [owner for owner, held in model.balances if held == code]
+            from_ = rng.choice(holders) if holders and rng.random() < 0.8 else rng.choice(self.users)
+            quantity = (self.amount(model, code, from_), self.precision(st), code)
+            return name, self.actor(from_), (from_, self.name(), quantity, memo)
+        if name == "unlock":
+            return name, self.actor(issuer), ((self.precision(st), code),)
+        holders = [owner for owner, held in model.balances if held == code]
+        owner = rng.choice(holders) if holders and rng.random() < 0.8 else rng.choice(self.users)
+        quantity = (self.amount(model, code, owner), self.precision(st), code)
+        return name, self.actor(owner), (owner, quantity)
+
+    def sequence(self):
+        """ (actions, outcomes) of one random sequence """
+        model = self.model()
+        actions = []
+        outcomes = []
+        for _ in range(self.rng.randint(1, self.max_length)):
+            action = self.action(model)
+            actions.append(action)
+            outcomes.append(model.apply(action))
+        return actions, outcomes
+
+    def outcomes(self, actions):
+        model = self.model()
+        return [model.apply(action) for action in actions]
+
+    def minimize(self, actions):
+        """ Fewest of actions (in order) whose last one still ends the same way """
+        target = outcome_key(actions[-1], self.outcomes(actions)[-1])
+        actions = list(actions)
+        index = len(actions) - 2
+        while index >= 0:
+            candidate = actions[:index] + actions[index + 1:]
+            if outcome_key(candidate[-1], self.outcomes(candidate)[-1]) == target:
+                actions = candidate
+            index -= 1
+        return actions
+
+    def run(self, sequences=None, seconds=None):
+        """ Runs sequences until either limit is reached; returns the samples taken """
+        deadline = None if seconds is None else time.monotonic() + seconds
+        taken = []
+        count = 0
+        while (sequences is None or count < sequences) and (deadline is None or time.monotonic() < deadline):
+            actions, outcomes = self.sequence()
+            count += 1
+            self.actions += len(actions)
+            sample = None
+            for index, (action, outcome) in enumerate(zip(actions, outcomes)):
+                key = outcome_key(action, outcome)
+                if not self.counts[key] and sample is None:
+                    sample = index
+                self.counts[key] += 1
+            if sample is None and self.rng.random() < self.sample_rate:
+                sample = len(actions) - 1
+            if sample is not None:
+                minimized = self.minimize(actions[:sample + 1])
+                taken.append((minimized, outcome_key(minimized[-1], self.outcomes(minimized)[-1])))
+        self.sequences += count
+        self.samples += taken
+        return taken
+
+
+class Replayer:
+    """ Replays fuzzed sequences on a chain backend and compares them with ReferenceModel
+
+    ``accounts`` maps the names the sequences use to the account objects
+    (or names) the backend pushes with; action data goes out packed, as
+    nodeos' json parser rejects the out of range amounts the contract
+    has to be tested with. Every replay gets symbol codes
+    of its own, so replays on one chain do not see each other's tokens.
+    """
+
+    def __init__(self, chain, contract, admin, accounts):
+        self.serializer = load_serializer(ABI_FILE)
+        self.chain = chain
+        self.contract = contract
+        self.admin = admin
+        self.accounts = accounts
+        self.replays = 0
+
+    def codes(self, actions):
+        codes = {}
+        for _, _, args in actions:
+            for value in args:
+                if isinstance(value, tuple) and value[-1] not in codes:
+                    number = self.replays * len(CODES) + len(codes)
+                    codes[value[-1]] = "".join(chr(ord("A") + number // 26 ** place % 26) for place in range(7))
+        return codes
+
+    def push(self, action):
+        name, actor, _ = action
+        data = self.serializer.pack_action_data(name, action_data(action)).hex()
+        try:
+            self.chain.push_action(
+                self.contract, name, data,
+                permission=(self.accounts[actor], "active"), force_unique=True
+            )
+        except errors.Error as error:
+            return str(error)
+        return None
+
+    def read_state(self, codes, owners):
+        contract = account_name(self.contract)
+        stats = {}
+        balances = {}
+        for code in codes:
+            for row in self.chain.get_table_rows(contract, "stat", code)["rows"]:
+                stats[code] = dict(row, lock=bool(row["lock"]))
+            for owner in owners:
+                rows = self.chain.get_table_rows(
+                    contract, "accounts", owner, lower_bound=str(symbol_code_value(code)), limit=1)["rows"]
+                if rows and Asset.parse(rows[0]["balance"]).symbol.code == code:
+                    balances[(owner, code)] = rows[0]["balance"]
+        return stats, balances
+
+    def replay(self, actions):
+        """ None if the chain ends every action and the state as the model does, else a Mismatch """
+        codes = self.codes(actions)
+        self.replays += 1
+        actions = rename_codes(actions, codes)
+        model = ReferenceModel(account_name(self.contract), self.admin, [name for name in self.accounts])
+        for index, action in enumerate(actions):
+            expected = model.apply(action)
+            actual = self.push(action)
+            if (expected is None) != (actual is None) or (expected is not None and expected not in actual):
+                return Mismatch(actions, index, expected, actual)
+        owners = list(self.accounts) + [GHOST]
+        expected = model.state()
+        actual = self.read_state(codes.values(), owners)
+        if expected != actual:
+            return Mismatch(actions, len(actions), expected, actual)
+        return None
+
+
+def report(fuzzer, elapsed, mismatches):
+    return {
+        "sequences": fuzzer.sequences,
+        "actions": fuzzer.actions,
+        "elapsed": elapsed,
+        "sequences_per_hour": fuzzer.sequences / elapsed * 3600 if elapsed else None,
+        "outcomes": {"{} {}".format(*key): count for key, count in sorted(fuzzer.counts.items())},
+        "samples": len(fuzzer.samples),
+        "mismatches": [
+            {"actions": [[name, actor, list(args)] for name, actor, args in mismatch.actions],
+             "index": mismatch.index, "expected": repr(mismatch.expected), "actual": repr(mismatch.actual)}
+            for mismatch in mismatches
+        ]
+    }
+
+
+if __name__ == "__main__":
+    from benchmark import read_config
+    from chain_fixture import NodeFixture, SimulatorFixture
+    from token_class import Token
+
+    parser = argparse.ArgumentParser(description="differential fuzzer of the token contract against a reference model")
+    parser.add_argument("--sequences", type=int, help="number of sequences to run against the model")
+    parser.add_argument("--seconds", type=float, default=60, help="time to run sequences against the model")
+    parser.add_argument("--replay", type=int, default=50, help="most samples to replay on the chain")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--simulate", help="replay on the in-process contract simulator",
+                        action="store_true")
+    parser.add_argument("--report", default="fuzz.json", help="where to write the JSON results")
+    args = parser.parse_args()
+    if not args.simulate:
+        import eosfactory_backend
+        eosfactory_backend.quiet()
+
+    admin, deploy = read_config()
+
+    def deploy_token(accounts):
+        Token(accounts["admin_acc"], accounts["token_deployer_acc"], deploy["maximum_supply"],
+              deploy["decimals"], deploy["symbol"]).deploy()
+
+    fixture = (SimulatorFixture if args.simulate else NodeFixture)(admin, deploy_token)
+    accounts = fixture.restore()
+    contract = accounts["token_deployer_acc"]
+    users = {account_name(account): account for alias, account in accounts.items() if alias != "master"}
+    token = Token(accounts["admin_acc"], contract, deploy["maximum_supply"], deploy["decimals"], deploy["symbol"])
+
+    fuzzer = Fuzzer(account_name(contract), admin, users, seed=args.seed)
+    started = time.monotonic()
+    fuzzer.run(args.sequences, None if args.sequences else args.seconds)
+    elapsed = time.monotonic() - started
+
+    replayer = Replayer(token.chain, contract, admin, users)
+    mismatches = []
+    for actions, _ in fuzzer.samples[:args.replay]:
+        mismatch = replayer.replay(actions)
+        if mismatch is not None:
+            mismatches.append(mismatch)
+    result = report(fuzzer, elapsed, mismatches)
+    with open(args.report, "w") as output:
+        json.dump(result, output, indent=2)
+    print(json.dumps(dict(result, outcomes=len(result["outcomes"])), indent=2))
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,117 @@
+import concurrent.futures
+import threading
+
+from abi_serializer import account_name
+from asset import Asset, Symbol, symbol_code_value
+from backends import default_chain
+from table_cache import TableCache
+from token_class import Token
+
+
+class TokenRegistry:
+    """ Every token symbol of one eosio.token contract account
+
+    Tokens handed out by ``token`` share the registry's chain connection
+    and table cache, which their preflight checks and strict=False reads
+    use. ``load`` reads all stat rows at once: the symbols
+    (stat scopes) are listed page by page and their rows read
+    ``concurrency`` at a time. Precision is cached per symbol, so
+    ``quantity`` formats amounts without a table read, and ``balances``
+    gets every symbol of an owner from the owner's one accounts scope.
+    """
+    concurrency = 8
+    page_size = 100
+
+    def __init__(self, token_admin, token_account, chain=None):
+        self.admin = token_admin
+        self.account = token_account
+        self.chain = chain if chain is not None else default_chain(token_account)
+        self.code = account_name(token_account)
+        self.cache = TableCache(Token.cache_ttl, Token.cache_size)
+        self.symbols = {}
+        self.stats = {}
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def symbol_codes(self):
+        """ Symbols created on the contract (the scopes of its stat table) """
+        lower_bound = ""
+        after = None
+        while True:
+            page = self.chain.get_table_by_scope(self.code, "stat", lower_bound, self.page_size)
+            for row in page["rows"]:
+                if row["scope"] != after:
+                    yield row["scope"]
+            if not page["more"] or not page["rows"]:
+                return
+            after = page["rows"][-1]["scope"]
+            # older nodes only report that there are more scopes
+            lower_bound = page["more"] if isinstance(page["more"], str) else after
+
+    def read_stats(self, symbol_code):
+        rows = self.chain.get_table_rows(self.code, "stat", symbol_code)["rows"]
+        if not rows:
+            return None
+        stats = dict(rows[0])
+        stats["supply"] = Asset.parse(stats["supply"])
+        stats["max_supply"] = Asset.parse(stats["max_supply"])
+        return stats
+
+    def load(self):
+        """ stat rows of every symbol of the contract, by symbol name """
+        codes = list(self.symbol_codes())
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as pool:
+            rows = list(pool.map(self.read_stats, codes))
+        stats = {code: row for code, row in zip(codes, rows) if row is not None}
+        with self.lock:
+            for code, row in stats.items():
+                self.stats[code] = row
+                self.symbols[code] = row["supply"].symbol
+                self.cache.put(("stat", code, code), row)
+        return dict(stats)
+
+    def add(self, symbol_code, decimals, max_supply):
+        """ Token of a symbol that is not created yet (max_supply in whole tokens) """
+        with self.lock:
+            self.symbols[symbol_code] = Symbol(decimals, symbol_code)
+            self.tokens.pop(symbol_code, None)
+        return self.token(symbol_code, max_supply)
+
+    def token(self, symbol_code, max_supply=None):
+        """ Token of a registered symbol, sharing the registry's chain and cache """
+        with self.lock:
+            token = self.tokens.get(symbol_code)
+            if token is not None:
+                return token
+            symbol = self.symbols[symbol_code]
+            stats = self.stats.get(symbol_code)
+            if max_supply is None:
+                max_supply = stats["max_supply"].amount // 10 ** symbol.precision
+            token = Token(self.admin, self.account, max_supply, symbol.precision, symbol_code,
+                          chain=self.chain, cache=self.cache)
+            if stats is not None:
+                # exact, even when the maximum supply is not a whole number of tokens
+                token.deploy_params = stats["max_supply"]
+                token.issuer = stats["issuer"]
+            self.tokens[symbol_code] = token
+            return token
+
+    def quantity(self, symbol_code, amount):
+        """ Asset of a whole number of tokens of a registered symbol """
+        return Asset.from_tokens(amount, self.symbols[symbol_code])
+
+    def balances(self, owner):
+        """ Balance of owner in every symbol, from one read of the owner's accounts scope """
+        owner = account_name(owner)
+        balances = {}
+        lower_bound = None
+        while True:
+            page = self.chain.get_table_rows(self.code, "accounts", owner, lower_bound=lower_bound,
+                                             limit=self.page_size)
+            for row in page["rows"]:
+                balance = Asset.parse(row["balance"])
+                balances[balance.symbol.code] = balance
+                self.cache.put(("accounts", owner, balance.symbol.code), balance)
+            if not page["more"] or not page["rows"]:
+                return balances
+            lower_bound = str(symbol_code_value(balance.symbol.code) + 1)
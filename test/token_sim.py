@@ -0,0 +1,784 @@
+import copy
+import hashlib
+import heapq
+import json
+import threading
+import time
+
+import chain_errors as errors
+from abi_serializer import ABI_FILE, AbiSerializer, account_name, check_name
+from asset import Asset, Symbol, symbol_code_value
+from chain_errors import eosio_assert
+
+# RAM nodeos bills on top of the row data for a table row and for a new table (scope)
+ROW_OVERHEAD_BYTES = 112
+TABLE_OVERHEAD_BYTES = 112
+
+
+class Action:
+    __slots__ = ("account", "name", "authorization", "data")
+
+    def __init__(self, account, name, authorization, data):
+        self.account = account
+        self.name = name
+        self.authorization = authorization
+        self.data = data
+
+    def to_json(self):
+        return {
+            "account": self.account,
+            "name": self.name,
+            "authorization": [
+                {"actor": actor, "permission": permission}
+                for actor, permission in self.authorization
+            ],
+            "data": {key: to_json(value) for key, value in self.data.items()}
+        }
+
+
+def to_json(value):
+    if isinstance(value, (Asset, Symbol)):
+        return str(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    return value
+
+
+class MultiIndex:
+    """ eosio::multi_index over a single (code, table, scope), journaled for rollback """
+
+    def __init__(self, chain, code, table, scope):
+        self.chain = chain
+        self.key = (code, table, scope)
+
+    def _rows(self):
+        return self.chain.db.get(self.key, {})
+
+    def find(self, primary_key):
+        return self._rows().get(primary_key)
+
+    def get(self, primary_key, error_msg="unable to find key"):
+        row = self.find(primary_key)
+        eosio_assert(row is not None, error_msg)
+        return row
+
+    def emplace(self, payer, row):
+        if self.key not in self.chain.db:
+            self.chain.set_table_payer(self.key, payer)
+            self.chain.bill(payer, TABLE_OVERHEAD_BYTES)
+        rows = self.chain.db.setdefault(self.key, {})
+        primary_key = row.primary_key()
+        self.chain.journal(self.key, primary_key, None)
+        row.payer = payer
+        rows[primary_key] = row
+        self.chain.bill(payer, ROW_OVERHEAD_BYTES + row.size)
+        return row
+
+    def modify(self, row, payer, updater):
+        primary_key = row.primary_key()
+        self.chain.journal(self.key, primary_key, copy.copy(row))
+        updater(row)
+        eosio_assert(row.primary_key() == primary_key,
+                     "updater cannot change primary key when modifying an object")
+        if payer and payer != row.payer:
+            self.chain.bill(row.payer, -(ROW_OVERHEAD_BYTES + row.size))
+            self.chain.bill(payer, ROW_OVERHEAD_BYTES + row.size)
+            row.payer = payer
+
+    def erase(self, row):
+        primary_key = row.primary_key()
+        self.chain.journal(self.key, primary_key, row)
+        rows = self.chain.db[self.key]
+        del rows[primary_key]
+        self.chain.bill(row.payer, -(ROW_OVERHEAD_BYTES + row.size))
+        if not rows:
+            del self.chain.db[self.key]
+            self.chain.bill(self.chain.table_payers.get(self.key), -TABLE_OVERHEAD_BYTES)
+            self.chain.set_table_payer(self.key, None)
+
+
+class account_row:
+    __slots__ = ("balance", "payer")
+    # packed asset
+    size = 16
+
+    def __init__(self, balance=None):
+        self.balance = balance
+        self.payer = None
+
+    def primary_key(self):
+        return self.balance.symbol.name()
+
+    def to_json(self):
+        return {"balance": str(self.balance)}
+
+
+class currency_stats:
+    __slots__ = ("supply", "max_supply", "issuer", "lock", "payer")
+    # two packed assets, a name and a bool
+    size = 41
+
+    def __init__(self, supply=None, max_supply=None, issuer=None, lock=False):
+        self.supply = supply
+        self.max_supply = max_supply
+        self.issuer = issuer
+        self.lock = lock
+        self.payer = None
+
+    def primary_key(self):
+        return self.supply.symbol.name()
+
+    def to_json(self):
+        return {
+            "supply": str(self.supply),
+            "max_supply": str(self.max_supply),
+            "issuer": self.issuer,
+            "lock": int(self.lock)
+        }
+
+
+class ApplyContext:
+    def __init__(self, chain, action, receiver, notified, inline_actions):
+        self.chain = chain
+        self.action = action
+        self.receiver = receiver
+        self.notified = notified
+        self.inline_actions = inline_actions
+
+    def has_auth(self, name):
+        return any(actor == name for actor, _ in self.action.authorization)
+
+    def require_auth(self, name):
+        if not self.has_auth(name):
+            raise errors.Error("missing authority of {}".format(name))
+
+    def require_recipient(self, name):
+        if name not in self.notified:
+            self.notified.append(name)
+
+    def is_account(self, name):
+        return self.chain.is_account(name)
+
+    def send_inline(self, action):
+        self.inline_actions.append(action)
+
+
+class TokenContract:
+    """ Line by line port of eosio.token.cpp """
+
+    def __init__(self, chain, self_name, admin):
+        self._self = self_name
+        self.admin = admin
+        self.chain = chain
+        self.ctx = None
+
+    def apply(self, ctx):
+        # EOSIO_ABI dispatches only actions addressed to the contract itself
+        if ctx.action.account != self._self:
+            return
+        self.ctx = ctx
+        try:
+            getattr(self, ctx.action.name)(*ctx.action.data.values())
+        except (ValueError, OverflowError) as error:
+            # asset arithmetic asserts inside eosiolib
+            eosio_assert(False, str(error))
+        finally:
+            self.ctx = None
+
+    def accounts(self, scope):
+        return MultiIndex(self.chain, self._self, "accounts", scope)
+
+    def stats(self, scope):
+        return MultiIndex(self.chain, self._self, "stat", scope)
+
+    def _create(self, issuer, maximum_supply, lock):
+        eosio_assert(self.ctx.has_auth(self._self) or self.ctx.has_auth(self.admin), "Not authorized")
+
+        sym = maximum_supply.symbol
+        eosio_assert(sym.is_valid(), "invalid symbol name")
+        eosio_assert(maximum_supply.is_valid(), "invalid supply")
+        eosio_assert(maximum_supply.amount > 0, "max-supply must be positive")
+
+        statstable = self.stats(sym.name())
+        existing = statstable.find(sym.name())
+        eosio_assert(existing is None, "token with symbol already exists")
+
+        statstable.emplace(self._self, currency_stats(
+            supply=Asset(0, maximum_supply.symbol),
+            max_supply=maximum_supply,
+            issuer=issuer,
+            lock=lock
+        ))
+
+    def create(self, issuer, maximum_supply):
+        self._create(issuer, maximum_supply, False)
+
+    def createlocked(self, issuer, maximum_supply):
+        self._create(issuer, maximum_supply, True)
+
+    def _add_supply(self, quantity, memo):
+        sym = quantity.symbol
+        eosio_assert(sym.is_valid(), "invalid symbol name")
+        eosio_assert(len(memo.encode()) <= 256, "memo has more than 256 bytes")
+
+        sym_name = sym.name()
+        statstable = self.stats(sym_name)
+        st = statstable.find(sym_name)
+        eosio_assert(st is not None, "token with symbol does not exist, create token before issue")
+
+        self.ctx.require_auth(st.issuer)
+        eosio_assert(quantity.is_valid(), "invalid quantity")
+        eosio_assert(quantity.amount > 0, "must issue positive quantity")
+
+        eosio_assert(quantity.symbol == st.supply.symbol, "symbol precision mismatch")
+        eosio_assert(quantity.amount <= st.max_supply.amount - st.supply.amount, "quantity exceeds available supply")
+
+        def update(s):
+            s.supply = s.supply + quantity
+        statstable.modify(st, 0, update)
+
+        return st.issuer
+
+    def issue(self, to, quantity, memo):
+        issuer = self._add_supply(quantity, memo)
+
+        self.add_balance(issuer, quantity, issuer)
+
+        if to != issuer:
+            self.ctx.send_inline(Action(
+                self._self, "transfer", [(issuer, "active")],
+                {"from": issuer, "to": to, "quantity": quantity, "memo": memo}
+            ))
+
+    def issueto(self, to, quantity, memo):
+        eosio_assert(self.ctx.is_account(to), "to account does not exist")
+        issuer = self._add_supply(quantity, memo)
+
+        if to != issuer:
+            self.ctx.require_recipient(to)
+
+        self.add_balance(to, quantity, issuer)
+
+    def transfer(self, from_, to, quantity, memo):
+        eosio_assert(from_ != to, "cannot transfer to self")
+        self.ctx.require_auth(from_)
+        eosio_assert(self.ctx.is_account(to), "to account does not exist")
+        sym = quantity.symbol.name()
+        statstable = self.stats(sym)
+        st = statstable.get(sym)
+
+        eosio_assert(not st.lock or from_ == st.issuer, "token is locked")
+
+        self.ctx.require_recipient(from_)
+        self.ctx.require_recipient(to)
+
+        eosio_assert(quantity.is_valid(), "invalid quantity")
+        eosio_assert(quantity.amount > 0, "must transfer positive quantity")
+        eosio_assert(quantity.symbol == st.supply.symbol, "symbol precision mismatch")
+        eosio_assert(len(memo.encode()) <= 256, "memo has more than 256 bytes")
+
+        self.sub_balance(from_, quantity)
+        self.add_balance(to, quantity, from_)
+
+    def transfermany(self, from_, transfers, memo):
+        eosio_assert(len(transfers) > 0, "no transfers")
+        self.ctx.require_auth(from_)
+        sym = transfers[0]["quantity"].symbol.name()
+        statstable = self.stats(sym)
+        st = statstable.get(sym)
+
+        eosio_assert(not st.lock or from_ == st.issuer, "token is locked")
+        eosio_assert(len(memo.encode()) <= 256, "memo has more than 256 bytes")
+
+        self.ctx.require_recipient(from_)
+
+        total = Asset(0, st.supply.symbol)
+        for t in transfers:
+            eosio_assert(from_ != t["to"], "cannot transfer to self")
+            eosio_assert(self.ctx.is_account(t["to"]), "to account does not exist")
+            eosio_assert(t["quantity"].is_valid(), "invalid quantity")
+            eosio_assert(t["quantity"].amount > 0, "must transfer positive quantity")
+            eosio_assert(t["quantity"].symbol == st.supply.symbol, "symbol precision mismatch")
+            self.ctx.require_recipient(t["to"])
+            total = total + t["quantity"]
+
+        self.sub_balance(from_, total)
+        for t in transfers:
+            self.add_balance(t["to"], t["quantity"], from_)
+
+    def unlock(self, symbol):
+        statstable = self.stats(symbol.name())
+        it = statstable.find(symbol.name())
+        eosio_assert(it is not None, "token does not exists")
+        eosio_assert(it.lock, "token not locked")
+        self.ctx.require_auth(it.issuer)
+        self.ctx.require_recipient(it.issuer)
+
+        def update(st):
+            st.lock = False
+        statstable.modify(it, it.issuer, update)
+
+    def burn(self, owner, value):
+        self.ctx.require_auth(owner)
+
+        sym = value.symbol.name()
+        statstable = self.stats(sym)
+        it = statstable.find(sym)
+
+        eosio_assert(it is not None, "no symbol found")
+
+        def update(s):
+            s.supply = s.supply - value
+            s.max_supply = s.max_supply - value
+        statstable.modify(it, owner, update)
+
+        self.sub_balance(owner, value)
+
+    def withdraw(self, contract, quantity):
+        self.ctx.require_auth(self.admin)
+
+        self.ctx.send_inline(Action(
+            contract, "transfer", [(self._self, "active")],
+            {"from": self._self, "to": self.admin, "quantity": quantity, "memo": "withdraw"}
+        ))
+
+    def sub_balance(self, owner, value):
+        from_acnts = self.accounts(owner)
+
+        from_ = from_acnts.get(value.symbol.name(), "no balance object found")
+        eosio_assert(from_.balance.amount >= value.amount, "overdrawn balance")
+
+        if from_.balance.amount == value.amount:
+            from_acnts.erase(from_)
+        else:
+            def update(a):
+                a.balance = a.balance - value
+            from_acnts.modify(from_, owner, update)
+
+    def add_balance(self, owner, value, ram_payer):
+        to_acnts = self.accounts(owner)
+        to = to_acnts.find(value.symbol.name())
+        if to is None:
+            to_acnts.emplace(ram_payer, account_row(value))
+        else:
+            def update(a):
+                a.balance = a.balance + value
+            to_acnts.modify(to, 0, update)
+
+
+class TableResult:
+    def __init__(self, json):
+        self.json = json
+
+
+class PushResult:
+    def __init__(self, trace):
+        self.json = trace
+
+
+class SimAccount:
+    """ Stands in for an eosfactory account object """
+
+    def __init__(self, chain, name):
+        self.chain = chain
+        self.name = name
+        key = "EOS" + hashlib.sha256(name.encode()).hexdigest()[:50]
+        self.permissions = {
+            "owner": {"threshold": 1, "keys": [{"key": key, "weight": 1}], "accounts": [], "waits": []},
+            "active": {"threshold": 1, "keys": [{"key": key, "weight": 1}], "accounts": [], "waits": []}
+        }
+        self.parents = {"owner": "", "active": "owner"}
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "SimAccount({})".format(self.name)
+
+    @property
+    def json(self):
+        return {
+            "account_name": self.name,
+            "permissions": [
+                {"perm_name": perm, "parent": self.parents[perm], "required_auth": auth}
+                for perm, auth in self.permissions.items()
+            ]
+        }
+
+    def set_contract(self):
+        self.chain.set_contract(self.name)
+
+    def push_action(self, action, data, permission=None, expiration_sec=None, forceUnique=0, **kwargs):
+        return PushResult(
+            self.chain.push_action(self.name, action, data, permission, expiration_sec, bool(forceUnique)))
+
+    def table(self, table_name, scope, **kwargs):
+        return TableResult(self.chain.get_table_rows(self.name, table_name, scope))
+
+
+class TokenSimulator:
+    """ In-memory chain running eosio.token without nodeos
+
+    Transactions are atomic: every row, table payer, account and
+    permission write is journaled and undone when an action fails, and
+    failures raise ``errors.Error`` just like actions pushed through the
+    other backends. It is the in-memory
+    backend of Token: push_action/push_actions and the read calls take
+    the same arguments as ChainApi's.
+    """
+
+    def __init__(self, admin, abi_file=ABI_FILE):
+        self.admin = admin
+        with open(abi_file) as abi_json:
+            abi = json.load(abi_json)
+        self.structs, self.abi = self.load_abi(abi)
+        self.serializer = AbiSerializer(abi)
+        self.db = {}
+        self.accounts = {}
+        self.contracts = {}
+        self.block_num = 1
+        self.trx_count = 0
+        self.undo = None
+        self.table_payers = {}
+        # RAM billed per payer by the receiver currently being applied
+        self.ram_deltas = None
+        # ids of applied transactions until they expire, as nodeos keeps them to reject duplicates
+        self.clock = time.time
+        self.expiration_sec = 30
+        self.recent = {}
+        self.recent_expirations = []
+        self.lock = threading.RLock()
+        self.system_account = self.create_account("eosio")
+
+    def __getstate__(self):
+        # snapshots (copy.deepcopy) leave the lock behind
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def load_abi(abi):
+        """ (structs, actions): field lists with type aliases resolved """
+        types = {t["new_type_name"]: t["type"] for t in abi["types"]}
+        structs = {
+            s["name"]: [(field["name"], types.get(field["type"], field["type"])) for field in s["fields"]]
+            for s in abi["structs"]
+        }
+        actions = {action["name"]: structs[action["type"]] for action in abi["actions"]}
+        return structs, actions
+
+    def create_account(self, name):
+        name = check_name(name)
+        if name in self.accounts:
+            raise errors.Error("Cannot create account named {}, as that name is already taken".format(name))
+        account = SimAccount(self, name)
+        self.journal_account(name, None)
+        self.accounts[name] = account
+        return account
+
+    def set_contract(self, account):
+        name = account_name(account)
+        self.contracts[name] = TokenContract(self, name, self.admin)
+
+    def is_account(self, name):
+        return name in self.accounts
+
+    def journal(self, key, primary_key, old_row):
+        if self.undo is not None:
+            self.undo.append(("row", key, primary_key, old_row))
+
+    def journal_account(self, name, old_auth):
+        """ Journals an account write: old_auth is the (permissions, parents) it had, None for a new account """
+        if self.undo is not None:
+            self.undo.append(("account", name, old_auth))
+
+    def set_table_payer(self, key, payer):
+        """ Sets (None: drops) who pays for a table, journaled """
+        if self.undo is not None:
+            self.undo.append(("table_payer", key, self.table_payers.get(key)))
+        if payer is None:
+            self.table_payers.pop(key, None)
+        else:
+            self.table_payers[key] = payer
+
+    def bill(self, payer, delta):
+        if self.ram_deltas is not None and payer:
+            self.ram_deltas[payer] = self.ram_deltas.get(payer, 0) + delta
+
+    def rollback(self):
+        for kind, key, *old in reversed(self.undo):
+            if kind == "account":
+                old_auth, = old
+                if old_auth is None:
+                    del self.accounts[key]
+                else:
+                    account = self.accounts[key]
+                    account.permissions, account.parents = old_auth
+            elif kind == "table_payer":
+                old_payer, = old
+                if old_payer is None:
+                    self.table_payers.pop(key, None)
+                else:
+                    self.table_payers[key] = old_payer
+            else:
+                primary_key, old_row = old
+                rows = self.db.setdefault(key, {})
+                if old_row is None:
+                    rows.pop(primary_key, None)
+                else:
+                    rows[primary_key] = old_row
+                if not rows:
+                    del self.db[key]
+
+    def parse_action_data(self, account, action, data):
+        fields = self.abi.get(action)
+        if account not in self.contracts or fields is None:
+            raise errors.Error("Unknown action {} in contract {}".format(action, account))
+        try:
+            if isinstance(data, str) and not data.lstrip().startswith("{"):
+                # packed action data, as hex
+                data = self.serializer.unpack_action_data(action, bytes.fromhex(data))
+            elif not isinstance(data, dict):
+                data = json.loads(data)
+            return self.parse_struct(action, fields, data)
+        except ValueError as error:
+            raise errors.Error(str(error))
+
+    def parse_struct(self, struct, fields, data):
+        if not isinstance(data, dict):
+            raise ValueError("Invalid object for struct '{}'".format(struct))
+        parsed = {}
+        for field, field_type in fields:
+            if field not in data:
+                raise errors.Error("Missing field '{}' in input object while processing struct '{}'".format(field, struct))
+            parsed[field] = self.parse_value(field, field_type, data[field])
+        return parsed
+
+    def parse_value(self, field, field_type, value):
+        if field_type.endswith("[]"):
+            if not isinstance(value, list):
+                raise ValueError("Invalid array value for field '{}'".format(field))
+            return [self.parse_value(field, field_type[:-2], item) for item in value]
+        if field_type == "name":
+            return check_name(value)
+        if field_type == "asset":
+            return Asset.parse(value)
+        if field_type == "symbol":
+            return Symbol.from_string(value)
+        if field_type == "string":
+            if not isinstance(value, str):
+                raise ValueError("Invalid string value for field '{}'".format(field))
+        if field_type in self.structs:
+            return self.parse_struct(field_type, self.structs[field_type], value)
+        return value
+
+    def normalize_permission(self, account, permission):
+        if permission is None:
+            return [(account, "active")]
+        if isinstance(permission, list):
+            levels = permission
+        else:
+            levels = [permission]
+        authorization = []
+        for level in levels:
+            if isinstance(level, tuple):
+                actor, perm = level
+            else:
+                actor, perm = level, "active"
+            authorization.append((account_name(actor), str(getattr(perm, "value", perm))))
+        return authorization
+
+    def check_authorization(self, authorization):
+        for actor, permission in authorization:
+            account = self.accounts.get(actor)
+            if account is None or permission not in account.permissions:
+                raise errors.Error("action declares irrelevant authority '{}@{}'".format(actor, permission))
+
+    def check_inline_authorization(self, parent, action):
+        for actor, permission in action.authorization:
+            if (actor, permission) in parent.authorization:
+                continue
+            account = self.accounts.get(actor)
+            code_permission = {"actor": parent.account, "permission": "eosio.code"}
+            if account is None or not any(
+                    level["permission"] == code_permission
+                    for level in account.permissions.get(permission, {}).get("accounts", [])):
+                raise errors.Error("missing authority of {}".format(actor))
+
+    def parse_action(self, account, action, data, authorization):
+        if account == self.system_account.name:
+            parsed = data
+        else:
+            parsed = self.parse_action_data(account, action, data)
+        return Action(account, action, authorization, parsed)
+
+    def push_action(self, account, action, data, permission=None, expiration_sec=None, force_unique=False):
+        account = account_name(account)
+        authorization = self.normalize_permission(account, permission)
+        return self.push_transaction([self.parse_action(account, action, data, authorization)],
+                                     expiration_sec=expiration_sec, force_unique=force_unique).json
+
+    def push_actions(self, actions, max_cpu_usage_ms=None, expiration_sec=None):
+        """ Same call as ChainApi.push_actions, actions given as json """
+        return self.push_transaction([
+            self.parse_action(
+                account_name(action["account"]),
+                action["name"],
+                action["data"],
+                [(account_name(level["actor"]), level["permission"]) for level in action["authorization"]]
+            )
+            for action in actions
+        ], expiration_sec=expiration_sec).json
+
+    def push_transaction(self, actions, expiration_sec=None, force_unique=False, trx_id=None, expiration=None):
+        """ Applies a transaction unless an identical one was applied and has not expired yet
+
+        The id hashes the actions and the expiration (head block time
+        plus expiration_sec, in whole seconds), or is given by the caller
+        along with the absolute expiration. force_unique stands for the
+        nonce cleos adds.
+        """
+        with self.lock:
+            now = self.clock()
+            while self.recent_expirations and self.recent_expirations[0][0] <= now:
+                _, expired = heapq.heappop(self.recent_expirations)
+                del self.recent[expired]
+            if expiration is None:
+                expiration = int(now) + (expiration_sec or self.expiration_sec)
+            if trx_id is None:
+                nonce = self.trx_count if force_unique else None
+                trx_id = hashlib.sha256(json.dumps(
+                    [expiration, nonce, [action.to_json() for action in actions]], sort_keys=True
+                ).encode()).hexdigest()
+            if trx_id in self.recent:
+                raise errors.Error("duplicate transaction {}".format(trx_id))
+            result = self.apply_transaction(actions, trx_id)
+            if expiration > now:
+                self.recent[trx_id] = expiration
+                heapq.heappush(self.recent_expirations, (expiration, trx_id))
+            return result
+
+    def apply_transaction(self, actions, trx_id):
+        self.undo = []
+        try:
+            traces = []
+            for action in actions:
+                self.check_authorization(action.authorization)
+                traces.append(self.dispatch(action))
+        except errors.Error:
+            self.rollback()
+            raise
+        finally:
+            self.undo = None
+
+        self.trx_count += 1
+        block_num = self.block_num
+        self.block_num += 1
+        return PushResult({
+            "transaction_id": trx_id,
+            "processed": {
+                "id": trx_id,
+                "block_num": block_num,
+                "receipt": {"status": "executed"},
+                "action_traces": traces
+            }
+        })
+
+    def dispatch(self, action):
+        notified = [action.account]
+        inline_actions = []
+        traces = []
+        i = 0
+        while i < len(notified):
+            receiver = notified[i]
+            ctx = ApplyContext(self, action, receiver, notified, inline_actions)
+            self.ram_deltas = {}
+            started = time.perf_counter()
+            try:
+                if receiver == self.system_account.name and action.account == receiver:
+                    self.apply_native(ctx)
+                elif receiver in self.contracts:
+                    self.contracts[receiver].apply(ctx)
+                elif receiver not in self.accounts:
+                    raise errors.Error("action's receiving account {} does not exist".format(receiver))
+                elapsed = int((time.perf_counter() - started) * 1000000)
+                ram_deltas = [{"account": account, "delta": delta}
+                              for account, delta in self.ram_deltas.items() if delta]
+            finally:
+                self.ram_deltas = None
+            traces.append({
+                "receipt": {"receiver": receiver},
+                "act": action.to_json(),
+                "elapsed": elapsed,
+                "account_ram_deltas": ram_deltas
+            })
+            i += 1
+
+        trace = traces[0]
+        trace["inline_traces"] = traces[1:]
+        for inline in inline_actions:
+            self.check_inline_authorization(action, inline)
+            trace["inline_traces"].append(self.dispatch(inline))
+        return trace
+
+    def apply_native(self, ctx):
+        data = ctx.action.data
+        if ctx.action.name == "newaccount":
+            ctx.require_auth(check_name(data["creator"]))
+            account = self.create_account(data["name"])
+            account.permissions = {"owner": copy.deepcopy(data["owner"]), "active": copy.deepcopy(data["active"])}
+            return
+        if ctx.action.name != "updateauth":
+            raise errors.Error("Unknown action {} in contract eosio".format(ctx.action.name))
+        name = check_name(data["account"])
+        ctx.require_auth(name)
+        account = self.accounts[name]
+        self.journal_account(name, (copy.deepcopy(account.permissions), dict(account.parents)))
+        account.permissions[data["permission"]] = copy.deepcopy(data["auth"])
+        account.parents[data["permission"]] = data["parent"]
+
+    def get_info(self):
+        """ Same call as ChainApi.get_info; every transaction is a block of its own """
+        return {"head_block_num": self.block_num - 1}
+
+    def get_code_hash(self, account):
+        """ Same call as ChainApi.get_code_hash; no wasm runs here, so the hash is always that of no code """
+        return {"account_name": account_name(account), "code_hash": "0" * 64}
+
+    def get_table_rows(self, code, table, scope, lower_bound=None, limit=None, binary=False):
+        """ Same call as ChainApi.get_table_rows; rows are keyed by symbol """
+        code = account_name(code)
+        scope = account_name(scope)
+        rows = self.db.get((code, table, scope), {})
+        keys = sorted(rows, key=symbol_code_value)
+        if lower_bound is not None:
+            keys = [key for key in keys if symbol_code_value(key) >= int(lower_bound)]
+        more = limit is not None and len(keys) > limit
+        result = [rows[key].to_json() for key in keys[:limit]]
+        if binary:
+            result = [self.serializer.pack_row(table, row).hex() for row in result]
+        return {"rows": result, "more": more}
+
+    def get_table_by_scope(self, code, table, lower_bound="", limit=10):
+        """ Same call as ChainApi.get_table_by_scope """
+        code = account_name(code)
+        scopes = heapq.nsmallest(limit + 1, (
+            scope for (row_code, row_table, scope) in self.db
+            if row_code == code and row_table == table and scope >= lower_bound
+        ))
+        more = scopes[limit] if len(scopes) > limit else ""
+        return {
+            "rows": [
+                {"code": code, "scope": scope, "table": table, "count": len(self.db[(code, table, scope)])}
+                for scope in scopes[:limit]
+            ],
+            "more": more
+        }
@@ -0,0 +1,306 @@
+import bisect
+import collections
+import json
+import os
+import struct
+import threading
+
+from abi_serializer import account_name, name_to_string, string_to_name
+from asset import Asset, Symbol, symbol_code_string, symbol_code_value
+
+KINDS = ["create", "issue", "transfer", "burn", "unlock"]
+# contract action -> kind of the events it is logged as
+ACTION_KINDS = {
+    "create": "create",
+    "createlocked": "create",
+    "issue": "issue",
+    "issueto": "issue",
+    "transfer": "transfer",
+    "transfermany": "transfer",
+    "burn": "burn",
+    "unlock": "unlock"
+}
+# block_num, kind, from, to, amount, symbol
+RECORD = struct.Struct("<IBQQqQ")
+# index entries: (HISTORY, account, seq, 0, 0) or (CHECKPOINT, account, symbol code, block_num, balance)
+INDEX_ENTRY = struct.Struct("<BQQIq")
+HISTORY = 0
+CHECKPOINT = 1
+
+# ``from_`` is empty for issue/create/unlock, ``to`` for burn; the
+# quantity of create is the maximum supply and of unlock zero
+Event = collections.namedtuple("Event", ["seq", "block_num", "kind", "from_", "to", "quantity"])
+
+
+def contract_actions(trace, contract):
+    """ Actions the contract executed itself in a trace and its inline traces
+
+    Every require_recipient notification carries the same act as the
+    action it notifies about; only the contract's own receipt is used so
+    nothing is counted twice.
+    """
+    act = trace["act"]
+    if trace["receipt"]["receiver"] == act["account"] == contract:
+        yield act
+    for inline in trace.get("inline_traces", []):
+        yield from contract_actions(inline, contract)
+
+
+class TransferLog:
+    """ Append-only log of a token contract's balance events, with indexes
+
+    Events are fixed-size binary records appended to ``path``. They are
+    fed from pushed transactions (``ingest``, or as Token.transfer_log),
+    or from a node's history plugin (``follow``). While appending, the
+    log keeps per-account balance checkpoints and per-account histories,
+    so balance_at and history never replay the log. Both are saved as
+    fixed-size binary entries appended to <path>.index, a checkpoint of
+    the same block superseding the one before it, and the rest of the
+    state (counts, supplies, history plugin position) to the small
+    <path>.index.json. Saves happen every checkpoint_every records and
+    on close and write only the entries made since the last one; opening
+    the log replays only the records after the last save.
+    """
+    checkpoint_every = 10000
+
+    def __init__(self, path, contract):
+        self.path = path
+        self.index_path = path + ".index"
+        self.header_path = self.index_path + ".json"
+        self.contract = account_name(contract)
+        self.lock = threading.RLock()
+        self.records = 0
+        self.indexed = 0
+        self.head_block = 0
+        # next account_action_seq of the contract to read from the history plugin
+        self.position = 0
+        self.stats = {}
+        self.balances = {}
+        self.histories = {}
+        # index entries saved, and those made since
+        self.entries = 0
+        self.pending = []
+
+        self.file = open(path, "a+b")
+        size = self.file.seek(0, os.SEEK_END)
+        if size % RECORD.size:
+            # a record torn by a crash while appending
+            self.file.truncate(size - size % RECORD.size)
+        count = size // RECORD.size
+        self.index_file = open(self.index_path, "a+b")
+        if os.path.exists(self.header_path):
+            with open(self.header_path) as header_file:
+                header = json.load(header_file)
+            if header["records"] <= count:
+                self.load_index(header)
+        for seq in range(self.records, count):
+            self.apply(self.read(seq))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.records != self.indexed:
+                self.save_index()
+            self.file.close()
+            self.index_file.close()
+
+    def __len__(self):
+        return self.records
+
+    def load_index(self, header):
+        self.index_file.seek(0)
+        # entries past the header's count were written by a save that did not finish
+        data = self.index_file.read(header["entries"] * INDEX_ENTRY.size)
+        if len(data) != header["entries"] * INDEX_ENTRY.size:
+            return
+        for kind, account, key, block_num, balance in INDEX_ENTRY.iter_unpack(data):
+            account = name_to_string(account)
+            if kind == HISTORY:
+                self.histories.setdefault(account, []).append(key)
+                continue
+            checkpoints = self.balances.setdefault((account, symbol_code_string(key)), [])
+            if checkpoints and checkpoints[-1][0] == block_num:
+                checkpoints[-1][1] = balance
+            else:
+                checkpoints.append([block_num, balance])
+        self.records = self.indexed = header["records"]
+        self.entries = header["entries"]
+        self.head_block = header["head_block"]
+        self.position = header["position"]
+        self.stats = header["stats"]
+
+    def save_index(self):
+        with self.lock:
+            self.file.flush()
+            # the entries go where the last save left off, over anything an unfinished save wrote
+            self.index_file.seek(self.entries * INDEX_ENTRY.size)
+            self.index_file.truncate()
+            self.index_file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self.pending))
+            self.index_file.flush()
+            os.fsync(self.index_file.fileno())
+            self.entries += len(self.pending)
+            self.pending = []
+            tmp_path = self.header_path + ".tmp"
+            with open(tmp_path, "w") as header_file:
+                json.dump({
+                    "records": self.records,
+                    "entries": self.entries,
+                    "head_block": self.head_block,
+                    "position": self.position,
+                    "stats": self.stats
+                }, header_file)
+            os.replace(tmp_path, self.header_path)
+            self.indexed = self.records
+
+    def read(self, seq):
+        with self.lock:
+            self.file.flush()
+            self.file.seek(seq * RECORD.size)
+            block_num, kind, from_, to, amount, symbol = RECORD.unpack(self.file.read(RECORD.size))
+        return Event(seq, block_num, KINDS[kind], name_to_string(from_), name_to_string(to),
+                     Asset(amount, Symbol.from_value(symbol)))
+
+    def append(self, block_num, kind, from_, to, quantity):
+        with self.lock:
+            event = Event(self.records, block_num, kind, from_, to, quantity)
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(RECORD.pack(
+                block_num, KINDS.index(kind), string_to_name(from_), string_to_name(to),
+                quantity.amount, quantity.symbol.value()
+            ))
+            self.apply(event)
+            if self.records - self.indexed >= self.checkpoint_every:
+                self.save_index()
+        return event
+
+    def apply(self, event):
+        """ Updates the indexes with the next record """
+        code = event.quantity.symbol.code
+        amount = event.quantity.amount
+        stats = self.stats.setdefault(code, {
+            "precision": event.quantity.symbol.precision, "issuer": None, "supply": 0, "max_supply": 0
+        })
+        if event.kind == "create":
+            stats.update(issuer=event.to, max_supply=amount)
+        elif event.kind == "issue":
+            stats["supply"] += amount
+            self.credit(event, event.to, code, amount)
+        elif event.kind == "transfer":
+            self.credit(event, event.from_, code, -amount)
+            self.credit(event, event.to, code, amount)
+        elif event.kind == "burn":
+            stats["supply"] -= amount
+            stats["max_supply"] -= amount
+            self.credit(event, event.from_, code, -amount)
+        for account in {event.from_, event.to} - {""}:
+            self.histories.setdefault(account, []).append(event.seq)
+            self.pending.append((HISTORY, string_to_name(account), event.seq, 0, 0))
+        self.head_block = max(self.head_block, event.block_num)
+        self.records = event.seq + 1
+
+    def credit(self, event, account, code, amount):
+        checkpoints = self.balances.setdefault((account, code), [])
+        balance = (checkpoints[-1][1] if checkpoints else 0) + amount
+        if checkpoints and checkpoints[-1][0] == event.block_num:
+            checkpoints[-1][1] = balance
+        else:
+            checkpoints.append([event.block_num, balance])
+        self.pending.append((CHECKPOINT, string_to_name(account), symbol_code_value(code), event.block_num, balance))
+
+    def action_events(self, block_num, act):
+        """ Logs one action the contract executed """
+        kind = ACTION_KINDS.get(act["name"])
+        if kind is None:
+            return []
+        data = act["data"]
+        if kind == "create":
+            maximum_supply = Asset.parse(data["maximum_supply"])
+            return [self.append(block_num, kind, "", account_name(data["issuer"]), maximum_supply)]
+        if kind == "transfer":
+            transfers = data.get("transfers") or [data]
+            from_ = account_name(data["from"])
+            return [
+                self.append(block_num, kind, from_, account_name(entry["to"]), Asset.parse(entry["quantity"]))
+                for entry in transfers
+            ]
+        if kind == "burn":
+            return [self.append(block_num, kind, account_name(data["owner"]), "", Asset.parse(data["value"]))]
+        if kind == "unlock":
+            symbol = Symbol.from_string(data["symbol"])
+            issuer = self.stats.get(symbol.code, {}).get("issuer") or act["authorization"][0]["actor"]
+            return [self.append(block_num, kind, "", issuer, Asset(0, symbol))]
+        quantity = Asset.parse(data["quantity"])
+        to = account_name(data["to"])
+        if act["name"] == "issue":
+            # issue credits the issuer, the inline transfer that follows moves it to ``to``
+            to = self.stats.get(quantity.symbol.code, {}).get("issuer") or act["authorization"][0]["actor"]
+        return [self.append(block_num, kind, "", to, quantity)]
+
+    def ingest(self, trx):
+        """ Logs the contract's actions of a pushed transaction (push_action/push_actions result) """
+        processed = trx.get("processed", trx)
+        block_num = processed.get("block_num", 0)
+        events = []
+        with self.lock:
+            for trace in processed.get("action_traces", []):
+                for act in contract_actions(trace, self.contract):
+                    events += self.action_events(block_num, act)
+            self.file.flush()
+        return events
+
+    def ingest_actions(self, actions):
+        """ Logs actions read from the history plugin (get_actions of the contract) """
+        events = []
+        with self.lock:
+            for action in actions:
+                if action["account_action_seq"] < self.position:
+                    continue
+                trace = action["action_trace"]
+                act = trace["act"]
+                # inline traces are listed as actions of their own
+                if trace["receipt"]["receiver"] == act["account"] == self.contract:
+                    events += self.action_events(action["block_num"], act)
+                self.position = action["account_action_seq"] + 1
+            self.file.flush()
+        return events
+
+    def follow(self, chain, batch=100):
+        """ Logs every contract action the node's history plugin has after the last one logged """
+        while True:
+            actions = chain.get_actions(self.contract, self.position, batch - 1).get("actions", [])
+            self.ingest_actions(actions)
+            if len(actions) < batch:
+                return
+
+    def balance_at(self, account, symbol_code, block_num=None):
+        """ Balance of account after block block_num (the latest one by default) """
+        with self.lock:
+            precision = self.stats[symbol_code]["precision"]
+            checkpoints = self.balances.get((account_name(account), symbol_code), [])
+            if block_num is None:
+                position = len(checkpoints)
+            else:
+                position = bisect.bisect_right(checkpoints, [block_num, float("inf")])
+            amount = checkpoints[position - 1][1] if position else 0
+        return Asset(amount, Symbol(precision, symbol_code))
+
+    def history(self, account, start=0, limit=None):
+        """ Events account took part in, oldest first """
+        with self.lock:
+            seqs = self.histories.get(account_name(account), [])
+            seqs = seqs[start:None if limit is None else start + limit]
+            return [self.read(seq) for seq in seqs]
+
+    def holders(self, symbol_code):
+        """ Current non-zero balances of a symbol by account """
+        with self.lock:
+            return {
+                account: checkpoints[-1][1]
+                for (account, code), checkpoints in self.balances.items()
+                if code == symbol_code and checkpoints[-1][1]
+            }
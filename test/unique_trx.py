@@ -0,0 +1,74 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+from abi_serializer import account_name
+
+DUPLICATE_RE = re.compile(r"duplicate transaction", re.IGNORECASE)
+# nodeos refuses expirations further out than this
+MAX_EXPIRATION_SEC = 3600
+
+
+def is_duplicate(error):
+    """ True if the node rejected a transaction because an identical one is pending """
+    return bool(DUPLICATE_RE.search(str(error)))
+
+
+def canonical(value):
+    name = account_name(value)
+    return name if isinstance(name, str) else str(value)
+
+
+def transaction_key(actions):
+    """ Digest identifying the actions of a transaction, accounts and assets by their text """
+    return hashlib.sha256(json.dumps(actions, sort_keys=True, default=canonical).encode()).hexdigest()
+
+
+class UniqueExpirations:
+    """ Expirations that keep otherwise identical transactions apart
+
+    A transaction id is the hash of the packed transaction, so the same
+    actions sent twice before the head block time moves on collide.
+    Telling them apart with a context-free nonce action (cleos
+    --force-unique) or a memo suffix adds bytes billed as NET and, for
+    the nonce, an action to run; a different expiration costs nothing.
+    ``allocate`` hands out, per set of actions, the first expiration
+    (seconds from now) whose absolute time is not taken by an earlier
+    send that is still pending. The local clock only approximates the
+    head block time, so a node may still see a duplicate: allocating
+    again for the retry moves on to the next free second.
+    """
+
+    def __init__(self, expiration_sec=30, clock=time.time):
+        self.expiration_sec = expiration_sec
+        self.clock = clock
+        # transaction key -> absolute expirations still pending
+        self.pending = {}
+        self.swept = 0
+        self.lock = threading.Lock()
+
+    def allocate(self, key):
+        with self.lock:
+            now = int(self.clock())
+            if now != self.swept:
+                self.sweep(now)
+            pending = self.pending.setdefault(key, set())
+            expiration = now + self.expiration_sec
+            while expiration in pending:
+                expiration += 1
+            if expiration - now > MAX_EXPIRATION_SEC:
+                raise ValueError("no free expiration for {} identical pending transactions".format(len(pending)))
+            pending.add(expiration)
+            return expiration - now
+
+    def sweep(self, now):
+        """ Forgets the transactions that have expired """
+        for key in list(self.pending):
+            pending = {expiration for expiration in self.pending[key] if expiration > now}
+            if pending:
+                self.pending[key] = pending
+            else:
+                del self.pending[key]
+        self.swept = now
@@ -0,0 +1,80 @@
+from termcolor import cprint
+import unittest
+import chain_errors as errors
+from abi_serializer import ABI_FILE, load_serializer, name_to_string, string_to_name
+from asset import Asset, Symbol
+
+EOSIO = "0000000000ea3055"
+ONE_EOS = "102700000000000004454f5300000000"
+
+
+class AbiSerializerTests(unittest.TestCase):
+    def setUp(self):
+        self.serializer = load_serializer(ABI_FILE)
+
+    def test_01(self):
+        cprint("#1 Actions", "magenta")
+        cprint("#1.1 Transfer packs like nodeos", "green")
+        transfer = {"from": "eosio", "to": "eosio", "quantity": "1.0000 EOS", "memo": "memo"}
+        packed = self.serializer.pack_action_data("transfer", transfer)
+        assert (packed.hex() == EOSIO + EOSIO + ONE_EOS + "04" + b"memo".hex())
+        assert (self.serializer.unpack_action_data("transfer", packed) == transfer)
+
+        cprint("#1.2 Every action round trips", "green")
+        actions = {
+            "create": {"issuer": "tokenbuyer", "maximum_supply": "461168601842738.7903 WISH"},
+            "createlocked": {"issuer": "tokenbuyer", "maximum_supply": "1 TEST"},
+            "issue": {"to": "tokenbuyer", "quantity": "0.0001 WISH", "memo": "x" * 256},
+            "issueto": {"to": "tokenbuyer", "quantity": "0.0001 WISH", "memo": ""},
+            "unlock": {"symbol": "4,WISH"},
+            "withdraw": {"contract": "eosio.token", "quantity": "1.0000 EOS"},
+            "burn": {"owner": "tokenbuyer", "value": "-1.0000 WISH"},
+            "transfermany": {
+                "from": "tokenbuyer",
+                "transfers": [{"to": "tokenbuyer2", "quantity": "1.0000 WISH"}] * 3,
+                "memo": "many"
+            }
+        }
+        for action, data in actions.items():
+            packed = self.serializer.pack_action_data(action, data)
+            assert (self.serializer.unpack_action_data(action, packed) == data)
+        # a 256 byte memo takes a two byte length prefix
+        assert (len(self.serializer.pack_action_data("issue", actions["issue"])) == 8 + 16 + 2 + 256)
+
+        cprint("#1.3 Asset and symbol objects are accepted", "green")
+        wish = Symbol(4, "WISH")
+        assert (self.serializer.pack_action_data("unlock", {"symbol": wish})
+                == self.serializer.pack_action_data("unlock", {"symbol": "4,WISH"}))
+        assert (self.serializer.pack_action_data("burn", {"owner": "a", "value": Asset(1, wish)})
+                == self.serializer.pack_action_data("burn", {"owner": "a", "value": "0.0001 WISH"}))
+
+        cprint("#1.4 Malformed data is rejected", "green")
+        with self.assertRaisesRegex(ValueError, "Missing field 'memo'"):
+            self.serializer.pack_action_data("transfer", {"from": "a", "to": "b", "quantity": "1 A"})
+        with self.assertRaises(ValueError):
+            self.serializer.pack_action_data("nosuchaction", {})
+        with self.assertRaises(ValueError):
+            self.serializer.unpack_action_data("transfer", bytes.fromhex(EOSIO))
+        for name in ["averyveryverylongname", "zzzzzzzzzzzzz", "TokenBuyer", "bad.name!", "tokenbuyer."]:
+            with self.assertRaisesRegex(errors.Error, "Name not properly normalized"):
+                self.serializer.pack_action_data("transfer", {"from": name, "to": "b", "quantity": "1 A", "memo": ""})
+
+    def test_02(self):
+        cprint("#2 Names and table rows", "magenta")
+        cprint("#2.1 Names", "green")
+        assert (string_to_name("eosio") == 6138663577826885632)
+        for name in ["eosio.token", "tokenbuyer2", "a", "zzzzzzzzzzzzj", ""]:
+            assert (name_to_string(string_to_name(name)) == name)
+
+        cprint("#2.2 accounts and stat rows", "green")
+        account = {"balance": "1.0000 EOS"}
+        assert (self.serializer.pack_row("accounts", account).hex() == ONE_EOS)
+        assert (self.serializer.unpack_row("accounts", ONE_EOS) == account)
+        stat = {"supply": "1.0000 EOS", "max_supply": "1.0000 EOS", "issuer": "eosio", "lock": True}
+        packed = self.serializer.pack_row("stat", stat)
+        assert (packed.hex() == ONE_EOS * 2 + EOSIO + "01")
+        assert (self.serializer.unpack_row("stat", packed.hex()) == stat)
+
+
+if __name__ == "__main__":
+    unittest.main()
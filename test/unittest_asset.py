@@ -0,0 +1,56 @@
+from termcolor import cprint
+import unittest
+from asset import MAX_INT64, MIN_INT64, Asset, Symbol, int64
+
+token_max_supply = 4611686018427387903
+
+
+class AssetTests(unittest.TestCase):
+    def test_01(self):
+        cprint("#1 Parsing and formatting", "magenta")
+        cprint("#1.1 Amount is kept as exact int64", "green")
+        wish = Symbol(4, "WISH")
+        value = Asset.parse("461168601842738.7903 WISH")
+        assert (value.amount == token_max_supply)
+        assert (value.symbol == wish)
+        assert (str(value) == "461168601842738.7903 WISH")
+
+        cprint("#1.2 Zero precision and negative amounts", "green")
+        assert (Asset.parse("-15 TEST") == Asset(-15, Symbol(0, "TEST")))
+        assert (str(Asset(-5, wish)) == "-0.0005 WISH")
+        assert (str(Asset.from_tokens(1, wish)) == "1.0000 WISH")
+        assert (Asset.from_tokens(-461168601842738, wish).is_valid())
+        for tokens in [461168601842739, -461168601842739, 10 ** 18]:
+            with self.assertRaisesRegex(ValueError, "magnitude of asset amount must be less than 2\\^62"):
+                Asset.from_tokens(tokens, wish)
+
+        cprint("#1.3 Malformed assets are rejected", "green")
+        for text in ["1.0000WISH", "1. WISH", "1.0000 wish", "1.0000 WISHWISH", "99999999999999999999 WISH"]:
+            with self.assertRaises(ValueError):
+                Asset.parse(text)
+
+    def test_02(self):
+        cprint("#2 Arithmetic", "magenta")
+        one = Asset.parse("1.0000 WISH")
+        cprint("#2.1 Sum and difference", "green")
+        assert (one + one == Asset.parse("2.0000 WISH"))
+        assert (one - one * 3 == Asset.parse("-2.0000 WISH"))
+        assert (Asset.parse("-0.0003 WISH") // 2 == Asset.parse("-0.0001 WISH"))
+        assert (one < one + one)
+
+        cprint("#2.2 Different symbols cannot be mixed", "green")
+        with self.assertRaises(ValueError):
+            one + Asset.parse("1.000 WISH")
+
+        cprint("#2.3 Overflow past max amount", "green")
+        with self.assertRaises(OverflowError):
+            Asset(token_max_supply, one.symbol) + Asset(1, one.symbol)
+
+        cprint("#2.4 int64 wraps around before the range check, as in the contract", "green")
+        with self.assertRaisesRegex(OverflowError, "subtraction underflow"):
+            Asset(token_max_supply, one.symbol) - Asset(MIN_INT64, one.symbol)
+        assert (int64(MAX_INT64 + 1) == MIN_INT64)
+
+
+if __name__ == "__main__":
+    unittest.main()
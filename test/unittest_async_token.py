@@ -0,0 +1,215 @@
+from termcolor import cprint
+import asyncio
+import collections
+import hashlib
+import json
+import unittest
+import chain_errors as errors
+from abi_serializer import ABI_FILE, load_serializer, time_point_sec, time_point_sec_string, unpack_transaction
+from async_token import AsyncToken
+from token_sim import TokenSimulator
+
+
+class StubNode:
+    """ nodeos + keosd HTTP endpoints served from a TokenSimulator """
+    chain_id = "cf057bbfb72640471fd910bcb67639c22df9f92470936cddc1ade0e2f2e7dc4f"
+    public_key = "EOS6MRyAjQq8ud7hVNYcfnVPJqcVpscN5So8BhtHuGYqET5GDW5CV"
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.connections = 0
+        self.requests = 0
+        self.paths = collections.Counter()
+        self.serializer = load_serializer(ABI_FILE)
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return "http://127.0.0.1:{}".format(self.server.sockets[0].getsockname()[1])
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    if key.lower() == "content-length":
+                        length = int(value)
+                body = json.loads((await reader.readexactly(length)).decode() or "null")
+                self.requests += 1
+                self.paths[request_line.split()[1].decode()] += 1
+                status, result = self.route(request_line.split()[1].decode(), body)
+                payload = json.dumps(result).encode()
+                writer.write(b"HTTP/1.1 %d OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % (status, len(payload)) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # client went away or the test loop is shutting down
+        finally:
+            writer.close()
+
+    def route(self, path, body):
+        if path == "/v1/chain/get_info":
+            return 200, {
+                "chain_id": self.chain_id,
+                "head_block_num": self.chain.block_num,
+                "head_block_id": "{:08x}".format(self.chain.block_num) + "ab" * 28,
+                "head_block_time": time_point_sec_string(int(self.chain.clock())) + ".500"
+            }
+        if path == "/v1/chain/abi_json_to_bin":
+            return 200, {"binargs": self.serializer.pack_action_data(body["action"], body["args"]).hex()}
+        if path == "/v1/chain/get_required_keys":
+            return 200, {"required_keys": body["available_keys"]}
+        if path == "/v1/wallet/get_public_keys":
+            return 200, [self.public_key]
+        if path == "/v1/wallet/sign_transaction":
+            return 200, dict(body[0], signatures=["SIG_K1_stub"])
+        if path == "/v1/chain/get_table_rows":
+            return 200, self.chain.get_table_rows(body["code"], body["table"], body["scope"])
+        if path == "/v1/chain/push_transaction":
+            packed_trx = bytes.fromhex(body["packed_trx"])
+            trx = unpack_transaction(packed_trx)
+            try:
+                actions = [
+                    self.chain.parse_action(
+                        action["account"], action["name"], action["data"],
+                        [(level["actor"], level["permission"]) for level in action["authorization"]]
+                    )
+                    for action in trx["actions"]
+                ]
+                return 202, self.chain.push_transaction(
+                    actions,
+                    trx_id=hashlib.sha256(packed_trx).hexdigest(),
+                    expiration=time_point_sec(trx["expiration"])
+                ).json
+            except errors.Error as error:
+                return 500, {
+                    "code": 500,
+                    "message": "Internal Service Error",
+                    "error": {"name": "eosio_assert_message_exception", "details": [{"message": str(error)}]}
+                }
+        return 404, {"code": 404, "message": "Not Found"}
+
+
+class AsyncTokenTests(unittest.TestCase):
+    admin = "admin"
+    maximum_supply = 461168601842738
+    decimals = 4
+    symbol = "WISH"
+
+    def setUp(self):
+        self.chain = TokenSimulator(self.admin)
+        for name in [self.admin, "tokendeploy", "tokenbuyer", "tokenbuyer2"]:
+            self.chain.create_account(name)
+        self.chain.set_contract("tokendeploy")
+        self.node = StubNode(self.chain)
+
+    def run_async(self, scenario):
+        async def run():
+            url = await self.node.start()
+            token = AsyncToken(self.admin, "tokendeploy", self.maximum_supply, self.decimals, self.symbol,
+                               url=url, wallet_url=url, concurrency=4)
+            try:
+                async with token:
+                    await scenario(token)
+            finally:
+                await self.node.stop()
+        asyncio.run(run())
+
+    def test_01(self):
+        cprint("#1 Actions over the HTTP API", "magenta")
+
+        async def scenario(token):
+            cprint("#1.1 Create and issue", "green")
+            one_token = token.to_quantity(1, self.decimals, self.symbol)
+            await token.create("tokenbuyer", self.admin)
+            await token.issue("tokenbuyer", one_token * 10, "issue", "tokenbuyer")
+            stats = await token.get_stats()
+            assert (stats["supply"] == one_token * 10)
+            assert (stats["issuer"] == "tokenbuyer")
+            assert (self.node.paths["/v1/chain/abi_json_to_bin"] == 0)
+
+            cprint("#1.2 Concurrent transfers", "green")
+            await asyncio.gather(*[
+                token.transfer("tokenbuyer", "tokenbuyer2", one_token, "transfer", "tokenbuyer")
+                for _ in range(5)
+            ])
+            assert (await token.get_balance("tokenbuyer") == one_token * 5)
+            assert (await token.get_balance("tokenbuyer2") == one_token * 5)
+
+            cprint("#1.3 Contract errors are raised", "green")
+            with self.assertRaisesRegex(errors.Error, "overdrawn balance"):
+                await token.transfer("tokenbuyer2", "tokenbuyer", one_token * 6, "transfer", "tokenbuyer2")
+            with self.assertRaisesRegex(errors.Error, "missing authority of tokenbuyer"):
+                await token.transfer("tokenbuyer", "tokenbuyer2", one_token, "transfer", "tokenbuyer2")
+            assert (await token.get_balance("tokenbuyer2") == one_token * 5)
+
+        self.run_async(scenario)
+
+    def test_02(self):
+        cprint("#2 Connection pool", "magenta")
+
+        async def scenario(token):
+            await token.create("tokenbuyer", self.admin)
+            await token.issue("tokenbuyer", token.to_quantity(1, self.decimals, self.symbol), "issue", "tokenbuyer")
+
+            cprint("#2.1 Many concurrent reads share the pooled connections", "green")
+            requests = self.node.requests
+            balances = await asyncio.gather(*[token.get_balance("tokenbuyer") for _ in range(200)])
+            assert (len(set(balances)) == 1)
+            assert (self.node.requests - requests == 200)
+            assert (token.chain.opened <= token.chain.size)
+            assert (self.node.connections == token.chain.opened + token.wallet.opened)
+
+            cprint("#2.2 Dropped idle connections are reopened", "green")
+            opened = token.chain.opened
+            for _, writer in token.chain.idle:
+                writer.transport.abort()
+            await asyncio.sleep(0)
+            await token.get_balance("tokenbuyer")
+            assert (token.chain.opened == opened + 1)
+
+            cprint("#2.3 Connections of failed and cancelled requests are closed", "green")
+            used = []
+            stalled = asyncio.Event()
+
+            async def failing_roundtrip(connection, path, payload):
+                used.append(connection)
+                raise ValueError("malformed response")
+
+            async def stalling_roundtrip(connection, path, payload):
+                used.append(connection)
+                stalled.set()
+                await asyncio.Event().wait()
+
+            token.chain.roundtrip = failing_roundtrip
+            with self.assertRaises(ValueError):
+                await token.get_balance("tokenbuyer")
+            token.chain.roundtrip = stalling_roundtrip
+            request = asyncio.ensure_future(token.get_balance("tokenbuyer"))
+            await stalled.wait()
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            del token.chain.roundtrip
+            assert (len(used) == 2)
+            for connection in used:
+                assert (connection[1].is_closing() and connection not in token.chain.idle)
+            await token.get_balance("tokenbuyer")
+
+        self.run_async(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
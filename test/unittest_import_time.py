@@ -0,0 +1,76 @@
+from termcolor import cprint
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+# modules short-lived scripts import, and what importing each should cost (cumulative, best of
+# RUNS); wall-clock times depend on the machine and its load, so going over is reported, not failed
+IMPORT_BUDGET_MS = {
+    "asset": 50,
+    "token_class": 150,
+    "airdrop": 150,
+    "transfer_log": 150,
+    "holder_snapshot": 150
+}
+RUNS = 3
+BACKEND_MODULES = ["eosfactory", "eosfactory_backend", "chain_api", "token_sim"]
+# test output only, scripts print without it
+TEST_MODULES = ["termcolor"]
+
+
+def import_time_ms(module):
+    """ Cumulative import time of module in a fresh interpreter, from -X importtime """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=TEST_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise ValueError("no import time reported for {}".format(module))
+
+
+def loaded_modules(code):
+    """ Top-level names of the modules loaded after running code in a fresh interpreter """
+    process = subprocess.run(
+        [sys.executable, "-c", code + "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"],
+        cwd=TEST_DIR, stdout=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    return {name.split(".")[0] for name in json.loads(process.stdout.splitlines()[-1])}
+
+
+class ImportTimeTests(unittest.TestCase):
+    def test_01(self):
+        cprint("#1 Backends are imported on first use", "magenta")
+        cprint("#1.1 Importing Token loads no backend", "green")
+        loaded = loaded_modules("import " + ", ".join(IMPORT_BUDGET_MS) + ", token_registry")
+        assert (loaded.isdisjoint(BACKEND_MODULES + TEST_MODULES))
+
+        cprint("#1.2 A Token of an account name loads only the HTTP backend", "green")
+        loaded = loaded_modules("import token_class\ntoken_class.Token('admin', 'token', 1000, 4, 'WISH')")
+        assert ("chain_api" in loaded)
+        assert (loaded.isdisjoint(["eosfactory", "eosfactory_backend", "token_sim"]))
+
+        cprint("#1.3 A simulated Token loads no eosfactory", "green")
+        loaded = loaded_modules(
+            "import token_class, token_sim\n"
+            "chain = token_sim.TokenSimulator('admin')\n"
+            "token = token_class.Token('admin', chain.create_account('token'), 1000, 4, 'WISH')\n"
+            "token.deploy()"
+        )
+        assert (loaded.isdisjoint(["eosfactory", "eosfactory_backend"]))
+
+    def test_02(self):
+        cprint("#2 Import time budget (reported only)", "magenta")
+        for number, (module, budget) in enumerate(IMPORT_BUDGET_MS.items(), 1):
+            elapsed = min(import_time_ms(module) for _ in range(RUNS))
+            cprint("#2.{} {} imports in {:.1f} ms, budget {} ms".format(number, module, elapsed, budget),
+                   "green" if elapsed <= budget else "yellow")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,44 @@
+import contextlib
+import copy
+import csv
 import json
-from eosfactory.eosf import *
-from termcolor import cprint
+import termcolor
 import unittest
+import unittest.mock
 from token_class import *
+import backends
+import chain_errors as errors
+from asset import Asset, Symbol
+from chain_fixture import NodeFixture, SimulatorFixture
+from airdrop import Airdrop
+from metrics import ResourceMetrics
+from transfer_log import INDEX_ENTRY, TransferLog
+from supply_auditor import SupplyAuditor
+import holder_snapshot
+from token_registry import TokenRegistry
+from unique_trx import UniqueExpirations
+from step_profiler import StepProfiler, compare, format_regression
+from token_fuzzer import Fuzzer, ReferenceModel, Replayer, outcome_key
+import os
 import re
+import sys
+import tempfile
+import time
 import warnings
 import argparse
 
+# run against the in-process simulator instead of a local nodeos
+SIMULATE = False
+# step_profiler.StepProfiler timing every labelled step (--profile/--baseline)
+PROFILER = None
+
+
+def cprint(text, *args, **kwargs):
+    """ Prints a step label; while profiling, the label also starts a timed step """
+    if PROFILER is not None:
+        PROFILER.label(text)
+    termcolor.cprint(text, *args, **kwargs)
+
 
 def ignore_warnings(test_func):
     def do_test(self, *args, **kwargs):
@@ -17,6 +49,11 @@ def ignore_warnings(test_func):
 
 
 class TokenStandaloneTests(unittest.TestCase):
+    # extra accounts tests can lease from self.pool
+    pool_size = 20
+    # skip the remaining tests once one has failed
+    stop_on_failure = True
+
     @classmethod
     def setUpClass(cls):
         cls.cfg = {}
@@ -44,48 +81,42 @@ class TokenStandaloneTests(unittest.TestCase):
             assert (0 < cls.maximum_supply <= token_max_supply / 10 ** cls.decimals)
         assert (cls.symbol.isupper() and 0 < len(cls.symbol) < 8)
 
+        if SIMULATE:
+            cls.fixture = SimulatorFixture(cls.admin, cls.deploy_token, pool_size=cls.pool_size)
+        else:
+            cls.fixture = NodeFixture(cls.admin, cls.deploy_token, pool_size=cls.pool_size)
+
+    @classmethod
+    def deploy_token(cls, accounts):
+        Token(
+            accounts["admin_acc"],
+            accounts["token_deployer_acc"],
+            cls.maximum_supply,
+            cls.decimals,
+            cls.symbol
+        ).deploy()
+
     @classmethod
     def tearDownClass(cls):
         pass
 
     def run(self, result=None):
         """ Stop after first error """
-        if not result.failures:
-            super().run(result)
+        if not (self.stop_on_failure and result.failures):
+            with PROFILER.profile(self) if PROFILER is not None else contextlib.nullcontext():
+                super().run(result)
 
     @ignore_warnings
     def setUp(self):
-        empty_hash = "code hash: 0000000000000000000000000000000000000000000000000000000000000000"
-        # start node
-        reset()
-
-        # create wallet
-        create_wallet()
-
-        # create eosio account
-        create_master_account("master")
-        self.eosio_acc = master
-        # create admin account
-        create_account("admin_acc", master, self.admin)
-        self.admin_acc = admin_acc
-
-
-        # create token deployer account
-        create_account("token_deployer_acc", self.eosio_acc)
-        self.token_deployer_acc = token_deployer_acc
-
-        # create buyer account
-        create_account("token_buyer", self.eosio_acc)
-        self.token_buyer_acc = token_buyer
-
-        # create buyer2 account
-        create_account("token_buyer2", self.eosio_acc)
-        self.token_buyer2_acc = token_buyer2
-
-        # create buyer3 account
-        create_account("token_buyer3", self.eosio_acc)
-        self.token_buyer3_acc = token_buyer3
-
+        # restore node with deployed token and test accounts
+        accounts = self.fixture.restore()
+        self.eosio_acc = accounts["master"]
+        self.admin_acc = accounts["admin_acc"]
+        self.token_deployer_acc = accounts["token_deployer_acc"]
+        self.token_buyer_acc = accounts["token_buyer"]
+        self.token_buyer2_acc = accounts["token_buyer2"]
+        self.token_buyer3_acc = accounts["token_buyer3"]
+        self.pool = self.fixture.pool
 
         global main_token
         main_token = Token(
@@ -95,29 +126,27 @@ class TokenStandaloneTests(unittest.TestCase):
             self.decimals,
             self.symbol
         )
-        main_token.deploy()
 
 
-        token_total_str = main_token.total_supply()
-        token_total = main_token.fromAsset(token_total_str)
+        token_total = main_token.total_supply()
 
         global amount_supply
-        amount_supply = int(token_total["amount"])
+        amount_supply = token_total.amount // 10 ** token_total.symbol.precision
 
         global simple_amount
-        simple_amount = main_token.to_quantity(int(amount_supply / 2),main_token.decimals,main_token.symbol)
+        simple_amount = main_token.to_quantity(amount_supply // 2, main_token.decimals, main_token.symbol)
 
         global one_token
         one_token = main_token.to_quantity(1, main_token.decimals, main_token.symbol)
 
         global wrong_sym_amount
-        wrong_sym_amount = main_token.to_quantity(simple_amount, main_token.decimals, "TEST")
+        wrong_sym_amount = Asset(simple_amount.amount, Symbol(main_token.decimals, "TEST"))
 
         global wrong_memo
         wrong_memo = 1 + 2 ** 256
 
         global negative_amount
-        negative_amount = -(int(amount_supply/2))
+        negative_amount = -simple_amount
 
         new_decimals = main_token.decimals
         if new_decimals == 0:
@@ -132,9 +161,10 @@ class TokenStandaloneTests(unittest.TestCase):
             main_token.symbol
         )
 
-
     def tearDown(self):
-        stop()
+        if not SIMULATE:
+            from eosfactory_backend import eosf
+            eosf.stop()
 
     def test_01(self):
         cprint("#1 Method '''create'''", "magenta")
@@ -177,7 +207,7 @@ class TokenStandaloneTests(unittest.TestCase):
         token4 = Token(
             self.admin_acc,
             self.token_deployer_acc,
-            negative_amount,
+            -(amount_supply // 2),
             main_token.decimals,
             main_token.symbol
         )
@@ -195,14 +225,15 @@ class TokenStandaloneTests(unittest.TestCase):
         main_token.create(self.admin_acc, self.admin_acc)
         duplicate_symbol = main_token.total_supply()
         with self.assertRaises(errors.Error):
-            main_token.account.push_action(
+            main_token.chain.push_action(
+                main_token.account,
                 "create",
                     {
                         "issuer": self.admin_acc,
-                        "maximum_supply": duplicate_symbol
+                        "maximum_supply": str(duplicate_symbol)
                     },
-                    permission=(self.admin_acc, Permission.ACTIVE),
-                forceUnique=1
+                    permission=(self.admin_acc, "active"),
+                force_unique=True
             )
 
         cprint("#1.6 Create must fail with wrong permission", "green")
@@ -231,14 +262,15 @@ class TokenStandaloneTests(unittest.TestCase):
 
         cprint("#2.2 Issue must fail with invalid symbol", "green")
         with self.assertRaises(errors.Error):
-            main_token.account.push_action(
+            main_token.chain.push_action(
+                main_token.account,
                 "issue",
                     {
                         "to":       self.token_buyer_acc,
-                        "quantity": wrong_sym_amount,
+                        "quantity": str(wrong_sym_amount),
                         "memo":     "memo2"
                     },
-                    permission=(self.admin_acc, Permission.ACTIVE)
+                    permission=(self.admin_acc, "active")
             )
 
         cprint("#2.3 Issue must fail with memo > 256 bytes", "green")
@@ -370,15 +402,8 @@ class TokenStandaloneTests(unittest.TestCase):
             )
 
         cprint("#3.8 Transfer must fail when amount more than balance", "green")
-        buyer_balance = main_token.fromAsset(main_token.get_balance(self.token_buyer_acc.name))
-        buyer_new_amount = int(buyer_balance["amount"])
-        buyer_balance_new = main_token.to_quantity
-        
-        more_balance_amount = main_token.to_quantity(
-            10 ** 5,
-            main_token.decimals,
-            main_token.symbol
-        )
+        buyer_balance = main_token.get_balance(self.token_buyer_acc.name)
+        more_balance_amount = buyer_balance + one_token
 
         with self.assertRaises(errors.Error):
             main_token.transfer(
@@ -401,7 +426,7 @@ class TokenStandaloneTests(unittest.TestCase):
 
     def test_07(self):
         cprint("Method '''unlock'''", "magenta")
-        token_shortname = "{},{}".format(main_token.decimals, main_token.symbol)
+        token_shortname = Symbol(main_token.decimals, main_token.symbol)
         cprint("#4.1 Unlock must fail without create", "green")
         with self.assertRaises(errors.Error):
             main_token.unlock(token_shortname, self.admin_acc)
@@ -433,7 +458,7 @@ class TokenStandaloneTests(unittest.TestCase):
 
     def test_08(self):
         cprint("#4.5 Check succesfull create locked", "green")
-        token_shortname = "{},{}".format(main_token.decimals, main_token.symbol)
+        token_shortname = Symbol(main_token.decimals, main_token.symbol)
         main_token.createlocked(self.admin_acc, self.admin_acc)
 
         cprint("#4.6 Check succesfull transfer from owner", "green")
@@ -520,10 +545,11 @@ class TokenStandaloneTests(unittest.TestCase):
                 "waits": []
             }
         }
-        self.eosio_acc.push_action(
+        main_token.chain.push_action(
+                self.eosio_acc,
                 "updateauth",
                 permissionActionJSON,
-                permission=(main_token.account, Permission.ACTIVE))
+                permission=(main_token.account, "active"))
 
         main_token.withdraw(self.token_buyer_acc.name, one_token, self.admin_acc)
 
@@ -532,15 +558,838 @@ class TokenStandaloneTests(unittest.TestCase):
         with self.assertRaises(errors.Error):
             main_token.withdraw(self.token_buyer_acc.name, one_token, self.token_buyer2_acc)
 
-if __name__ == "__main__":
-    verbosity([])  # disable logs
+    def test_10(self):
+        cprint("Methods '''issue_many''' and '''transfer_many'''", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
 
+        cprint("#6.1 Check successful batch issue", "green")
+        results = main_token.issue_many([
+            (self.token_buyer_acc, one_token, "batch issue 1"),
+            (self.token_buyer2_acc, one_token, "batch issue 2"),
+            (self.admin_acc, simple_amount, "batch issue 3")
+        ], self.admin_acc)
+        assert (all(result.ok for result in results))
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token)
+        assert (main_token.get_balance(self.token_buyer2_acc.name) == one_token)
+
+        cprint("#6.2 Failed action in batch is reported, the others are applied", "green")
+        results = main_token.transfer_many(self.admin_acc, [
+            (self.token_buyer_acc, one_token, "batch transfer 1"),
+            (self.admin_acc, one_token, "batch transfer to self"),
+            (self.token_buyer3_acc, one_token, "batch transfer 3")
+        ], self.admin_acc)
+        assert ([result.ok for result in results] == [True, False, True])
+        assert (isinstance(results[1].error, errors.Error))
+        two_tokens = main_token.to_quantity(2, main_token.decimals, main_token.symbol)
+        assert (main_token.get_balance(self.token_buyer_acc.name) == two_tokens)
+        assert (main_token.get_balance(self.token_buyer3_acc.name) == one_token)
+
+        cprint("#6.3 Batch whose outcome is unknown is reported uncertain, not sent again", "green")
+        push_actions = main_token.chain.push_actions
+        pushes = []
+
+        def push_and_drop_connection(*args, **kwargs):
+            pushes.append(push_actions(*args, **kwargs))
+            raise errors.Error("Failed to connect to nodeos at 127.0.0.1:8888; is nodeos running?")
+
+        main_token.chain.push_actions = push_and_drop_connection
+        results = main_token.transfer_many(self.admin_acc, [
+            (self.token_buyer_acc, one_token, "batch transfer 1"),
+            (self.token_buyer3_acc, one_token, "batch transfer 3")
+        ], self.admin_acc)
+        del main_token.chain.push_actions
+        assert (len(pushes) == 1)
+        assert ([(result.ok, result.uncertain) for result in results] == [(False, True)] * 2)
+        assert (main_token.get_balance(self.token_buyer_acc.name) == two_tokens + one_token)
+
+    def test_11(self):
+        cprint("Cached '''get_balance''' and '''get_stats'''", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token, "issue to buyer", self.admin_acc)
+
+        cprint("#7.1 Own actions refresh cached balance and stats", "green")
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=False) == one_token)
+        assert (main_token.get_stats(strict=False)["supply"] == one_token)
+        main_token.issue(self.token_buyer_acc, one_token, "second issue to buyer", self.admin_acc)
+        two_tokens = main_token.to_quantity(2, main_token.decimals, main_token.symbol)
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=False) == two_tokens)
+        assert (main_token.get_stats(strict=False)["supply"] == two_tokens)
+
+        cprint("#7.2 Reads are strict unless cached ones are asked for", "green")
+        main_token.cache.ttl = 3600
+        assert (main_token.get_balance(self.token_buyer_acc.name) == two_tokens)
+        main_token.chain.push_action(
+            main_token.account,
+            "transfer",
+                {
+                    "from":     self.token_buyer_acc,
+                    "to":       self.token_buyer2_acc,
+                    "quantity": str(one_token),
+                    "memo":     "transfer outside of Token"
+                },
+                permission=(self.token_buyer_acc, "active")
+        )
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=False) == two_tokens)
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token)
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=False) == one_token)
+
+    def test_12(self):
+        cprint("Method '''holders'''", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, simple_amount, "issue to admin", self.admin_acc)
+        buyers = [self.token_buyer_acc, self.token_buyer2_acc, self.token_buyer3_acc]
+        for buyer in buyers:
+            main_token.transfer(self.admin_acc, buyer, one_token, "transfer to buyer", self.admin_acc)
+
+        cprint("#8.1 Check all holders are listed across pages", "green")
+        holders = list(main_token.holders(page_size=2))
+        owners = [owner for owner, _ in holders]
+        assert (owners == sorted(owners))
+        expected = {buyer.name: one_token for buyer in buyers}
+        expected[self.admin_acc.name] = simple_amount - one_token * 3
+        assert (dict(holders) == expected)
+
+        cprint("#8.2 Check walk resumes after given owner", "green")
+        assert (list(main_token.holders(after=owners[1], page_size=2)) == holders[2:])
+
+    def test_13(self):
+        cprint("Airdrop", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, simple_amount, "issue to admin", self.admin_acc)
+        main_token.batch_size = 1
+
+        workdir = tempfile.mkdtemp()
+        recipients = os.path.join(workdir, "recipients.csv")
+        with open(recipients, "w") as recipients_file:
+            recipients_file.write("{},1\n{},{}\n{},1\nnot_an_account,1\n{},-1\n".format(
+                self.token_buyer_acc.name,
+                self.token_buyer2_acc.name,
+                one_token * 2,
+                self.token_buyer_acc.name,
+                self.token_buyer3_acc.name
+            ))
+        airdrop = Airdrop(main_token, self.admin_acc, os.path.join(workdir, "checkpoint"), owner=self.admin_acc)
+
+        cprint("#9.1 Check valid rows are paid once", "green")
+        report = airdrop.run(recipients)
+        assert (report["paid"] == 2)
+        assert (report["rejected"] == 2)
+        assert (report["duplicates"] == 1)
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token)
+        assert (main_token.get_balance(self.token_buyer2_acc.name) == one_token * 2)
+
+        cprint("#9.2 Check restarted run pays nothing twice", "green")
+        report = airdrop.run(recipients)
+        assert (report["paid"] == 0)
+        assert (report["skipped"] == 2)
+
+        cprint("#9.3 Check batch in flight when run stopped is not resent", "green")
+        with open(recipients, "a") as recipients_file:
+            recipients_file.write("{},2\n".format(self.token_buyer3_acc.name))
+        in_flight = [(6, self.token_buyer3_acc.name, one_token * 2, "airdrop")]
+        with open(os.path.join(workdir, "checkpoint"), "a") as checkpoint:
+            checkpoint.write(json.dumps(Airdrop.sent_record(2, in_flight)) + "\n")
+        report = airdrop.run(recipients)
+        assert (report["paid"] == 0)
+        assert (report["uncertain"] == 1)
+        assert (main_token.account.table("accounts", self.token_buyer3_acc.name).json["rows"] == [])
+
+        cprint("#9.4 Check run refuses to resume with other batches than the checkpoint's", "green")
+        main_token.batch_size = 2
+        with self.assertRaises(ValueError):
+            airdrop.run(recipients)
+        main_token.batch_size = 1
+        with open(recipients, "w") as recipients_file:
+            recipients_file.write("{},1\n".format(self.token_buyer3_acc.name))
+        with self.assertRaises(ValueError):
+            airdrop.run(recipients)
+        assert (main_token.account.table("accounts", self.token_buyer3_acc.name).json["rows"] == [])
+
+        cprint("#9.5 Check batch applied but answered with an error is uncertain, not retried", "green")
+        push_actions = main_token.chain.push_actions
+
+        def push_and_time_out(*args, **kwargs):
+            push_actions(*args, **kwargs)
+            raise errors.Error("Timeout waiting for the transaction to be included in a block")
+
+        airdrop = Airdrop(main_token, self.admin_acc, os.path.join(workdir, "timeout"), owner=self.admin_acc)
+        main_token.chain.push_actions = push_and_time_out
+        report = airdrop.run(recipients)
+        del main_token.chain.push_actions
+        assert (report["paid"] == 0)
+        assert (report["failed"] == 0)
+        assert (report["uncertain"] == 1)
+        with open(os.path.join(workdir, "timeout.uncertain")) as uncertain_file:
+            assert (next(csv.reader(uncertain_file))[1] == self.token_buyer3_acc.name)
+        report = airdrop.run(recipients)
+        assert (report["paid"] == 0)
+        assert (main_token.get_balance(self.token_buyer3_acc.name) == one_token)
+
+    def test_14(self):
+        cprint("Preflight checks", "magenta")
+        main_token.createlocked(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token * 2, "issue to buyer", self.admin_acc)
+        push_action = main_token.chain.push_action
+        pushed = []
+
+        def counting_push_action(*args, **kwargs):
+            pushed.append(args[1])
+            return push_action(*args, **kwargs)
+
+        cprint("#10.1 Rejected locally with the contract's message", "green")
+        requests = [
+            lambda: main_token.create(self.admin_acc, self.admin_acc),
+            lambda: main_token.issue(self.token_buyer_acc, negative_amount, "memo", self.admin_acc),
+            lambda: main_token.issue(self.token_buyer_acc, one_token, "m" * 257, self.admin_acc),
+            lambda: main_token.issue(self.token_buyer_acc, main_token.total_supply(), "memo", self.admin_acc),
+            lambda: main_token.issue(self.token_buyer_acc, wrong_dec_amount, "memo", self.admin_acc),
+            lambda: main_token.transfer(
+                self.token_buyer_acc, self.token_buyer_acc, one_token, "memo", self.token_buyer_acc),
+            lambda: main_token.transfer(
+                self.token_buyer_acc, self.token_buyer2_acc, wrong_sym_amount, "memo", self.token_buyer_acc),
+            lambda: main_token.transfer(
+                self.token_buyer_acc, self.token_buyer2_acc, one_token, "memo", self.token_buyer_acc)
+        ]
+        # the only test run with preflight, the others check the contract's own asserts
+        for request in requests:
+            main_token.preflight = False
+            with self.assertRaises(errors.Error) as on_chain:
+                request()
+            main_token.preflight = True
+            main_token.chain.push_action = counting_push_action
+            with self.assertRaises(errors.Error) as local:
+                request()
+            main_token.chain.push_action = push_action
+            assert (pushed == [])
+            assert (str(local.exception) in str(on_chain.exception))
+
+        results = main_token.issue_many([(self.token_buyer2_acc, negative_amount, "memo")], self.admin_acc)
+        assert (not results[0].ok and "must issue positive quantity" in str(results[0].error))
+
+        cprint("#10.2 Stale cached stat does not reject valid requests", "green")
+        main_token.cache.ttl = 3600
+        assert (main_token.get_stats(strict=False)["lock"])
+        main_token.chain.push_action(
+            main_token.account,
+            "unlock",
+                {
+                    "symbol": str(one_token.symbol)
+                },
+                permission=(self.admin_acc, "active")
+        )
+        main_token.transfer(self.token_buyer_acc, self.token_buyer2_acc, one_token, "memo", self.token_buyer_acc)
+        assert (main_token.get_balance(self.token_buyer2_acc.name) == one_token)
+
+    def test_15(self):
+        cprint("Method '''issueto'''", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue_action = "issueto"
+
+        cprint("#11.1 Check recipient is credited directly and notified", "green")
+        trx = main_token.chain.push_action(
+            main_token.account,
+            "issueto",
+                {
+                    "to":       self.token_buyer_acc,
+                    "quantity": str(one_token),
+                    "memo":     "issue to buyer"
+                },
+                permission=(self.admin_acc, "active")
+        )
+        trace = trx["processed"]["action_traces"][0]
+        receivers = [inline["receipt"]["receiver"] for inline in trace["inline_traces"]]
+        assert (receivers == [self.token_buyer_acc.name])
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token)
+        assert (main_token.account.table("accounts", self.admin_acc.name).json["rows"] == [])
+
+        cprint("#11.2 Check Token issues with issueto", "green")
+        main_token.issue(self.token_buyer2_acc, one_token, "issue to buyer2", self.admin_acc)
+        main_token.issue_many([(self.token_buyer3_acc, one_token, "issue to buyer3")], self.admin_acc)
+        assert (main_token.get_balance(self.token_buyer2_acc.name) == one_token)
+        assert (main_token.get_balance(self.token_buyer3_acc.name) == one_token)
+        assert (main_token.get_stats()["supply"] == one_token * 3)
+
+        cprint("#11.3 Issueto must fail to account that doesn't exist", "green")
+        with self.assertRaises(errors.Error):
+            main_token.issue("tokenbuyer12", one_token, "fail", self.admin_acc)
+
+        cprint("#11.4 Issueto must fail with wrong permission", "green")
+        with self.assertRaises(errors.Error):
+            main_token.issue(self.token_buyer_acc, one_token, "fail", self.token_buyer_acc)
+
+        cprint("#11.5 Issueto must fail when amount more than max supply", "green")
+        with self.assertRaises(errors.Error):
+            main_token.issue(self.token_buyer_acc, main_token.total_supply(), "fail", self.admin_acc)
+
+    def test_16(self):
+        cprint("Method '''transfermany'''", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, one_token * 10, "issue to admin", self.admin_acc)
+
+        cprint("#12.1 Check successful transfermany", "green")
+        main_token.transfermany(
+            self.admin_acc,
+            [(self.token_buyer_acc, one_token), (self.token_buyer2_acc, one_token * 2)],
+            "transfer to buyers",
+            self.admin_acc
+        )
+        assert (main_token.get_balance(self.admin_acc.name) == one_token * 7)
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token)
+        assert (main_token.get_balance(self.token_buyer2_acc.name) == one_token * 2)
+
+        cprint("#12.2 Check transfer_many pays through transfermany", "green")
+        main_token.transfer_action = "transfermany"
+        main_token.batch_size = 2
+        results = main_token.transfer_many(self.admin_acc, [
+            (self.token_buyer_acc, one_token, "memo"),
+            ("tokenbuyer12", one_token, "memo"),
+            (self.token_buyer3_acc, one_token, "memo")
+        ], self.admin_acc)
+        assert ([result.ok for result in results] == [True, False, True])
+        assert ("to account does not exist" in str(results[1].error))
+        assert (main_token.get_balance(self.token_buyer_acc.name) == one_token * 2)
+        assert (main_token.get_balance(self.token_buyer3_acc.name) == one_token)
+        assert (main_token.get_balance(self.admin_acc.name) == one_token * 5)
+
+        cprint("#12.3 Transfermany must fail when total more than balance", "green")
+        with self.assertRaises(errors.Error):
+            main_token.transfermany(
+                self.token_buyer_acc,
+                [(self.token_buyer2_acc, one_token), (self.token_buyer3_acc, one_token * 2)],
+                "fail",
+                self.token_buyer_acc
+            )
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=True) == one_token * 2)
+
+        cprint("#12.4 Transfermany must fail with wrong permission", "green")
+        with self.assertRaises(errors.Error):
+            main_token.transfermany(
+                self.token_buyer_acc,
+                [(self.token_buyer2_acc, one_token)],
+                "fail",
+                self.token_buyer2_acc
+            )
+
+        cprint("#12.5 Transfermany must fail without transfers", "green")
+        with self.assertRaises(errors.Error):
+            main_token.chain.push_action(
+                main_token.account,
+                "transfermany",
+                    {
+                        "from":      self.token_buyer_acc,
+                        "transfers": [],
+                        "memo":      "fail"
+                    },
+                    permission=(self.token_buyer_acc, "active")
+            )
+
+    def test_17(self):
+        cprint("Redeploy", "magenta")
+        cprint("#13.1 Check abi comparison", "green")
+        with open(os.path.join(CONTRACT_DIR, "eosio.token.abi")) as abi_file:
+            abi = json.load(abi_file)
+        assert (abi_matches(abi, abi))
+        changed = json.loads(json.dumps(abi))
+        changed["actions"] = changed["actions"][1:]
+        assert (not abi_matches(abi, changed))
+        assert (not abi_matches(abi, None))
+
+        if SIMULATE:
+            return
+        cprint("#13.2 Check deployed contract is not set again", "green")
+        assert (main_token.is_deployed())
+        assert (not Token(self.admin_acc, self.token_buyer_acc, 1, 4, "WISH").is_deployed())
+
+    def test_18(self):
+        cprint("Account pool", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+
+        cprint("#14.1 Check leased accounts can hold and send tokens", "green")
+        holders = self.pool.lease(5)
+        assert (len(set(holders)) == 5)
+        results = main_token.issue_many([(holder, one_token, "issue to pool") for holder in holders], self.admin_acc)
+        assert (all(result.ok for result in results))
+        main_token.transfer(holders[0], holders[1], one_token, "pool transfer", holders[0])
+        assert (main_token.get_balance(holders[1]) == one_token * 2)
+
+        cprint("#14.2 Check leases do not overlap until released", "green")
+        rest = self.pool.lease(self.pool_size - 5)
+        assert (not set(rest) & set(holders))
+        with self.assertRaises(IndexError):
+            self.pool.lease()
+        self.pool.release(holders[:1])
+        assert (self.pool.lease() == holders[:1])
+
+        if not SIMULATE:
+            return
+        cprint("#14.3 Check a failed transaction leaves no accounts, permissions or tables behind", "green")
+        chain = main_token.chain
+        active = copy.deepcopy(chain.accounts[holders[0]].permissions["active"])
+        creator_auth = [{"actor": "eosio", "permission": "active"}]
+        with self.assertRaises(errors.Error):
+            chain.push_actions([
+                {"account": "eosio", "name": "newaccount", "authorization": creator_auth,
+                 "data": {"creator": "eosio", "name": "rolledback", "owner": active, "active": active}},
+                {"account": "eosio", "name": "updateauth",
+                 "authorization": [{"actor": holders[0], "permission": "active"}],
+                 "data": {"account": holders[0], "permission": "active", "parent": "owner",
+                          "auth": {"threshold": 1, "keys": [], "accounts": [], "waits": []}}},
+                # opens the accounts table of a scope that had none
+                {"account": main_token.account.name, "name": "transfer",
+                 "authorization": [{"actor": holders[1], "permission": "active"}],
+                 "data": {"from": holders[1], "to": rest[0], "quantity": str(one_token), "memo": ""}},
+                {"account": main_token.account.name, "name": "transfer",
+                 "authorization": [{"actor": holders[0], "permission": "active"}],
+                 "data": {"from": holders[0], "to": holders[1], "quantity": str(one_token * 10), "memo": ""}}
+            ])
+        assert (not chain.is_account("rolledback"))
+        assert (chain.accounts[holders[0]].permissions["active"] == active)
+        assert ((main_token.account.name, "accounts", rest[0]) not in chain.table_payers)
+
+    def test_19(self):
+        cprint("Resource metrics", "magenta")
+        metrics = ResourceMetrics()
+        main_token.metrics = metrics
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, one_token * 2, "issue to admin", self.admin_acc)
+
+        cprint("#15.1 Check every pushed action is sampled", "green")
+        main_token.issue(self.token_buyer_acc, one_token, "issue to buyer", self.admin_acc)
+        main_token.transfer(self.admin_acc, self.token_buyer_acc, one_token, "top up", self.admin_acc)
+        samples = list(metrics.samples)
+        assert ([sample["action"] for sample in samples] == ["create", "issue", "issue", "transfer"])
+        issue = samples[2]
+        assert (issue["inline_actions"] == ["{}::transfer".format(self.token_deployer_acc.name)])
+        assert (issue["memo_bytes"] == len("issue to buyer"))
+        if issue["ram_bytes"] is not None:
+            assert (issue["new_row"] and issue["ram_deltas"][self.admin_acc.name] > 0)
+            assert (not samples[3]["new_row"])
+
+        cprint("#15.2 Check histograms and export", "green")
+        histograms = metrics.as_dict()
+        assert (sum(group["elapsed_us"]["count"] for name, group in histograms.items()
+                    if name.startswith("create")) == 1)
+        assert (histograms["transfer"]["memo_bytes"]["max"] == len("top up"))
+        workdir = tempfile.mkdtemp()
+        metrics.write_json(os.path.join(workdir, "metrics.json"))
+        metrics.write_csv(os.path.join(workdir, "metrics.csv"))
+        with open(os.path.join(workdir, "metrics.json")) as exported:
+            assert (json.load(exported) == json.loads(json.dumps(histograms)))
+        with open(os.path.join(workdir, "metrics.csv")) as exported:
+            assert (len(exported.readlines()) == len(samples) + 1)
+
+    def test_20(self):
+        cprint("Transfer log", "magenta")
+        path = os.path.join(tempfile.mkdtemp(), "transfers.log")
+        log = TransferLog(path, self.token_deployer_acc)
+        main_token.transfer_log = log
+        main_token.createlocked(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token * 5, "issue to buyer", self.admin_acc)
+        issued_block = log.head_block
+        main_token.unlock(Symbol(main_token.decimals, main_token.symbol), self.admin_acc)
+        main_token.transfer(self.token_buyer_acc, self.token_buyer2_acc, one_token * 2, "transfer", self.token_buyer_acc)
+        main_token.transfermany(
+            self.token_buyer_acc,
+            [(self.token_buyer2_acc, one_token), (self.token_buyer3_acc, one_token)],
+            "transfermany",
+            self.token_buyer_acc
+        )
+        main_token.burn(self.token_buyer2_acc, one_token, self.token_buyer2_acc)
+
+        cprint("#16.1 Check current balances and supply match the chain", "green")
+        balances = {}
+        for account in [self.admin_acc, self.token_buyer_acc, self.token_buyer2_acc, self.token_buyer3_acc]:
+            with contextlib.suppress(IndexError):
+                balances[account.name] = main_token.get_balance(account.name, strict=True).amount
+        assert (log.holders(main_token.symbol) == balances)
+        assert (log.balance_at(self.admin_acc, main_token.symbol) == one_token * 0)
+        stats = main_token.get_stats(strict=True)
+        assert (log.stats[main_token.symbol]["supply"] == stats["supply"].amount)
+        assert (log.stats[main_token.symbol]["max_supply"] == stats["max_supply"].amount)
+
+        cprint("#16.2 Check balance at an earlier block and account history", "green")
+        assert (log.balance_at(self.token_buyer_acc, main_token.symbol, issued_block) == one_token * 5)
+        assert (log.balance_at(self.token_buyer2_acc, main_token.symbol, issued_block) == one_token * 0)
+        history = log.history(self.token_buyer2_acc)
+        assert ([event.kind for event in history] == ["transfer", "transfer", "burn"])
+        assert (history[0].from_ == self.token_buyer_acc.name and history[0].quantity == one_token * 2)
+        assert ([event.kind for event in log.history(self.admin_acc)] == ["create", "issue", "transfer", "unlock"])
+
+        cprint("#16.3 Check reopened log resumes from its saved index", "green")
+        main_token.transfer(self.token_buyer3_acc, self.token_buyer_acc, one_token, "back", self.token_buyer3_acc)
+        log.save_index()
+        saved_size = os.path.getsize(path + ".index")
+        main_token.transfer(self.token_buyer2_acc, self.token_buyer3_acc, one_token, "tail", self.token_buyer2_acc)
+        with open(path, "ab") as log_file:
+            log_file.write(b"torn")
+        reopened = TransferLog(path, self.token_deployer_acc)
+        assert (len(reopened) == len(log) and reopened.indexed == len(log) - 1)
+        assert (reopened.holders(main_token.symbol) == log.holders(main_token.symbol))
+        assert (reopened.history(self.token_buyer3_acc)[-1].to == self.token_buyer3_acc.name)
+        reopened.close()
+
+        cprint("#16.4 Check saving appends only the index entries of the new records", "green")
+        # histories and balance checkpoints of the tail transfer's two accounts
+        assert (os.path.getsize(path + ".index") == saved_size + 4 * INDEX_ENTRY.size)
+        again = TransferLog(path, self.token_deployer_acc)
+        assert (again.indexed == len(log) and again.balances == log.balances and again.histories == log.histories)
+        again.close()
+        log.close()
+        main_token.transfer_log = None
+
+    def test_21(self):
+        cprint("Supply auditor", "magenta")
+        auditor = SupplyAuditor(main_token, page_size=2)
+        main_token.auditor = auditor
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token * 5, "issue to buyer", self.admin_acc)
+        main_token.transfer(self.token_buyer_acc, self.token_buyer2_acc, one_token * 2, "transfer", self.token_buyer_acc)
+        main_token.transfermany(
+            self.token_buyer_acc,
+            [(self.token_buyer2_acc, one_token), (self.token_buyer3_acc, one_token)],
+            "transfermany",
+            self.token_buyer_acc
+        )
+        main_token.burn(self.token_buyer2_acc, one_token, self.token_buyer2_acc)
+
+        cprint("#17.1 Check the running total follows issue and burn", "green")
+        assert (auditor.balance_sum == (one_token * 4).amount)
+        assert (auditor.check() == [])
+
+        cprint("#17.2 Check full scan agrees", "green")
+        assert (auditor.full_scan() == [])
+        assert (auditor.scans == 1)
+
+        cprint("#17.3 Check supply changes the auditor missed are reported", "green")
+        other_client = Token(self.admin_acc, self.token_deployer_acc, self.maximum_supply, self.decimals, self.symbol)
+        other_client.issue(self.token_buyer3_acc, one_token, "unaudited issue", self.admin_acc)
+        violations = auditor.check()
+        assert (len(violations) == 1 and "instead of supply" in violations[0]["message"])
+        assert (auditor.full_scan() == [] and auditor.check() == [])
+
+        cprint("#17.4 Check background full scans", "green")
+        auditor.scan_interval = 0.01
+        with auditor:
+            deadline = time.monotonic() + 10
+            while auditor.scans < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert (auditor.scans >= 3)
+        assert (len(auditor.violations) == 1)
+
+        cprint("#17.5 Check a scan with transfers made during it is inconclusive", "green")
+        holders = main_token.holders
+
+        def transferring_holders(**kwargs):
+            pages = holders(**kwargs)
+            yield next(pages)
+            main_token.transfer(
+                self.token_buyer3_acc, self.token_buyer_acc, one_token, "during scan", self.token_buyer3_acc)
+            yield from pages
+
+        main_token.holders = transferring_holders
+        scans = auditor.scans
+        assert (auditor.full_scan() is None)
+        del main_token.holders
+        assert (auditor.scans == scans and len(auditor.violations) == 1 and auditor.check() == [])
+        main_token.auditor = None
+
+    def test_22(self):
+        cprint("Holder snapshot", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, one_token * 10, "issue to admin", self.admin_acc)
+        main_token.transfer(self.admin_acc, self.token_buyer_acc, one_token * 3, "transfer", self.admin_acc)
+        main_token.transfer(self.admin_acc, self.token_buyer2_acc, one_token, "transfer", self.admin_acc)
+        workdir = tempfile.mkdtemp()
+        before_path = os.path.join(workdir, "before.snap")
+        after_path = os.path.join(workdir, "after.snap")
+
+        cprint("#18.1 Check exported snapshot matches the holders", "green")
+        assert (holder_snapshot.export_token(before_path, main_token, page_size=2) == 3)
+        with holder_snapshot.HolderSnapshot(before_path) as before:
+            assert (before.symbol == Symbol(main_token.decimals, main_token.symbol))
+            assert (list(before) == [(owner, balance.amount) for owner, balance in main_token.holders()])
+            assert (before.sum() == one_token * 10)
+            assert (before.top(2) == [(self.admin_acc.name, one_token * 6), (self.token_buyer_acc.name, one_token * 3)])
+            assert (before.balance(self.token_buyer2_acc.name) == one_token)
+            assert (before.balance(self.token_buyer3_acc.name) == one_token * 0)
+            assert (sum(before.histogram().values()) == 3)
+
+        cprint("#18.2 Check diff between blocks", "green")
+        main_token.transfer(self.token_buyer2_acc, self.token_buyer3_acc, one_token, "transfer", self.token_buyer2_acc)
+        holder_snapshot.export_token(after_path, main_token)
+        with holder_snapshot.HolderSnapshot(before_path) as before, holder_snapshot.HolderSnapshot(after_path) as after:
+            assert (after.block_num > before.block_num)
+            assert (sorted(holder_snapshot.diff(before, after)) == sorted([
+                (self.token_buyer2_acc.name, one_token, one_token * 0),
+                (self.token_buyer3_acc.name, one_token * 0, one_token)
+            ]))
+
+        cprint("#18.3 Snapshot must fail with unsorted holders", "green")
+        with self.assertRaises(ValueError):
+            holder_snapshot.write_snapshot(
+                os.path.join(workdir, "unsorted.snap"),
+                [(self.token_buyer_acc.name, one_token), (self.token_buyer_acc.name, one_token)],
+                one_token.symbol,
+                0
+            )
+
+    def test_23(self):
+        cprint("Token registry", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token * 3, "issue", self.admin_acc)
+        registry = TokenRegistry(self.admin_acc, self.token_deployer_acc)
+
+        cprint("#19.1 Check a second symbol on the same contract", "green")
+        second = registry.add("TEST", 2, 1000)
+        second.create(self.admin_acc, self.admin_acc)
+        second.issue(self.token_buyer_acc, registry.quantity("TEST", 7), "issue", self.admin_acc)
+        assert (second.get_balance(self.token_buyer_acc.name) == Asset(700, Symbol(2, "TEST")))
+
+        cprint("#19.2 Check every stat row is loaded", "green")
+        registry = TokenRegistry(self.admin_acc, self.token_deployer_acc)
+        registry.page_size = 1
+        stats = registry.load()
+        assert (sorted(stats) == sorted(["TEST", main_token.symbol]))
+        assert (stats[main_token.symbol]["supply"] == one_token * 3)
+        assert (registry.quantity("TEST", 1) == Asset(100, Symbol(2, "TEST")))
+        assert (registry.token("TEST").deploy_params == Asset(100000, Symbol(2, "TEST")))
+        assert (registry.token("TEST") is registry.token("TEST"))
+
+        cprint("#19.3 Check cross-symbol balances from one accounts scope read", "green")
+        registry = TokenRegistry(self.admin_acc, self.token_deployer_acc)
+        registry.load()
+        reads = []
+        get_table_rows = registry.chain.get_table_rows
+        registry.chain = unittest.mock.Mock(wraps=registry.chain)
+        registry.chain.get_table_rows.side_effect = lambda *args, **kwargs: (
+            reads.append(args) or get_table_rows(*args, **kwargs))
+        balances = registry.balances(self.token_buyer_acc)
+        assert (balances == {main_token.symbol: one_token * 3, "TEST": Asset(700, Symbol(2, "TEST"))})
+        assert (len(reads) == 1)
+        token = registry.token(main_token.symbol)
+        assert (token.get_balance(self.token_buyer_acc.name, strict=False) == one_token * 3)
+        assert (len(reads) == 1)
+
+    def test_24(self):
+        cprint("Binary action data and table rows", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.admin_acc, one_token * 10, "issue to admin", self.admin_acc)
+
+        cprint("#20.1 Check batched actions are sent packed", "green")
+        action = main_token.to_action(
+            "transfer", {"from": self.admin_acc, "to": self.token_buyer_acc, "quantity": one_token, "memo": "m"},
+            self.admin_acc
+        )
+        assert (isinstance(action["data"], str))
+        results = main_token.transfer_many(self.admin_acc, [(self.token_buyer_acc, one_token * 2, "packed")],
+                                           self.admin_acc)
+        assert (results[0].ok)
+        assert (main_token.get_balance(self.token_buyer_acc.name, strict=True) == one_token * 2)
+
+        cprint("#20.2 Check binary rows decode to the json rows", "green")
+        code = self.token_deployer_acc.name
+        for table, scope in [("accounts", self.token_buyer_acc.name), ("stat", main_token.symbol)]:
+            rows = main_token.chain.get_table_rows(code, table, scope)["rows"]
+            packed = main_token.chain.get_table_rows(code, table, scope, binary=True)["rows"]
+            assert ([main_token.serializer.unpack_row(table, row) for row in packed] == rows)
+
+    def test_25(self):
+        cprint("Unique transactions", "magenta")
+        main_token.create(self.admin_acc, self.admin_acc)
+        main_token.issue(self.token_buyer_acc, one_token * 20, "issue to buyer", self.admin_acc)
+        now = time.time()
+        if SIMULATE:
+            # one head block second for the whole test
+            main_token.chain.clock = lambda: now
+        main_token.unique = UniqueExpirations(clock=lambda: now)
+
+        cprint("#21.1 Check identical transfers all go through", "green")
+        for _ in range(3):
+            main_token.transfer(self.token_buyer_acc, self.token_buyer2_acc, one_token, "payout", self.token_buyer_acc)
+        results = main_token.transfer_many(
+            self.token_buyer_acc, [(self.token_buyer2_acc, one_token, "payout")] * 3, self.token_buyer_acc)
+        assert (all(result.ok for result in results))
+        results = main_token.transfer_many(
+            self.token_buyer_acc, [(self.token_buyer2_acc, one_token, "payout")] * 3, self.token_buyer_acc)
+        assert (all(result.ok for result in results))
+        assert (main_token.get_balance(self.token_buyer2_acc.name, strict=True) == one_token * 9)
+
+        cprint("#21.2 Check expirations are spread and freed once expired", "green")
+        unique = UniqueExpirations(clock=lambda: now)
+        assert ([unique.allocate("key") for _ in range(3)] == [30, 31, 32])
+        assert (unique.allocate("other") == 30)
+        unique.clock = lambda: now + 1
+        assert (unique.allocate("key") == 32)
+        unique.clock = lambda: now + 100
+        assert (unique.allocate("key") == 30 and len(unique.pending) == 1)
+
+        if not SIMULATE:
+            return
+        cprint("#21.3 Check duplicates are rejected and retried", "green")
+        transfer = {"from": self.token_buyer_acc, "to": self.token_buyer2_acc, "quantity": str(one_token), "memo": "m"}
+        permission = (self.token_buyer_acc, "active")
+        push_action = main_token.chain.push_action
+        push_action(main_token.account, "transfer", transfer, permission=permission, expiration_sec=30)
+        with self.assertRaisesRegex(errors.Error, "duplicate transaction"):
+            push_action(main_token.account, "transfer", transfer, permission=permission, expiration_sec=30)
+        push_action(main_token.account, "transfer", transfer, permission=permission, expiration_sec=30,
+                    force_unique=True)
+        main_token.unique = UniqueExpirations(clock=lambda: now)
+        main_token.transfer(self.token_buyer_acc, self.token_buyer2_acc, one_token, "m", self.token_buyer_acc)
+        assert (main_token.get_balance(self.token_buyer2_acc.name, strict=True) == one_token * 12)
+        main_token.chain.clock = lambda: now + 31
+        push_action(main_token.account, "transfer", transfer, permission=permission, expiration_sec=30)
+
+    def test_26(self):
+        cprint("Step profiler", "magenta")
+        now = [0.0]
+
+        class Chain:
+            def get_table_rows(self):
+                now[0] += 2
+
+            def push_action(self):
+                now[0] += 3
+                self.get_table_rows()
+
+        class Case(unittest.TestCase):
+            def setUp(self):
+                now[0] += 1
+
+            def test_steps(self):
+                profiler.label("#1 Push")
+                Chain().push_action()
+                now[0] += 0.5
+                profiler.label("#2 Read")
+                Chain().get_table_rows()
+
+            def tearDown(self):
+                now[0] += 0.25
+
+        profiler = StepProfiler(clock=lambda: now[0])
+        profiler.instrument(Chain)
+
+        cprint("#22.1 Check steps split into node round trips, table reads and local work", "green")
+        case = Case("test_steps")
+        with profiler.profile(case):
+            case.run(unittest.TestResult())
+        profiler.restore()
+        Chain().get_table_rows()
+        report = profiler.report()["tests"]["Case.test_steps"]
+        assert (list(report["steps"]) == ["setUp", "test", "#1 Push", "#2 Read", "tearDown"])
+        push = report["steps"]["#1 Push"]
+        # the read made by the push is part of the round trip
+        assert ((push["wall"], push["node"], push["reads"], push["local"]) == (5.5, 5, 0, 0.5))
+        assert ((push["node_calls"], push["reads_calls"]) == (1, 0))
+        assert (report["steps"]["#2 Read"]["reads"] == 2)
+        assert ({phase: totals["wall"] for phase, totals in report["phases"].items()}
+                == {"setUp": 1, "test": 7.5, "tearDown": 0.25})
+        assert (report["total"]["wall"] == 8.75)
+        assert ("setUp" not in case.__dict__ and Chain.get_table_rows.__name__ == "get_table_rows")
+
+        cprint("#22.2 Check slower steps are flagged against a baseline", "green")
+        baseline = profiler.report()
+        current = json.loads(json.dumps(baseline))
+        slower_push = current["tests"]["Case.test_steps"]["steps"]["#1 Push"]
+        slower_push.update(wall=7.5, local=2.5)
+        current["tests"]["Case.test_steps"]["steps"]["#2 Read"]["wall"] += 0.001
+        current["tests"]["Case.test_steps"]["total"].update(wall=10.751, local=3.751)
+        regressions = compare(baseline, current, threshold=0.25, min_delta=0.01)
+        # the read is under min_delta slower, the whole test under the threshold
+        assert ([(regression["step"], regression["grew"]) for regression in regressions] == [("#1 Push", "local")])
+        assert (format_regression(regressions[0]) == "Case.test_steps #1 Push: 5.500s -> 7.500s (mostly local)")
+
+    def test_27(self):
+        cprint("Differential fuzzing against the reference model", "magenta")
+        contract = account_name(self.token_deployer_acc)
+        accounts = {
+            account_name(account): account
+            for account in [self.admin_acc, self.token_deployer_acc, self.token_buyer_acc,
+                            self.token_buyer2_acc, self.token_buyer3_acc]
+        }
+        replayer = Replayer(main_token.chain, self.token_deployer_acc, self.admin, accounts)
+
+        cprint("#23.1 Check a burn wrapping int64 around fails as on the chain", "green")
+        admin = account_name(self.admin_acc)
+        supply = (4611686018427387903, 0, "WRAP")
+        wrap = [
+            ("create", admin, (admin, supply)),
+            ("issue", admin, (admin, supply, "")),
+            # max_supply - (-2^63) wraps to a negative amount in int64
+            ("burn", admin, (admin, (-(1 << 63), 0, "WRAP")))
+        ]
+        model = ReferenceModel(contract, self.admin, accounts)
+        assert ([model.apply(action) for action in wrap]
+                == [None, None, "assertion failure with message: subtraction underflow"])
+        assert (replayer.replay(wrap) is None)
+
+        cprint("#23.2 Check a fuzz run reaches the contract's checks", "green")
+        fuzzer = Fuzzer(contract, self.admin, accounts, seed=1, sample_rate=0)
+        samples = fuzzer.run(sequences=3000)
+        reached = {key for key in fuzzer.counts}
+        for name, outcome in [
+            ("create", "ok"), ("createlocked", "ok"), ("issue", "ok"), ("transfer", "ok"),
+            ("unlock", "ok"), ("burn", "ok"),
+            ("transfer", "assertion failure with message: token is locked"),
+            ("issue", "assertion failure with message: memo has more than 256 bytes"),
+            ("issue", "assertion failure with message: quantity exceeds available supply"),
+            ("create", "assertion failure with message: invalid supply"),
+            ("burn", "assertion failure with message: subtraction underflow")
+        ]:
+            assert ((name, outcome) in reached), (name, outcome)
+        # a sequence is sampled for the first outcome it reaches, minimized down to the action ending that way
+        assert (len({key for _, key in samples}) == len(samples) > 20)
+        for actions, key in samples:
+            assert (outcome_key(actions[-1], fuzzer.outcomes(actions)[-1]) == key)
+            assert (len(actions) <= fuzzer.max_length)
+
+        cprint("#23.3 Check the chain ends the sampled sequences as the model does", "green")
+        mismatches = [replayer.replay(actions) for actions, _ in samples[:20]]
+        assert (mismatches == [None] * len(mismatches)), [mismatch for mismatch in mismatches if mismatch]
+
+if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--verbose", help="increase output verbosity",
                         action="store_true")
-    args = parser.parse_args()
-    if args.verbose:
-        verbosity([Verbosity.INFO, Verbosity.OUT, Verbosity.TRACE, Verbosity.DEBUG])
-        print("verbosity turned on")
-
-    unittest.main()
+    parser.add_argument("--simulate", help="run against the in-process contract simulator",
+                        action="store_true")
+    parser.add_argument("--profile", help="write the time of every labelled step to this JSON file")
+    parser.add_argument("--baseline", help="flag steps slower than in this profile (saved there by the first run)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fraction of its baseline time a step may get slower by")
+    parser.add_argument("--min-delta", type=float, default=0.01,
+                        help="seconds a step may get slower by regardless of the threshold")
+    parser.add_argument("--fail-slower", help="fail the run if a step is slower than in the baseline",
+                        action="store_true")
+    args, unittest_args = parser.parse_known_args()
+    SIMULATE = args.simulate
+    if not SIMULATE:
+        # eosfactory is only imported to run against a node
+        import eosfactory_backend
+        eosfactory_backend.quiet()
+        if args.verbose:
+            eosfactory_backend.verbose()
+            print("verbosity turned on")
+    if args.profile or args.baseline:
+        PROFILER = StepProfiler()
+        PROFILER.instrument(backends.load("memory" if SIMULATE else "eosfactory"))
+
+    argv = sys.argv[:1] + unittest_args + (["--verbose"] if args.verbose else [])
+    succeeded = unittest.main(argv=argv, exit=False).result.wasSuccessful()
+    if PROFILER is not None:
+        PROFILER.restore()
+        if args.profile:
+            PROFILER.write(args.profile)
+        if args.baseline and not os.path.exists(args.baseline):
+            PROFILER.write(args.baseline)
+            print("profile baseline saved to {}".format(args.baseline))
+        elif args.baseline:
+            with open(args.baseline) as baseline:
+                regressions = compare(json.load(baseline), PROFILER.report(), args.threshold, args.min_delta)
+            for regression in regressions:
+                cprint("slower than baseline: " + format_regression(regression),
+                       "red" if args.fail_slower else "yellow")
+            # timings are noisy, slower steps are only reported unless asked otherwise
+            if args.fail_slower:
+                succeeded = succeeded and not regressions
+    sys.exit(not succeeded)